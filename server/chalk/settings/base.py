@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chalk.todos.db_routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +88,43 @@ DATABASES = {
     }
 }
 
+# Read replicas, reads during safe requests are routed to them
+DB_REPLICA_HOSTS = [
+    host.strip()
+    for host in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+    if host.strip()
+]
+DATABASE_REPLICAS = [
+    f'replica_{index}' for index in range(len(DB_REPLICA_HOSTS))
+]
+DATABASES.update({
+    alias: {
+        **DATABASES['default'], 'HOST': host
+    } for alias, host in zip(DATABASE_REPLICAS, DB_REPLICA_HOSTS)
+})
+DATABASE_ROUTERS = ['chalk.todos.db_routing.ReplicaRouter']
+# Clients read from the primary for this long after writing
+REPLICA_STICKY_SECONDS = 10
+# Replicas further behind the primary than this aren't read from
+REPLICA_MAX_LAG_SECONDS = 5
+
+# Session data from the recorder is throttled per user & per recording session,
+# and each server process handles at most this many session data requests at
+# once
+SESSION_DATA_MAX_CONCURRENCY = 4
+# Session data appended in chunks is staged here until the session is finished
+# or idle for SESSION_COMPACT_IDLE_SECONDS, then compacted into the bucket
+SESSION_STAGING_DIR = os.getenv('SESSION_STAGING_DIR',
+                                '/tmp/chalk_session_staging')
+SESSION_COMPACT_IDLE_SECONDS = 10 * 60
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_RATES': {
+        # Recorders send session data every 10 seconds
+        'session_data_user': '60/min',
+        'session_data_session': '12/min',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -168,6 +206,38 @@ logging.config.dictConfig({
     },
 })
 
+# Caching
+# Use the database so cached data is shared by all server processes
+# Status info is cached in each process instead so a cache hit doesn't query
+# the database, it's recomputed at most every STATUS_CACHE_SECONDS
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'chalk_cache',
+    },
+    'status': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chalk_status',
+    },
+}
+
+# Todo history
+# Only store the fields which changed for each todo revision with a full copy
+# of the todo every TODO_HISTORY_CHECKPOINT_INTERVAL revisions
+TODO_HISTORY_SPARSE = os.getenv('TODO_HISTORY_SPARSE', 'true') == 'true'
+TODO_HISTORY_CHECKPOINT_INTERVAL = 20
+
+# Todo ordering
+# 'rank' orders todos by integer ranks which are periodically rebalanced, while
+# 'fractional' orders them by string keys so reorders only update one todo.
+# Run the migrate_todo_ordering command before switching engines
+TODO_ORDERING_ENGINE = os.getenv('TODO_ORDERING_ENGINE', 'rank')
+
+# Todos created before todos had owners are assigned to this user when
+# migrating, or to the first superuser, i.e. the first user to log in, if it
+# isn't set
+TODO_OWNER_USERNAME = os.getenv('TODO_OWNER_USERNAME')
+
 # Models
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
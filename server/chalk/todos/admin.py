@@ -7,6 +7,7 @@ from django.db import models as django_models
 from simple_history.admin import SimpleHistoryAdmin
 
 from chalk.todos import models
+from chalk.todos.history import fill_sparse_history
 
 
 class LabelAdmin(admin.ModelAdmin):
@@ -45,5 +46,21 @@ class LabelAdmin(admin.ModelAdmin):
         return obj.todo_count
 
 
-admin.site.register(models.TodoModel, SimpleHistoryAdmin)
+class TodoAdmin(SimpleHistoryAdmin):
+    """
+    Admin interface for todos and their history
+    """
+
+    def set_history_delta_changes(self, request, historical_records, *args,
+                                  **kwargs):
+        """
+        Fill in elided fields for the page of history in a single query
+        before computing the changes between records.
+        """
+        fill_sparse_history(historical_records)
+        super().set_history_delta_changes(request, historical_records, *args,
+                                          **kwargs)
+
+
+admin.site.register(models.TodoModel, TodoAdmin)
 admin.site.register(models.LabelModel, LabelAdmin)
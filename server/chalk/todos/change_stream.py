@@ -0,0 +1,279 @@
+"""
+Broker for pushing todo & label change events to connected clients
+
+Changes are published from the model signal handlers and saved as
+ChangeEventModel rows, whose database assigned ids are the streams' event ids.
+On Postgres they are also sent with NOTIFY so every server process receives
+them, while other databases fall back to publishing directly to the in-process
+broker after commit.  Open streams deliver changes from the broker as they
+commit, and a reconnecting client resumes from the last event id it received by
+replaying the saved changes, so it can reconnect to any server process.
+Todo events carry the todo's owner_id and are only streamed to that owner,
+label events are streamed to everyone since labels are shared.
+"""
+from collections import deque
+from datetime import timedelta
+import json
+import logging
+import select
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from chalk.todos.models import ChangeEventModel
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'chalk_changes'
+EVENT_BUFFER_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+LISTEN_POLL_SECONDS = 5
+RECONNECT_MILLISECONDS = 3000
+# Streams are closed periodically so long-lived connections don't pin server
+# threads, clients reconnect and resume using the Last-Event-ID header
+STREAM_MAX_SECONDS = 45
+# Each open stream holds a server thread, so only some of each process'
+# threads may stream and the rest are left for API requests.  Clients turned
+# away are told to reconnect later, and resume once they get a thread
+MAX_STREAMS_PER_PROCESS = 4
+STREAM_BUSY_RECONNECT_MILLISECONDS = 15000
+# Changes are kept long enough for clients to resume after being offline
+# for a while, and pruned every CHANGE_EVENT_PRUNE_INTERVAL changes
+CHANGE_EVENT_RETENTION = timedelta(days=1)
+CHANGE_EVENT_PRUNE_INTERVAL = 100
+# Ids are assigned when changes are saved but changes are delivered as they
+# commit, so a change can commit after one with a later id was delivered.
+# Resuming replays changes saved this long before the last event too
+COMMIT_GRACE = timedelta(seconds=10)
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS_PER_PROCESS)
+
+
+class EventStreamRenderer(BaseRenderer):  # pylint: disable=R0903
+    """
+    Renderer allowing DRF views to negotiate text/event-stream responses
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data)
+
+
+class ChangeBroker:
+    """
+    Fans committed changes out to the streams connected to this process
+    Recent changes are buffered with a sequence number local to the process,
+    so each stream can wait for the changes after the last one it sent.
+    """
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE):
+        self._condition = threading.Condition()
+        self._changes = deque(maxlen=buffer_size)
+        self._seq = 0
+
+    def publish(self, change):
+        """
+        Buffer a change and wake any waiting streams
+        """
+        with self._condition:
+            self._seq += 1
+            self._changes.append((self._seq, change))
+            self._condition.notify_all()
+
+    def latest_seq(self):
+        """
+        Sequence number of the most recently published change
+        """
+        with self._condition:
+            return self._seq
+
+    def wait_for_changes(self, after_seq, timeout):
+        """
+        Wait up to timeout seconds for changes published after after_seq
+        Returns None if some of those changes have already been dropped
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after_seq, timeout)
+            if self._seq == after_seq:
+                return []
+            if self._changes[0][0] > after_seq + 1:
+                return None
+            return [(seq, change)
+                    for seq, change in self._changes
+                    if seq > after_seq]
+
+
+_broker = None  # pylint: disable=invalid-name
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Get the broker for this process
+    Starts listening for notifications on Postgres the first time it's used
+    """
+    global _broker  # pylint: disable=global-statement
+    with _broker_lock:
+        if _broker is None:
+            _broker = ChangeBroker()
+            if connection.vendor == 'postgresql':
+                threading.Thread(target=_listen_for_notifications,
+                                 args=(_broker,),
+                                 daemon=True).start()
+        return _broker
+
+
+def publish_change(model, action, instance_id, **extra):
+    """
+    Publish a change event for a todo or label
+    """
+    event = {
+        'model': model,
+        'action': action,
+        'id': instance_id,
+        **extra,
+    }
+    change_event = ChangeEventModel.objects.create(
+        model=model, owner_id=extra.get('owner_id'), event=event)
+    if change_event.id % CHANGE_EVENT_PRUNE_INTERVAL == 0:
+        ChangeEventModel.objects.filter(created_at__lt=timezone.now() -
+                                        CHANGE_EVENT_RETENTION).delete()
+
+    change = {'id': change_event.id, 'event': event}
+    if connection.vendor == 'postgresql':
+        # NOTIFY is only delivered if the surrounding transaction commits
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           [NOTIFY_CHANNEL, json.dumps(change)])
+    else:
+        transaction.on_commit(lambda: get_broker().publish(change))
+
+
+def replay_changes(owner_id, last_event_id):
+    """
+    Get the saved changes visible to owner_id which a client may have missed
+    since last_event_id, as (id, event) pairs in id order
+    Returns None if they can't be replayed since last_event_id is unknown or
+    the changes after it were pruned
+    """
+    if not last_event_id.isdigit():
+        return None
+    last_id = int(last_event_id)
+    # Read from the primary since a replica may not have the latest changes
+    changes = ChangeEventModel.objects.using(DEFAULT_DB_ALIAS)
+    last_created_at = changes.filter(id=last_id).values_list('created_at',
+                                                             flat=True).first()
+    if last_created_at is None:
+        return None
+
+    changes = changes.filter(
+        Q(id__gt=last_id) |
+        Q(id__lt=last_id, created_at__gte=last_created_at - COMMIT_GRACE))
+    changes = changes.filter(Q(owner_id=owner_id) | ~Q(model='todo'))
+    return list(changes.order_by('id').values_list('id', 'event'))
+
+
+def stream_events(owner_id, last_event_id=None, max_seconds=None):
+    """
+    Generate Server-Sent Events for changes visible to owner_id after
+    last_event_id
+    If the client can't be resumed, a resync event is sent first to indicate
+    the client should refetch everything.
+    """
+    if not _stream_slots.acquire(blocking=False):  # pylint: disable=R1732
+        yield f'retry: {STREAM_BUSY_RECONNECT_MILLISECONDS}\n\n'
+        return
+
+    try:
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        yield from _stream_changes(owner_id, last_event_id, max_seconds)
+    finally:
+        _stream_slots.release()
+
+
+def _stream_changes(owner_id, last_event_id, max_seconds):
+    broker = get_broker()
+    deadline = time.monotonic() + (max_seconds or STREAM_MAX_SECONDS)
+    # Changes published from here on are delivered by the broker, so the
+    # changes replayed before then aren't missed
+    cursor = broker.latest_seq()
+    replayed = replay_changes(owner_id, last_event_id) if last_event_id else []
+    replayed_ids = set()
+    if not last_event_id:
+        # Give new clients an event id to resume from, without an event
+        yield f'id: {_latest_change_id()}\n\n'
+    elif replayed is None:
+        yield _format_event(_latest_change_id(), 'resync', {})
+    else:
+        for change_id, event in replayed:
+            replayed_ids.add(change_id)
+            yield _format_event(change_id, 'change', event)
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        changes = broker.wait_for_changes(cursor,
+                                          min(remaining, KEEPALIVE_SECONDS))
+        if changes is None:
+            cursor = broker.latest_seq()
+            yield _format_event(_latest_change_id(), 'resync', {})
+        elif not changes:
+            yield ': keepalive\n\n'
+        else:
+            for _, change in changes:
+                if (change['id'] not in replayed_ids and
+                        _is_visible(change['event'], owner_id)):
+                    yield _format_event(change['id'], 'change', change['event'])
+            cursor = changes[-1][0]
+
+
+def _is_visible(event, owner_id):
+    return event['model'] != 'todo' or event.get('owner_id') == owner_id
+
+
+def _latest_change_id():
+    latest_id = ChangeEventModel.objects.using(DEFAULT_DB_ALIAS).order_by(
+        '-id').values_list('id', flat=True).first()
+    return latest_id or 0
+
+
+def _format_event(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+def _listen_for_notifications(broker):
+    """
+    Relay Postgres notifications to the broker
+    Runs in a background thread with its own database connection
+    """
+    while True:
+        db_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            db_connection.ensure_connection()
+            raw_connection = db_connection.connection
+            raw_connection.autocommit = True
+            with raw_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+
+            while True:
+                readable, _, _ = select.select([raw_connection], [], [],
+                                               LISTEN_POLL_SECONDS)
+                if not readable:
+                    continue
+                raw_connection.poll()
+                while raw_connection.notifies:
+                    notification = raw_connection.notifies.pop(0)
+                    broker.publish(json.loads(notification.payload))
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception('Change stream listener failed, reconnecting')
+            time.sleep(LISTEN_POLL_SECONDS)
+        finally:
+            db_connection.close()
@@ -8,3 +8,5 @@ import math
 RANK_ORDER_INITIAL_STEP = math.pow(2, 60)
 RANK_ORDER_DEFAULT_STEP = math.pow(2, 45)
 RANK_ORDER_MAX = math.pow(2, 63) - 1
+# Rebalance once the closest ranks can only be halved this many more times
+RANK_ORDER_REBALANCE_STEPS = 2
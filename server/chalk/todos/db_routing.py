@@ -0,0 +1,185 @@
+"""
+Routing of read-only requests to database replicas
+
+Safe requests read from a healthy replica from DATABASE_REPLICAS, while all
+writes go to the primary.  Once a request writes, the rest of its reads use
+the primary and the client is pinned to the primary for
+REPLICA_STICKY_SECONDS so it reads its own writes.  Replicas lagging more
+than REPLICA_MAX_LAG_SECONDS behind the primary or failing are skipped.
+The database cache always uses the primary, and writing to it doesn't pin the
+client since cache misses are written during safe requests.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = 'chalk_primary'
+LAG_CHECK_SECONDS = 5
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the current request
+_request_routing = ContextVar('request_routing', default=None)
+
+_replica_lag = {}
+_replica_lag_lock = threading.Lock()
+
+
+class RequestRouting:  # pylint: disable=R0903
+    """
+    Database routing state for a single request
+    """
+
+    def __init__(self, read_alias):
+        self.read_alias = read_alias
+        self.wrote = False
+
+
+class ReplicaRouter:  # pylint: disable=unused-argument
+    """
+    Database router sending reads during safe requests to a replica
+    """
+
+    def db_for_read(self, model, **hints):
+        """
+        Read from the replica chosen for the request, if any
+        """
+        routing = _request_routing.get()
+        if (routing is None or routing.wrote or
+                model._meta.app_label == 'django_cache'):
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias
+
+    def db_for_write(self, model, **hints):
+        """
+        Always write to the primary & use it for the rest of the request
+        """
+        routing = _request_routing.get()
+        if routing is not None and model._meta.app_label != 'django_cache':
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Replicas hold the same data as the primary
+        """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """
+        Only migrate the primary, replicas receive changes from it
+        """
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:  # pylint: disable=R0903
+    """
+    Choose the database alias reads use for each request
+
+    Must be listed before any middleware which writes (e.g. sessions) so
+    those writes pin the client to the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        read_alias = DEFAULT_DB_ALIAS
+        if (request.method in SAFE_METHODS and
+                PRIMARY_COOKIE not in request.COOKIES):
+            read_alias = choose_replica()
+
+        routing = RequestRouting(read_alias)
+        token = _request_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_routing.reset(token)
+
+        if routing.wrote:
+            response.set_cookie(PRIMARY_COOKIE,
+                                '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True,
+                                samesite='Lax')
+        return response
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Read from the primary for the rest of a block, e.g. to build results which
+    are cached, since results read from a lagging replica would be cached as
+    if they were current
+    """
+    routing = _request_routing.get()
+    if routing is None:
+        yield
+        return
+
+    read_alias = routing.read_alias
+    routing.read_alias = DEFAULT_DB_ALIAS
+    try:
+        yield
+    finally:
+        routing.read_alias = read_alias
+
+
+def choose_replica():
+    """
+    Choose a replica which is keeping up with the primary
+    Falls back to the primary if there are none
+    """
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if get_replica_lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+    ]
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+def get_replica_lag(alias):
+    """
+    Seconds a replica is behind the primary
+    Checked at most every LAG_CHECK_SECONDS, unreachable replicas are
+    treated as infinitely behind.
+    """
+    now = time.monotonic()
+    with _replica_lag_lock:
+        checked_at, lag = _replica_lag.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < LAG_CHECK_SECONDS:
+            return lag
+        # Concurrent requests use the previous lag rather than checking too
+        _replica_lag[alias] = (now, lag if lag is not None else float('inf'))
+
+    try:
+        lag = _query_replica_lag(connections[alias])
+    except DatabaseError:
+        logger.exception('Unable to check lag of replica %s', alias)
+        lag = float('inf')
+    with _replica_lag_lock:
+        _replica_lag[alias] = (now, lag)
+    return lag
+
+
+def _query_replica_lag(connection):
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        # Replicas which have replayed everything they've received aren't
+        # behind, even if the primary hasn't written for a while
+        cursor.execute(
+            'SELECT CASE '
+            'WHEN NOT pg_is_in_recovery() THEN 0 '
+            'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+            'END')
+        return float(cursor.fetchone()[0] or 0)
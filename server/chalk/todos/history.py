@@ -0,0 +1,276 @@
+"""
+Sparse history storage for todos
+
+Historical rows only store the sparse fields which changed since the previous
+revision, the rest are elided and stored as empty placeholders.  A full copy of
+the record is stored on create & delete and every
+TODO_HISTORY_CHECKPOINT_INTERVAL revisions, so filling in the elided fields
+never needs to look further back than the latest checkpoint.
+Elided fields are filled back in whenever a historical record is converted to
+an instance, diffed or displayed so admin & point-in-time reads are unchanged.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from simple_history.manager import HistoricalQuerySet, HistoryManager
+from simple_history.models import (HistoricalChanges,
+                                   HistoricalObjectDescriptor,
+                                   HistoricalRecords)
+
+
+class SparseHistoricalModel(models.Model):
+    """
+    Base for historical models which may elide unchanged fields
+    """
+    # Names of sparse fields which were unchanged & not stored in this row
+    history_elided_fields = models.JSONField(default=list)
+    # Revisions since the latest full checkpoint, 0 for checkpoints
+    history_checkpoint_distance = models.PositiveIntegerField(default=0)
+
+    # Set for each historical model by SparseHistoricalRecords
+    sparse_fields = ()
+
+    def fill_sparse_fields(self):
+        """
+        Fill in the elided fields of this record from earlier revisions
+        """
+        fill_sparse_history([self])
+
+    class Meta:
+        abstract = True
+
+
+class SparseHistoricalQuerySet(HistoricalQuerySet):
+    """
+    QuerySet filling in elided fields in bulk before converting to instances
+    """
+
+    def _instanceize(self):
+        if (self._result_cache and self._as_instances and
+                isinstance(self._result_cache[0], self.model)):
+            fill_sparse_history(self._result_cache)
+        super()._instanceize()
+
+
+class SparseHistoryManager(HistoryManager):
+    """
+    History manager which fills in elided fields for the most recent copy
+    """
+
+    def most_recent(self):
+        record = self.first() if self.instance else None
+        if record is None:
+            # Raises the same errors as a regular history manager
+            return super().most_recent()
+        return record.instance
+
+
+class SparseHistoricalObjectDescriptor(  # pylint: disable=R0903
+        HistoricalObjectDescriptor):
+    """
+    Descriptor for history_object which fills in elided fields first
+    """
+
+    def __get__(self, instance, owner):
+        if instance is not None:
+            fill_sparse_history([instance])
+        return super().__get__(instance, owner)
+
+
+class SparseHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords which only stores changed sparse fields per revision
+
+    sparse_fields must either be nullable or have an empty default which is
+    stored in place of the value when it is elided.  Extra fields added to the
+    historical model through bases may be sparse too.
+    Rows are indexed by (id, history_date) since revisions are always read
+    back per object in date order, which makes the plain id index redundant.
+    """
+
+    def __init__(self, *args, sparse_fields=(), **kwargs):
+        kwargs.setdefault('bases', (SparseHistoricalModel,))
+        kwargs.setdefault('history_manager', SparseHistoryManager)
+        kwargs.setdefault('historical_queryset', SparseHistoricalQuerySet)
+        kwargs.setdefault('no_db_index', ['id'])
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = tuple(sparse_fields)
+
+    def get_meta_options(self, model):
+        meta_fields = super().get_meta_options(model)
+        meta_fields['indexes'] = (*meta_fields.get('indexes', ()),
+                                  models.Index(
+                                      fields=['id', 'history_date'],
+                                      name=f'{model._meta.model_name[:14]}'
+                                      '_hist_id_date_idx'))
+        return meta_fields
+
+    def get_extra_fields(self, model, fields):
+        extra_fields = super().get_extra_fields(model, fields)
+        get_instance = extra_fields['instance'].fget
+
+        def get_filled_instance(history):
+            fill_sparse_history([history])
+            return get_instance(history)
+
+        def diff_against(history, old_history, *args, **kwargs):
+            fill_sparse_history([history, old_history])
+            return HistoricalChanges.diff_against(history, old_history, *args,
+                                                  **kwargs)
+
+        extra_fields.update({
+            'sparse_fields': self.sparse_fields,
+            'instance': property(get_filled_instance),
+            'history_object': SparseHistoricalObjectDescriptor(
+                model, self.fields_included(model)),
+            'diff_against': diff_against,
+        })
+        return extra_fields
+
+
+def fill_sparse_history(records):
+    """
+    Fill in elided fields on historical records in place
+    Uses a single query regardless of the number of records
+    """
+    pending = {
+        record.history_id: record
+        for record in records
+        if record is not None and record.history_elided_fields
+    }
+    if not pending:
+        return
+
+    model = type(next(iter(pending.values())))
+    date_ranges = {}
+    for record in pending.values():
+        earliest, latest = date_ranges.get(
+            record.id, (record.history_date, record.history_date))
+        date_ranges[record.id] = (min(earliest, record.history_date),
+                                  max(latest, record.history_date))
+
+    # Only read each todo's revisions since the latest checkpoint before its
+    # earliest pending record
+    revisions = Q()
+    for todo_id, (earliest, latest) in date_ranges.items():
+        revisions |= Q(id=todo_id,
+                       history_date__gte=_checkpoint_date(
+                           model, todo_id, earliest),
+                       history_date__lte=latest)
+    rows = model.objects.filter(revisions).order_by('id', 'history_date',
+                                                    'history_id')
+    rows = rows.values('id', 'history_id', 'history_elided_fields',
+                       *model.sparse_fields)
+
+    for row in resolve_sparse_rows(rows, model.sparse_fields):
+        record = pending.pop(row['history_id'], None)
+        if record is not None:
+            for field in record.history_elided_fields:
+                setattr(record, field, row[field])
+            record.history_elided_fields = []
+
+
+def _revisions_since_checkpoint(model, todo_id):
+    """
+    Get the stored sparse fields of a todo's revisions since its latest
+    checkpoint, which are all that's needed to resolve their current values
+    Returns the newest revision first
+    """
+    checkpoint_date = model.objects.filter(
+        id=todo_id, history_checkpoint_distance=0).order_by(
+            '-history_date', '-history_id').values('history_date')[:1]
+    revisions = model.objects.filter(
+        id=todo_id, history_date__gte=Subquery(checkpoint_date)).order_by(
+            '-history_date', '-history_id')
+    return list(
+        revisions.values('history_elided_fields', 'history_checkpoint_distance',
+                         *model.sparse_fields))
+
+
+def _checkpoint_date(model, todo_id, history_date):
+    """
+    Subquery for the date of a todo's latest checkpoint at or before
+    history_date, or the earliest date if its history before then was removed
+    """
+    checkpoints = model.objects.filter(id=todo_id,
+                                       history_checkpoint_distance=0,
+                                       history_date__lte=history_date)
+    return Coalesce(
+        Subquery(
+            checkpoints.order_by('-history_date',
+                                 '-history_id').values('history_date')[:1]),
+        Value(datetime.min.replace(tzinfo=dt_timezone.utc)))
+
+
+def resolve_sparse_rows(rows, sparse_fields):
+    """
+    Fill in elided fields on the value dicts of historical rows
+    Rows must be grouped by id and ordered oldest first for each id
+    """
+    current_id = None
+    stored_values = {}
+    for row in rows:
+        if row['id'] != current_id:
+            current_id = row['id']
+            stored_values = {}
+        for field in sparse_fields:
+            if field in row['history_elided_fields']:
+                row[field] = stored_values.get(field)
+            else:
+                stored_values[field] = row[field]
+        yield row
+
+
+@receiver(pre_save)
+# pylint: disable=unused-argument
+def elide_unchanged_fields(sender, instance, raw=False, **kwargs):
+    """
+    Before saving a historical record, elide sparse fields which are
+    unchanged since the previous revision unless a checkpoint is due
+
+    Runs on pre_save rather than pre_create_historical_record so values set on
+    the record by pre_create_historical_record handlers can be elided too.
+    """
+    if raw or not issubclass(sender, SparseHistoricalModel):
+        return
+    checkpoint_interval = settings.TODO_HISTORY_CHECKPOINT_INTERVAL
+    if (not settings.TODO_HISTORY_SPARSE or instance.history_id is not None or
+            instance.history_type != '~' or checkpoint_interval <= 1):
+        return
+
+    recent = _revisions_since_checkpoint(sender, instance.id)
+    if not recent:
+        # There's no checkpoint to resolve the previous values from, store a
+        # full copy
+        return
+    distance = recent[0]['history_checkpoint_distance'] + 1
+    if distance >= checkpoint_interval:
+        return
+
+    previous_values = {}
+    for row in recent:
+        previous_values.update({
+            field: row[field]
+            for field in sender.sparse_fields
+            if field not in previous_values and
+            field not in row['history_elided_fields']
+        })
+    if len(previous_values) < len(sender.sparse_fields):
+        # History before the latest checkpoint was removed, store a full copy
+        return
+
+    elided_fields = [
+        field for field in sender.sparse_fields
+        if getattr(instance, field) == previous_values[field]
+    ]
+    for field in elided_fields:
+        model_field = sender._meta.get_field(field)
+        setattr(instance, field,
+                None if model_field.null else model_field.get_default())
+    instance.history_elided_fields = elided_fields
+    instance.history_checkpoint_distance = distance
@@ -0,0 +1,109 @@
+"""
+Cache of the rendered & compressed todo list
+
+Cached lists are keyed by a data version stamp which is replaced whenever a
+todo or label changes, so a cached list is never served after a write.
+Each owner has their own stamp which is combined with a stamp shared by all
+owners, so a todo change only invalidates its owner's list while a label
+change invalidates everyone's.
+"""
+import gzip
+import re
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+DATA_VERSION_KEY = 'todos:data_version'
+OWNER_DATA_VERSION_KEY = 'todos:data_version:{owner_id}'
+LIST_CACHE_KEY = 'todos:list:{data_version}'
+LIST_CACHE_SECONDS = 60 * 60
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def get_data_version(owner_id):
+    """
+    Get the current data version stamp of an owner's todo list
+    """
+    keys = [DATA_VERSION_KEY, _owner_data_version_key(owner_id)]
+    data_versions = cache.get_many(keys)
+    for key in keys:
+        if key not in data_versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            data_versions[key] = cache.get(key)
+    return '-'.join(data_versions[key] for key in keys)
+
+
+def bump_data_version(owner_id=None):
+    """
+    Replace the data version stamp of an owner so their previously cached lists
+    aren't served
+    Without an owner the shared stamp is replaced, invalidating every list
+
+    The stamp is replaced immediately and again after the transaction commits
+    so a list cached while the write was uncommitted isn't served either.
+    """
+    key = (DATA_VERSION_KEY
+           if owner_id is None else _owner_data_version_key(owner_id))
+    _set_new_data_version(key)
+    transaction.on_commit(lambda: _set_new_data_version(key))
+
+
+def get_cached_list(data_version):
+    """
+    Get the cached todo list for a data version, if any
+    """
+    entry = cache.get(LIST_CACHE_KEY.format(data_version=data_version))
+    if entry is None:
+        return None
+
+    # Snoozes expiring change the next wake up, so recompute once it passes
+    next_wake_up = entry['next_wake_up']
+    if next_wake_up is not None and next_wake_up <= timezone.now():
+        return None
+    return entry
+
+
+def cache_list(data_version, content, next_wake_up):
+    """
+    Compress and cache a rendered todo list for a data version
+    """
+    entry = {
+        'content': gzip.compress(content),
+        'next_wake_up': next_wake_up,
+    }
+    cache.set(LIST_CACHE_KEY.format(data_version=data_version), entry,
+              LIST_CACHE_SECONDS)
+    return entry
+
+
+def cached_list_response(request, entry):
+    """
+    Build a response for a cached todo list
+    The compressed bytes are sent as-is if the client accepts gzip
+    """
+    # pylint: disable=http-response-with-content-type-json
+    if ACCEPTS_GZIP_RE.search(request.headers.get('Accept-Encoding', '')):
+        response = HttpResponse(entry['content'],
+                                content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(entry['content']),
+                                content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if entry['next_wake_up'] is not None:
+        response['X-Next-Wake-Up'] = entry['next_wake_up'].isoformat()
+    return response
+
+
+def _owner_data_version_key(owner_id):
+    return OWNER_DATA_VERSION_KEY.format(owner_id=owner_id)
+
+
+def _set_new_data_version(key):
+    cache.set(key, uuid.uuid4().hex, None)
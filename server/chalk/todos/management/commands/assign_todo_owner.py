@@ -0,0 +1,47 @@
+"""
+Management command to assign todos without an owner to a user
+"""
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chalk.todos.models import RankOrderMetadata, TodoModel
+from chalk.todos.rank_scheme import get_rank_scheme
+from chalk.todos.signals import rebalance_rank_order
+
+
+class Command(BaseCommand):
+    """
+    Give todos created before todos had owners to a user
+    """
+    help = 'Assign todos without an owner to a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username',
+                            help='Username of the user to assign todos to')
+
+    def handle(self, *args, **options):
+        try:
+            owner = get_user_model().objects.get_by_natural_key(
+                options['username'])
+        except get_user_model().DoesNotExist as ex:
+            raise CommandError(f'Unknown user: {options["username"]}') from ex
+
+        history_model = apps.get_model('todos', 'HistoricalTodoModel')
+        with transaction.atomic():
+            # Add the todos after the user's own, keeping their order
+            max_rank = RankOrderMetadata.objects.for_owner(owner.id).max_rank
+            todos = list(
+                TodoModel.objects.select_for_update().filter(owner=None))
+            for todo in todos:
+                max_rank += get_rank_scheme().default_step
+                todo.owner = owner
+                todo.order_rank = max_rank
+            TodoModel.objects.bulk_update(todos, ['owner', 'order_rank'])
+            history_model.objects.filter(
+                id__in=[todo.id for todo in todos]).update(owner=owner)
+            # Updates the user's rank order metadata for the added todos
+            rebalance_rank_order(owner.id)
+        self.stdout.write(
+            f'Assigned {len(todos)} todos to {options["username"]}')
@@ -0,0 +1,38 @@
+"""
+Management command to clear snoozes which have already expired
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chalk.todos.models import TodoModel
+from chalk.todos.signals import clear_expired_snoozes
+
+
+class Command(BaseCommand):
+    """
+    Batch clear snoozed_until for todos whose snooze has expired
+    """
+    help = 'Clear snoozed_until on todos whose snooze has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Maximum number of todos to update per query (default: 500)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        cleared = 0
+        while True:
+            # The partial index on snoozed_until keeps this lookup limited to
+            # snoozed todos
+            batch_ids = list(
+                TodoModel.objects.filter(snoozed_until__lte=now).values_list(
+                    'id', flat=True)[:batch_size])
+            if not batch_ids:
+                break
+            cleared += clear_expired_snoozes(batch_ids, now)
+
+        self.stdout.write(f'Cleared {cleared} expired snoozes')
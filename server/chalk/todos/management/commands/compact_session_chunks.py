@@ -0,0 +1,28 @@
+"""
+Management command to compact staged session chunks into the bucket
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chalk.todos.session_staging import compact_sessions
+
+
+class Command(BaseCommand):
+    """
+    Compact staged sessions which are finished or idle into one object per
+    session in the session data bucket
+    """
+    help = ('Compact staged session chunks into the session data bucket.  Run '
+            'with --all before the staging directory is discarded')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all',
+                            action='store_true',
+                            help='Compact every staged session, even those '
+                            'which are still being appended to')
+
+    def handle(self, *args, **options):
+        idle_seconds = (None if options['all'] else
+                        settings.SESSION_COMPACT_IDLE_SECONDS)
+        compacted = compact_sessions(idle_seconds)
+        self.stdout.write(f'Compacted {compacted} sessions')
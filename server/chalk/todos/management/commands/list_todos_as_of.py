@@ -0,0 +1,52 @@
+"""
+Management command to list todos as they were at a point in time
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from chalk.todos.serializers import TodoSnapshotSerializer
+from chalk.todos.snapshots import todos_as_of
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the todo list as of a timestamp from the todo history
+    """
+    help = 'Output the todo list as it was at a timestamp as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'timestamp',
+            help='ISO 8601 timestamp, e.g. 2024-01-01T09:00:00Z.  Timestamps '
+            'without a timezone use the server timezone')
+        parser.add_argument(
+            '--owner',
+            help='Username of the owner to list todos for (default: all '
+            'owners)')
+
+    def handle(self, *args, **options):
+        try:
+            at = parse_datetime(options['timestamp'])
+        except ValueError:
+            at = None
+        if at is None:
+            raise CommandError(
+                f'Invalid ISO 8601 timestamp: {options["timestamp"]}')
+        if is_naive(at):
+            at = make_aware(at)
+
+        owner_id = None
+        if options['owner'] is not None:
+            try:
+                owner_id = get_user_model().objects.get_by_natural_key(
+                    options['owner']).id
+            except get_user_model().DoesNotExist as ex:
+                raise CommandError(f'Unknown owner: {options["owner"]}') from ex
+
+        todos = TodoSnapshotSerializer(todos_as_of(at, owner_id=owner_id),
+                                       many=True).data
+        self.stdout.write(json.dumps(todos, indent=2))
@@ -0,0 +1,66 @@
+"""
+Management command to carry the order of todos over to another ordering engine
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from chalk.todos.list_cache import bump_data_version
+from chalk.todos.models import TodoModel
+from chalk.todos.order_keys import keys_after
+from chalk.todos.rank_scheme import get_rank_scheme
+from chalk.todos.signals import rebalance_rank_order
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Set the order keys of todos from their ranks or their ranks from their
+    order keys, for each owner
+    """
+    help = ('Carry the order of todos over to the rank or fractional ordering '
+            'engine.  Run before changing TODO_ORDERING_ENGINE')
+
+    def add_arguments(self, parser):
+        parser.add_argument('engine',
+                            choices=['fractional', 'rank'],
+                            help='Ordering engine which will be used')
+
+    def handle(self, *args, **options):
+        owner_ids = list(TodoModel.objects.order_by().values_list(
+            'owner_id', flat=True).distinct())
+        todos_count = 0
+        for owner_id in owner_ids:
+            with transaction.atomic():
+                todos = TodoModel.objects.select_for_update().filter(
+                    owner_id=owner_id)
+                if options['engine'] == 'fractional':
+                    todos_count += _set_order_keys(todos)
+                else:
+                    todos_count += _set_order_ranks(todos)
+                    # Updates the owner's rank order metadata
+                    rebalance_rank_order(owner_id)
+                bump_data_version(owner_id)
+
+        self.stdout.write(f'Ordered {todos_count} todos of {len(owner_ids)} '
+                          f'owners for the {options["engine"]} engine')
+
+
+def _set_order_keys(todos):
+    todos = list(
+        todos.order_by(F('order_rank').asc(nulls_last=True), 'created_at'))
+    for todo, order_key in zip(todos, keys_after(None, len(todos))):
+        todo.order_key = order_key
+    TodoModel.objects.bulk_update(todos, ['order_key'], batch_size=BATCH_SIZE)
+    return len(todos)
+
+
+def _set_order_ranks(todos):
+    scheme = get_rank_scheme()
+    todos = list(
+        todos.order_by(F('order_key').asc(nulls_last=True), 'created_at'))
+    for index, todo in enumerate(todos):
+        todo.order_rank = scheme.initial_step + index * scheme.default_step
+    TodoModel.objects.bulk_update(todos, ['order_rank'], batch_size=BATCH_SIZE)
+    return len(todos)
@@ -0,0 +1,200 @@
+"""
+Management command to compare rank order schemes by replaying reorders
+"""
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chalk.todos.models import RankOrderMetadata, TodoModel
+from chalk.todos.rank_scheme import RankScheme, get_rank_scheme, use_rank_scheme
+from chalk.todos.signals import reorder_todo
+
+SIMULATION_USERNAME = 'rank-order-simulation@localhost'
+WORKLOADS = ('insert-top', 'drag-middle', 'append', 'mixed')
+
+
+class Command(BaseCommand):
+    """
+    Replay a reorder workload against each rank scheme and report how often
+    the todos are rebalanced & how long reorders take
+
+    Operations use the same reordering code as the API and run in a
+    transaction which is rolled back, so no data is kept.  Run against a local
+    database as rebalances lock the simulated todos.
+    """
+    help = ('Compare rank order schemes by replaying synthetic or recorded '
+            'reorder workloads')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scheme',
+            action='append',
+            type=_parse_scheme,
+            help='Rank scheme as INITIAL_STEP_EXP:DEFAULT_STEP_EXP:'
+            'REBALANCE_STEPS, e.g. 60:45:2 for steps of 2^60 & 2^45.  May be '
+            'repeated (default: the current scheme)')
+        parser.add_argument('--workload',
+                            choices=WORKLOADS,
+                            default='mixed',
+                            help='Synthetic workload to replay (default: '
+                            'mixed)')
+        parser.add_argument(
+            '--recorded',
+            help='JSON file of operations to replay instead of a synthetic '
+            'workload, e.g. [{"action": "create"}, {"action": "reorder", '
+            '"todo": -1, "relative": 0, "position": "before"}] where todos '
+            'are positions in the rank order')
+        parser.add_argument('--operations',
+                            type=int,
+                            default=1000,
+                            help='Number of synthetic operations (default: '
+                            '1000)')
+        parser.add_argument('--todos',
+                            type=int,
+                            default=50,
+                            help='Number of todos to start with (default: 50)')
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='Seed for the synthetic workload')
+
+    def handle(self, *args, **options):
+        if options['recorded'] is not None:
+            try:
+                with open(options['recorded'], encoding='utf-8') as file:
+                    operations = json.load(file)
+            except (OSError, ValueError) as ex:
+                raise CommandError(
+                    f'Unable to read {options["recorded"]}: {ex}') from ex
+        else:
+            operations = generate_workload(options['workload'],
+                                           options['operations'],
+                                           options['todos'],
+                                           random.Random(options['seed']))
+
+        for scheme in options['scheme'] or [get_rank_scheme()]:
+            with use_rank_scheme(scheme):
+                result = simulate(operations, options['todos'])
+            self.stdout.write(
+                f'{scheme}: {result["operations"]} operations, '
+                f'{result["rebalances"]} rebalances, '
+                f'{result["rows_rewritten"]} rows rewritten, '
+                f'p50 {result["p50_ms"]:.2f}ms, p99 {result["p99_ms"]:.2f}ms')
+
+
+def generate_workload(workload, count, initial_todos, rng):
+    """
+    Generate operations for a synthetic workload
+    Todos are referenced by their position in the rank order
+
+    insert-top: create todos and move them to the top
+    drag-middle: move random todos next to the middle todo
+    append: create todos at the bottom
+    mixed: a random mix of the above
+    """
+    operations = []
+    todos_count = initial_todos
+    for _ in range(count):
+        kind = workload
+        if workload == 'mixed':
+            kind = rng.choice(WORKLOADS[:-1])
+        if kind in ('insert-top', 'append') or todos_count < 2:
+            operations.append({'action': 'create'})
+            todos_count += 1
+        if kind == 'insert-top':
+            operations.append({
+                'action': 'reorder',
+                'todo': -1,
+                'relative': 0,
+                'position': 'before',
+            })
+        elif kind == 'drag-middle':
+            operations.append({
+                'action': 'reorder',
+                'todo': rng.randrange(todos_count),
+                'relative': todos_count // 2,
+                'position': rng.choice(['before', 'after']),
+            })
+    return operations
+
+
+def simulate(operations, initial_todos):
+    """
+    Replay operations against a new owner's todos using the current scheme
+    Latencies are of reorders, including any rebalance they trigger.
+    Everything is rolled back afterwards.
+    """
+    latencies = []
+    rebalances = 0
+    rows_rewritten = 0
+    with transaction.atomic():
+        owner = get_user_model().objects.create(username=SIMULATION_USERNAME)
+        for index in range(initial_todos):
+            TodoModel.objects.create(description=f'Todo {index}', owner=owner)
+        order_metadata = RankOrderMetadata.objects.for_owner(owner.id)
+
+        for operation in operations:
+            apply_operation = _prepare_operation(operation, owner)
+            last_rebalanced_at = order_metadata.last_rebalanced_at
+            start_time = time.perf_counter()
+            apply_operation()
+            if operation['action'] == 'reorder':
+                latencies.append(time.perf_counter() - start_time)
+
+            order_metadata.refresh_from_db()
+            if order_metadata.last_rebalanced_at != last_rebalanced_at:
+                rebalances += 1
+                rows_rewritten += order_metadata.last_rebalance_todos_count
+        transaction.set_rollback(True)
+
+    percentiles = [0] * 99
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'operations': len(operations),
+        'rebalances': rebalances,
+        'rows_rewritten': rows_rewritten,
+        'p50_ms': percentiles[49] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+    }
+
+
+def _prepare_operation(operation, owner):
+    # Look up the todos up front so the lookups aren't timed
+    try:
+        if operation['action'] == 'create':
+            return lambda: TodoModel.objects.create(description='Simulated',
+                                                    owner=owner)
+
+        todo_ids = list(
+            TodoModel.objects.filter(owner=owner).values_list('id', flat=True))
+        todo = TodoModel.objects.get(id=todo_ids[operation['todo']])
+        relative_id = todo_ids[operation['relative']]
+        position = operation['position']
+    except (IndexError, KeyError, TypeError) as ex:
+        raise CommandError(f'Invalid operation: {operation}') from ex
+    if todo.id == relative_id:
+        return lambda: None
+    return lambda: reorder_todo(todo, relative_id, position)
+
+
+def _parse_scheme(value):
+    try:
+        initial_exp, default_exp, rebalance_steps = (
+            int(part) for part in value.split(':'))
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(
+            f'Invalid rank scheme {value}, expected e.g. 60:45:2') from ex
+    if not 0 < default_exp <= initial_exp < 63:
+        raise argparse.ArgumentTypeError(
+            f'Invalid rank scheme {value}, steps must be between 2^1 & 2^62')
+    return RankScheme(initial_step=math.pow(2, initial_exp),
+                      default_step=math.pow(2, default_exp),
+                      rebalance_steps=rebalance_steps)
@@ -0,0 +1,21 @@
+# Generated by Django 6.1 on 2026-10-19 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos',
+         '0013_historicaltodomodel_snoozed_until_todomodel_snoozed_until'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todomodel',
+            index=models.Index(
+                condition=models.Q(('snoozed_until__isnull', False)),
+                fields=['snoozed_until'],
+                name='todo_snoozed_until_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0014_todomodel_snoozed_until_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalrankordermetadata',
+            name='last_rebalance_todos_count',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='rankordermetadata',
+            name='last_rebalance_todos_count',
+            field=models.IntegerField(null=True),
+        ),
+    ]
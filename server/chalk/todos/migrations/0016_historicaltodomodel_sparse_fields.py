@@ -0,0 +1,23 @@
+# Generated by Django 6.1 on 2026-10-19 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0015_rankordermetadata_last_rebalance_todos_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltodomodel',
+            name='history_checkpoint_distance',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicaltodomodel',
+            name='history_elided_fields',
+            field=models.JSONField(default=list),
+        ),
+    ]
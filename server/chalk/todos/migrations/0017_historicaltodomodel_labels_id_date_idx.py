@@ -0,0 +1,30 @@
+# Generated by Django 6.1 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0016_historicaltodomodel_sparse_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltodomodel',
+            name='history_labels',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='historicaltodomodel',
+            name='id',
+            field=models.IntegerField(auto_created=True,
+                                      blank=True,
+                                      verbose_name='ID'),
+        ),
+        migrations.AddIndex(
+            model_name='historicaltodomodel',
+            index=models.Index(fields=['id', 'history_date'],
+                               name='todomodel_hist_id_date_idx'),
+        ),
+    ]
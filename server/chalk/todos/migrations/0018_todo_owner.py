@@ -0,0 +1,104 @@
+# Generated by Django 6.1 on 2026-10-19 10:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations, models
+
+
+def _existing_owner(apps):
+    # TODO_OWNER_USERNAME if configured, otherwise the first superuser,
+    # otherwise the sole user if there's just one
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    if settings.TODO_OWNER_USERNAME:
+        try:
+            return User.objects.get(username=settings.TODO_OWNER_USERNAME)
+        except User.DoesNotExist as ex:
+            raise ImproperlyConfigured(
+                f'TODO_OWNER_USERNAME {settings.TODO_OWNER_USERNAME} '
+                'is not a user') from ex
+
+    superuser = User.objects.filter(is_superuser=True).order_by('pk').first()
+    if superuser is not None:
+        return superuser
+    users = list(User.objects.order_by('pk')[:2])
+    return users[0] if len(users) == 1 else None
+
+
+def assign_existing_owner(apps, schema_editor):
+    """
+    Give the todos created before todos had owners to a user, so they aren't
+    orphaned
+    """
+    TodoModel = apps.get_model('todos', 'TodoModel')
+    owner = _existing_owner(apps)
+    if owner is None:
+        if TodoModel.objects.filter(owner=None).exists():
+            raise ImproperlyConfigured(
+                'Existing todos need an owner, but there are several users '
+                'and no superuser. Set TODO_OWNER_USERNAME to the user to '
+                'assign them to')
+        return
+
+    for model_name in [
+            'TodoModel', 'HistoricalTodoModel', 'RankOrderMetadata',
+            'HistoricalRankOrderMetadata'
+    ]:
+        model = apps.get_model('todos', model_name)
+        model.objects.filter(owner=None).update(owner=owner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0017_historicaltodomodel_labels_id_date_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalrankordermetadata',
+            name='owner',
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name='+',
+                to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='historicaltodomodel',
+            name='owner',
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name='+',
+                to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='rankordermetadata',
+            name='owner',
+            field=models.OneToOneField(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='rank_order_metadata',
+                to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='todomodel',
+            name='owner',
+            field=models.ForeignKey(null=True,
+                                    on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='todos',
+                                    to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='todomodel',
+            index=models.Index(fields=['owner', 'archived', 'order_rank'],
+                               name='todo_owner_archived_rank_idx'),
+        ),
+        migrations.RunPython(assign_existing_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.1 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0018_todo_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltodomodel',
+            name='order_key',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='todomodel',
+            name='order_key',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='todomodel',
+            index=models.Index(fields=['owner', 'archived', 'order_key'],
+                               name='todo_owner_archived_key_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.1 on 2026-10-19 11:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0019_todomodel_order_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEventModel',
+            fields=[
+                ('id',
+                 models.AutoField(auto_created=True,
+                                  primary_key=True,
+                                  serialize=False,
+                                  verbose_name='ID')),
+                ('created_at',
+                 models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('model', models.CharField(max_length=16)),
+                ('event', models.JSONField()),
+                ('owner',
+                 models.ForeignKey(
+                     null=True,
+                     on_delete=django.db.models.deletion.CASCADE,
+                     related_name='+',
+                     to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -4,15 +4,64 @@ Django ORM models for Todos
 import math
 import re
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import F
+from django.db.models import F, Max, Min, Q
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
-from chalk.todos.consts import RANK_ORDER_DEFAULT_STEP
+from chalk.todos.history import SparseHistoricalModel, SparseHistoricalRecords
+from chalk.todos.order_keys import key_between, uses_order_keys
+from chalk.todos.rank_scheme import get_rank_scheme
+
+
+class TodoQuerySet(models.QuerySet):
+    """
+    QuerySet for todos with helpers for snooze handling
+    """
+
+    def visible(self, now=None):
+        """
+        Todos which are not currently snoozed
+        """
+        now = now or timezone.now()
+        return self.filter(
+            Q(snoozed_until__isnull=True) | Q(snoozed_until__lte=now))
+
+    def next_wake_up(self, now=None):
+        """
+        The earliest time a snoozed, unarchived todo becomes visible again
+        or None if no todos are snoozed
+        """
+        now = now or timezone.now()
+        return self.filter(archived=False, snoozed_until__gt=now).aggregate(
+            next_wake_up=Min('snoozed_until'))['next_wake_up']
+
+    def clear_expired_snoozes(self, now=None):
+        """
+        Clear snoozed_until for todos whose snooze has already expired
+        Returns the number of todos updated
+
+        The update doesn't send signals, use signals.clear_expired_snoozes to
+        also record history, publish changes & invalidate cached lists
+        """
+        now = now or timezone.now()
+        expired = self.filter(snoozed_until__lte=now)
+        return expired.update(snoozed_until=None, version=F('version') + 1)
+
+
+class HistoricalTodoBase(SparseHistoricalModel):
+    """
+    Base for todo history records which also tracks the todo's labels
+    """
+    # Sorted names of the todo's labels as of this revision
+    history_labels = models.JSONField(null=True)
+
+    class Meta:
+        abstract = True
 
 
 class TodoModel(models.Model):
@@ -26,15 +75,63 @@ class TodoModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     description = models.TextField()
     order_rank = models.BigIntegerField(null=True)
+    # Used instead of order_rank by the fractional ordering engine
+    order_key = models.TextField(null=True)
+    # Each owner's todos are ranked & rebalanced independently
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL,
+                              null=True,
+                              on_delete=models.CASCADE,
+                              related_name='todos')
     snoozed_until = models.DateTimeField(null=True)
     version = models.IntegerField(default=1)
-    history = HistoricalRecords()
+    # Only changed descriptions, timestamps & labels are stored for each
+    # revision
+    history = SparseHistoricalRecords(bases=(HistoricalTodoBase,),
+                                      sparse_fields=(
+                                          'description',
+                                          'archived_at',
+                                          'completed_at',
+                                          'order_rank',
+                                          'order_key',
+                                          'snoozed_until',
+                                          'history_labels',
+                                      ))
+
+    objects = TodoQuerySet.as_manager()
+
+    # When set, saving only updates the row if it is still at this version
+    # Conflicting saves raise NotUpdated rather than overwriting other edits
+    expected_version = None
 
     def __str__(self):
         return self.description
 
+    def save(self, *args, **kwargs):
+        if self.expected_version is not None:
+            kwargs['force_update'] = True
+        super().save(*args, **kwargs)
+        self.expected_version = None
+
+    def _do_update(self, base_qs, *args, **kwargs):
+        # Make the UPDATE conditional on the version so checking for
+        # conflicting edits doesn't require locking the row
+        if self.expected_version is not None:
+            base_qs = base_qs.filter(version=self.expected_version)
+        return super()._do_update(base_qs, *args, **kwargs)
+
     class Meta:
         ordering = ['order_rank', 'created_at']
+        indexes = [
+            # Covers listing & rebalancing an owner's todos in rank order
+            models.Index(fields=['owner', 'archived', 'order_rank'],
+                         name='todo_owner_archived_rank_idx'),
+            models.Index(fields=['owner', 'archived', 'order_key'],
+                         name='todo_owner_archived_key_idx'),
+            # Partial index so snooze lookups only scan snoozed todos
+            models.Index(fields=['snoozed_until'],
+                         name='todo_snoozed_until_idx',
+                         condition=Q(snoozed_until__isnull=False)),
+        ]
 
 
 @receiver(pre_save, sender=TodoModel)
@@ -42,7 +139,8 @@ class TodoModel(models.Model):
 def update_derived_fields(sender, instance, *args, **kwargs):
     """
     Before saving, update timestamps if necessary
-    Also set the order rank if it is not set
+    Also set the order rank, or the order key for new todos if using the
+    fractional ordering engine
     Increment version for updates
     """
     if instance.completed and instance.completed_at is None:
@@ -58,11 +156,16 @@ def update_derived_fields(sender, instance, *args, **kwargs):
     if instance.pk is not None:
         instance.version = F('version') + 1
 
-    if instance.order_rank is None:
-        order_metadata = RankOrderMetadata.objects.first()
-        if order_metadata is not None:
-            instance.order_rank = (order_metadata.max_rank +
-                                   RANK_ORDER_DEFAULT_STEP)
+    if uses_order_keys():
+        if instance.pk is None and instance.order_key is None:
+            last_key = TodoModel.objects.filter(
+                owner_id=instance.owner_id).aggregate(
+                    last_key=Max('order_key'))['last_key']
+            instance.order_key = key_between(last_key, None)
+    elif instance.order_rank is None:
+        order_metadata = RankOrderMetadata.objects.for_owner(instance.owner_id)
+        instance.order_rank = (order_metadata.max_rank +
+                               get_rank_scheme().default_step)
 
 
 def validate_label_name(value):
@@ -127,20 +230,68 @@ class LabelModel(models.Model):
             })
 
 
+class ChangeEventModel(models.Model):
+    """
+    A todo or label change published to the change stream
+    Ids are assigned by the database, so any server process can replay the
+    changes a reconnecting client missed
+    """
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    model = models.CharField(max_length=16)
+    # Owner of the changed todo, None for labels which are shared
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL,
+                              null=True,
+                              on_delete=models.CASCADE,
+                              related_name='+')
+    event = models.JSONField()
+
+    def __str__(self):
+        return f'{self.id}: {self.event}'
+
+
+class RankOrderMetadataQuerySet(models.QuerySet):
+    """
+    QuerySet for the rank order metadata of each owner
+    """
+
+    def for_owner(self, owner_id):
+        """
+        Get the rank order metadata for an owner's todos
+        Created as if freshly rebalanced for owners without any yet
+        """
+        scheme = get_rank_scheme()
+        order_metadata, _ = self.get_or_create(
+            owner_id=owner_id,
+            defaults={
+                'closest_rank_min': scheme.initial_step,
+                'closest_rank_max': scheme.initial_step + scheme.default_step,
+                'max_rank': scheme.initial_step - scheme.default_step,
+            })
+        return order_metadata
+
+
 class RankOrderMetadata(models.Model):
     """
-    Metadata about the closest entries in the rank ordering
+    Metadata about the closest entries in the rank ordering of an owner's todos
     Useful for deciding if a rebalance is necessary
+    Todos without an owner share the metadata without an owner
     """
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                 null=True,
+                                 on_delete=models.CASCADE,
+                                 related_name='rank_order_metadata')
     closest_rank_min = models.BigIntegerField(null=True)
     closest_rank_max = models.BigIntegerField(null=True)
     closest_rank_distance = models.BigIntegerField(null=True)
     closest_rank_steps = models.IntegerField(null=True)
     last_rebalanced_at = models.DateTimeField(null=True)
     last_rebalance_duration = models.FloatField(null=True)
+    last_rebalance_todos_count = models.IntegerField(null=True)
     max_rank = models.BigIntegerField(null=True)
     history = HistoricalRecords()
 
+    objects = RankOrderMetadataQuerySet.as_manager()
+
     def __str__(self):
         return (f"[{self.closest_rank_min}-{self.closest_rank_max}] "
                 f"({self.closest_rank_steps}) last rebalanced at: "
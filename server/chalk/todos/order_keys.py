@@ -0,0 +1,153 @@
+"""
+Fractional order keys for todos
+
+With the 'fractional' ordering engine, todos are ordered by a variable length
+key rather than by their order_rank.  A key can always be generated between
+any 2 keys, so reordering a todo only updates that todo and the rank order
+never needs to be rebalanced.
+
+Keys are an integer part followed by an optional fraction, in base 36.  The
+first character of the integer part gives its length, so appending or
+prepending todos increments or decrements the integer and keys only grow
+logarithmically.  Keys between adjacent integers extend the fraction, which
+never ends in '0'.  Only digits & lowercase letters are used so keys sort the
+same under bytewise & locale aware collations.
+"""
+from django.conf import settings
+
+ORDER_KEY_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Integer parts starting with this have a single digit, later characters have
+# longer positive integers & earlier characters longer negative integers
+ZERO_HEAD = 'i'
+FIRST_KEY = ZERO_HEAD + ORDER_KEY_DIGITS[0]
+SMALLEST_INTEGER = ORDER_KEY_DIGITS[0] * 20
+
+
+def uses_order_keys():
+    """
+    Whether todos are ordered by their order_key rather than order_rank
+    """
+    return settings.TODO_ORDERING_ENGINE == 'fractional'
+
+
+def todo_ordering():
+    """
+    Fields todos are listed in order by, for the ordering engine in use
+    """
+    if uses_order_keys():
+        return ['order_key', 'created_at']
+    return ['order_rank', 'created_at']
+
+
+def key_between(before, after):
+    """
+    Generate a key which sorts between 2 keys
+    None is the start of the list for before & the end of the list for after
+
+    Raises:
+        ValueError: If before doesn't sort before after
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'Order key {before!r} must be before {after!r}')
+
+    if before is None:
+        return _key_before(after)
+
+    integer = _integer_part(before)
+    fraction = before[len(integer):]
+    if after is not None and _integer_part(after) == integer:
+        return integer + _midpoint(fraction, after[len(integer):])
+    next_integer = _increment_integer(integer)
+    if next_integer is not None and (after is None or next_integer < after):
+        return next_integer
+    return integer + _midpoint(fraction, None)
+
+
+def keys_after(before, count):
+    """
+    Generate count ascending keys after a key, e.g. to key existing todos
+    """
+    keys = []
+    for _ in range(count):
+        before = key_between(before, None)
+        keys.append(before)
+    return keys
+
+
+def _key_before(after):
+    if after is None:
+        return FIRST_KEY
+    integer = _integer_part(after)
+    if integer == SMALLEST_INTEGER:
+        return integer + _midpoint('', after[len(integer):])
+    if integer < after:
+        return integer
+    return _decrement_integer(integer)
+
+
+def _midpoint(before, after):
+    """
+    Fraction digits between 2 fractions, where after may be None for 1
+    """
+    if after is not None:
+        # Keep the common prefix, treating before as padded with zeros
+        prefix = 0
+        while prefix < len(after) and (before[prefix] if prefix < len(before)
+                                       else '0') == after[prefix]:
+            prefix += 1
+        if prefix:
+            return after[:prefix] + _midpoint(before[prefix:], after[prefix:])
+
+    low = ORDER_KEY_DIGITS.index(before[0]) if before else 0
+    high = (ORDER_KEY_DIGITS.index(after[0])
+            if after is not None else len(ORDER_KEY_DIGITS))
+    if high - low > 1:
+        return ORDER_KEY_DIGITS[(low + high) // 2]
+    # The first digits are adjacent, so a longer fraction is needed
+    if after is not None and len(after) > 1:
+        return after[0]
+    return ORDER_KEY_DIGITS[low] + _midpoint(before[1:], None)
+
+
+def _integer_length(head):
+    return abs(
+        ORDER_KEY_DIGITS.index(head) - ORDER_KEY_DIGITS.index(ZERO_HEAD)) + 1
+
+
+def _integer_part(key):
+    length = _integer_length(key[0])
+    if len(key) <= length:
+        raise ValueError(f'Invalid order key {key!r}')
+    return key[:length + 1]
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = ORDER_KEY_DIGITS.index(digits[index])
+        if digit < len(ORDER_KEY_DIGITS) - 1:
+            digits[index] = ORDER_KEY_DIGITS[digit + 1]
+            return head + ''.join(digits)
+        digits[index] = ORDER_KEY_DIGITS[0]
+
+    # Overflowed into the next length of integers
+    if head == ORDER_KEY_DIGITS[-1]:
+        return None
+    head = ORDER_KEY_DIGITS[ORDER_KEY_DIGITS.index(head) + 1]
+    return head + ORDER_KEY_DIGITS[0] * _integer_length(head)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = ORDER_KEY_DIGITS.index(digits[index])
+        if digit > 0:
+            digits[index] = ORDER_KEY_DIGITS[digit - 1]
+            return head + ''.join(digits)
+        digits[index] = ORDER_KEY_DIGITS[-1]
+
+    # Underflowed into the previous length of integers
+    if head == ORDER_KEY_DIGITS[0]:
+        return None
+    head = ORDER_KEY_DIGITS[ORDER_KEY_DIGITS.index(head) - 1]
+    return head + ORDER_KEY_DIGITS[-1] * _integer_length(head)
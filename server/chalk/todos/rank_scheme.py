@@ -0,0 +1,57 @@
+"""
+Parameters of the todo rank order
+
+The steps between ranks & the rebalance threshold default to the values in
+consts, and can be swapped for the current context to compare schemes, e.g. by
+the simulate_rank_order command.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+
+from chalk.todos.consts import (RANK_ORDER_DEFAULT_STEP,
+                                RANK_ORDER_INITIAL_STEP,
+                                RANK_ORDER_REBALANCE_STEPS)
+
+
+class RankScheme:  # pylint: disable=R0903
+    """
+    Steps used when ranking todos & the threshold for rebalancing them
+    """
+
+    def __init__(self,
+                 initial_step=RANK_ORDER_INITIAL_STEP,
+                 default_step=RANK_ORDER_DEFAULT_STEP,
+                 rebalance_steps=RANK_ORDER_REBALANCE_STEPS):
+        # Rank of the first todo after a rebalance
+        self.initial_step = initial_step
+        # Distance between todos after a rebalance or when appending
+        self.default_step = default_step
+        # Rebalance once the closest todos can only fit this many halvings
+        self.rebalance_steps = rebalance_steps
+
+    def __str__(self):
+        return (f'2^{math.log2(self.initial_step):g}:'
+                f'2^{math.log2(self.default_step):g}:{self.rebalance_steps}')
+
+
+_rank_scheme = ContextVar('rank_scheme', default=RankScheme())
+
+
+def get_rank_scheme():
+    """
+    Get the rank scheme in use
+    """
+    return _rank_scheme.get()
+
+
+@contextmanager
+def use_rank_scheme(scheme):
+    """
+    Use a different rank scheme within the context
+    """
+    token = _rank_scheme.set(scheme)
+    try:
+        yield scheme
+    finally:
+        _rank_scheme.reset(token)
@@ -0,0 +1,101 @@
+"""
+Readiness of the server's dependencies for the readyz probe
+
+Checking the database on every probe would add load, so a background thread
+checks the database is reachable & fully migrated every READINESS_CHECK_SECONDS
+and probes only read the latest result.  Results older than
+READINESS_STALE_SECONDS are reported as not ready, so a check hanging on an
+unresponsive database proxy also takes the server out of rotation.
+"""
+import logging
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+READINESS_CHECK_SECONDS = 5
+READINESS_STALE_SECONDS = 30
+
+
+class DependencyChecks:
+    """
+    Latest result of checking the server's dependencies
+    """
+
+    def __init__(self):
+        self.checked_at = None
+        self.checks = {}
+        # Migrations can't be unapplied from under a running server, so
+        # they're only checked until they've all been applied once
+        self.migrated = False
+
+    def refresh(self, db_connection):
+        """
+        Check the database is reachable & has no unapplied migrations
+        """
+        checks = {'database': 'ok', 'migrations': 'ok'}
+        try:
+            with db_connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not self.migrated:
+                executor = MigrationExecutor(db_connection)
+                plan = executor.migration_plan(
+                    executor.loader.graph.leaf_nodes())
+                self.migrated = not plan
+                if plan:
+                    checks['migrations'] = f'{len(plan)} unapplied'
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception('Readiness check of the database failed')
+            checks = {'database': 'unavailable', 'migrations': 'unknown'}
+
+        # Replace the result in one assignment so probes see a consistent one
+        self.checks, self.checked_at = checks, time.monotonic()
+        return checks
+
+    def get_readiness(self):
+        """
+        Whether the server is ready & the checks it's based on
+        """
+        checks, checked_at = self.checks, self.checked_at
+        if checked_at is None:
+            return False, {'database': 'unknown', 'migrations': 'unknown'}
+        if time.monotonic() - checked_at > READINESS_STALE_SECONDS:
+            return False, {**checks, 'database': 'stale'}
+        return all(check == 'ok' for check in checks.values()), checks
+
+
+_dependency_checks = None  # pylint: disable=invalid-name
+_dependency_checks_lock = threading.Lock()
+
+
+def get_dependency_checks():
+    """
+    Get the dependency checks for this process
+    Starts checking in the background the first time it's used
+    """
+    global _dependency_checks  # pylint: disable=global-statement
+    with _dependency_checks_lock:
+        if _dependency_checks is None:
+            _dependency_checks = DependencyChecks()
+            threading.Thread(target=_check_dependencies,
+                             args=(_dependency_checks,),
+                             daemon=True).start()
+        return _dependency_checks
+
+
+def _check_dependencies(dependency_checks):
+    """
+    Refresh the dependency checks periodically
+    Runs in a background thread & connects for each check, so a check
+    exercises connecting through the database proxy like requests do
+    """
+    while True:
+        db_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            dependency_checks.refresh(db_connection)
+        finally:
+            db_connection.close()
+        time.sleep(READINESS_CHECK_SECONDS)
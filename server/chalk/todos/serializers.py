@@ -47,6 +47,7 @@ class TodoSerializer(serializers.ModelSerializer):
     """
     labels = LabelStringField(many=True)
     order_rank = serializers.IntegerField(read_only=True)
+    version = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = TodoModel
@@ -63,3 +64,12 @@ class TodoSerializer(serializers.ModelSerializer):
             'snoozed_until',
             'version',
         ]
+
+
+class TodoSnapshotSerializer(TodoSerializer):
+    """
+    Serializer for todos rebuilt from their history
+    The todos are dicts with their labels as a list of label names
+    """
+    labels = serializers.ListField(child=serializers.CharField(),
+                                   read_only=True)
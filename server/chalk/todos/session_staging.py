@@ -0,0 +1,268 @@
+"""
+Staging of session data which recorders append in chunks
+
+Recorders append chunks of rrweb events to a session with increasing sequence
+numbers.  Each chunk is staged on local disk in a file named by its sequence
+number, so retried chunks are ignored and chunks which arrive out of order are
+still read back in order.  Sessions which are finished or have been idle for
+SESSION_COMPACT_IDLE_SECONDS are compacted into a single object per session in
+the bucket, in the format session stitching produces, so they don't need
+stitching.  Chunks appended to a session after it's compacted are merged into
+its object in sequence order when they're compacted, skipping chunks it
+already has.  Staging is local to each server, so the object is only replaced
+if no other server compacted the session since it was read.
+"""
+from contextlib import contextmanager
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+from django.conf import settings
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.cloud import storage
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+logger = logging.getLogger(__name__)
+
+SESSION_BUCKET_ID = 'flipperkid-chalk-web-session-data'
+COMPACTED_SESSION_PREFIX = 'sessions/'
+MAX_CHUNK_SIZE = 1024 * 1024  # 1 MiB limit
+COMPACT_CHECK_SECONDS = 60
+# Attempts to merge chunks into a session's object which another server is
+# compacting chunks into at the same time
+UPLOAD_ATTEMPTS = 3
+SESSION_GUID_RE = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+CHUNK_SUFFIX = '.ndjson'
+METADATA_FILENAME = 'session.json'
+FINAL_FILENAME = 'final'
+# Sessions are moved here while they're compacted, so chunks appended
+# meanwhile start a new staged session
+COMPACTING_DIRNAME = '.compacting'
+STAGING_LOCK_FILENAME = '.staging.lock'
+COMPACTING_LOCK_FILENAME = '.compacting.lock'
+
+
+class NDJSONParser(BaseParser):  # pylint: disable=R0903
+    """
+    Parse newline delimited JSON into a list of the values on each line
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        data = stream.read(MAX_CHUNK_SIZE + 1)
+        if len(data) > MAX_CHUNK_SIZE:
+            raise ParseError(
+                f'Chunk exceeds maximum size of {MAX_CHUNK_SIZE} bytes')
+        try:
+            return [
+                json.loads(line)
+                for line in data.decode('utf-8').splitlines()
+                if line.strip()
+            ]
+        except ValueError as ex:
+            raise ParseError(f'NDJSON parse error - {ex}') from ex
+
+
+def stage_chunk(session_guid, seq, events, environment, final=False):
+    """
+    Stage a chunk of events appended to a session
+    Marking the session final compacts it without waiting for it to idle
+
+    Returns:
+        False if the chunk was already staged, e.g. when a client retries
+    """
+    session_dir = os.path.join(settings.SESSION_STAGING_DIR, session_guid)
+    chunk_path = os.path.join(session_dir, f'{seq:010d}{CHUNK_SUFFIX}')
+    with _lock(STAGING_LOCK_FILENAME):
+        os.makedirs(session_dir, exist_ok=True)
+        staged = not os.path.exists(chunk_path)
+        if staged:
+            _write_atomic(chunk_path,
+                          ''.join(json.dumps(event) + '\n' for event in events))
+
+        metadata_path = os.path.join(session_dir, METADATA_FILENAME)
+        if not os.path.exists(metadata_path):
+            _write_atomic(metadata_path,
+                          json.dumps({'environment': environment}))
+        if final:
+            _write_atomic(os.path.join(session_dir, FINAL_FILENAME), '')
+    return staged
+
+
+def compact_sessions(idle_seconds=None):
+    """
+    Compact staged sessions which are finished or idle into the bucket
+    Without idle_seconds every staged session is compacted
+
+    Returns:
+        The number of sessions compacted, skipping if another process is
+        already compacting
+    """
+    staging_dir = settings.SESSION_STAGING_DIR
+    compacting_dir = os.path.join(staging_dir, COMPACTING_DIRNAME)
+    with _lock(COMPACTING_LOCK_FILENAME, blocking=False) as locked:
+        if not locked:
+            return 0
+
+        idle_before = time.time() - (idle_seconds or 0)
+        with _lock(STAGING_LOCK_FILENAME):
+            os.makedirs(compacting_dir, exist_ok=True)
+            for session_guid in os.listdir(staging_dir):
+                session_dir = os.path.join(staging_dir, session_guid)
+                if not SESSION_GUID_RE.match(session_guid):
+                    continue
+                if idle_seconds is None or _is_finished(session_dir,
+                                                        idle_before):
+                    # Prefix with the time so sessions compacted more than
+                    # once are merged in order
+                    os.rename(
+                        session_dir,
+                        os.path.join(compacting_dir,
+                                     f'{time.time_ns()}-{session_guid}'))
+
+        # Includes sessions which failed to upload on a previous attempt
+        compacting = sorted(os.listdir(compacting_dir))
+        if not compacting:
+            return 0
+        bucket = storage.Client().bucket(SESSION_BUCKET_ID)
+        for name in compacting:
+            session_dir = os.path.join(compacting_dir, name)
+            _upload_session(bucket, name.split('-', 1)[1], session_dir)
+            shutil.rmtree(session_dir)
+        return len(compacting)
+
+
+_compactor = None  # pylint: disable=invalid-name
+_compactor_lock = threading.Lock()
+
+
+def start_compactor():
+    """
+    Start compacting sessions in the background for this process, if it
+    hasn't already started
+    """
+    global _compactor  # pylint: disable=global-statement
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = threading.Thread(target=_compact_periodically,
+                                          daemon=True)
+            _compactor.start()
+
+
+def _compact_periodically():
+    while True:
+        time.sleep(COMPACT_CHECK_SECONDS)
+        try:
+            compact_sessions(settings.SESSION_COMPACT_IDLE_SECONDS)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception('Compacting staged sessions failed')
+
+
+def _is_finished(session_dir, idle_before):
+    names = os.listdir(session_dir)
+    return FINAL_FILENAME in names or all(
+        os.path.getmtime(os.path.join(session_dir, name)) < idle_before
+        for name in names)
+
+
+def _upload_session(bucket, session_guid, session_dir):
+    """
+    Merge a session's staged chunks into its object in sequence order, with
+    any chunks compacted previously
+    """
+    with open(os.path.join(session_dir, METADATA_FILENAME),
+              encoding='utf-8') as file:
+        environment = json.load(file)['environment']
+    chunks = {}
+    for chunk_name in os.listdir(session_dir):
+        if chunk_name.endswith(CHUNK_SUFFIX):
+            with open(os.path.join(session_dir, chunk_name),
+                      encoding='utf-8') as file:
+                chunks[int(chunk_name[:-len(CHUNK_SUFFIX)])] = [
+                    json.loads(line) for line in file
+                ]
+
+    blob = bucket.blob(f'{COMPACTED_SESSION_PREFIX}{session_guid}.json')
+    for attempt in range(UPLOAD_ATTEMPTS):
+        try:
+            _merge_chunks_into_blob(blob, session_guid, environment, chunks)
+            break
+        except PreconditionFailed:
+            if attempt == UPLOAD_ATTEMPTS - 1:
+                raise
+            logger.info('Session %s was compacted concurrently, merging again',
+                        session_guid)
+    logger.info('Compacted %d chunks of session %s', len(chunks), session_guid)
+
+
+def _merge_chunks_into_blob(blob, session_guid, environment, chunks):
+    try:
+        session = json.loads(blob.download_as_text())
+        # Only replace the object read, generation 0 only creates the object
+        generation = blob.generation
+    except NotFound:
+        session = {
+            'session_guid': session_guid,
+            'rrweb_data': [],
+            'metadata': {
+                'environment': environment,
+                'chunk_seqs': [],
+                'chunk_event_counts': [],
+            },
+        }
+        generation = 0
+
+    metadata = session['metadata']
+    merged = {}
+    offset = 0
+    for seq, count in zip(metadata['chunk_seqs'],
+                          metadata['chunk_event_counts']):
+        merged[seq] = session['rrweb_data'][offset:offset + count]
+        offset += count
+    # Retried or late chunks which were already compacted are skipped
+    merged = {**chunks, **merged}
+
+    seqs = sorted(merged)
+    session['rrweb_data'] = [event for seq in seqs for event in merged[seq]]
+    metadata['chunk_seqs'] = seqs
+    metadata['chunk_event_counts'] = [len(merged[seq]) for seq in seqs]
+    blob.upload_from_string(json.dumps(session, separators=(',', ':')),
+                            content_type='application/json',
+                            if_generation_match=generation)
+
+
+@contextmanager
+def _lock(filename, blocking=True):
+    """
+    Hold a lock shared by every process using the staging directory
+    Yields whether the lock was acquired, closing the file releases it
+    """
+    os.makedirs(settings.SESSION_STAGING_DIR, exist_ok=True)
+    with open(os.path.join(settings.SESSION_STAGING_DIR, filename),
+              'w',
+              encoding='utf-8') as lock_file:
+        try:
+            fcntl.flock(lock_file,
+                        fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+
+
+def _write_atomic(path, content):
+    # Write to a temporary file first so a partially written chunk is never
+    # mistaken for a staged one
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(temp_path, path)
@@ -1,26 +1,40 @@
 """
-Signal handlers for handling todo updates and rebalancing the rank order
+Signal handlers for handling todo updates, reordering & rebalancing the rank
+order, recording label history and publishing changes to connected clients
 """
+import math
+import statistics
 import time
 
+from django.apps import apps
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 from django.utils import timezone
+from simple_history.signals import pre_create_historical_record
 
-from chalk.todos.consts import (RANK_ORDER_DEFAULT_STEP,
-                                RANK_ORDER_INITIAL_STEP, RANK_ORDER_MAX)
-from chalk.todos.models import RankOrderMetadata, TodoModel
+from chalk.todos.change_stream import publish_change
+from chalk.todos.consts import RANK_ORDER_MAX
+from chalk.todos.list_cache import bump_data_version
+from chalk.todos.models import LabelModel, RankOrderMetadata, TodoModel
+from chalk.todos.order_keys import key_between, uses_order_keys
+from chalk.todos.rank_scheme import get_rank_scheme
+from chalk.todos.status import invalidate_status
 
 
 @receiver(post_save, sender=TodoModel)
 # pylint: disable=unused-argument
 def update_rank_metadata(sender, instance, *args, **kwargs):
     """
-    Update the max rank and closest rank order metadata if necessary after any
-    Todo is saved.
+    Update the max rank and closest rank order metadata of the Todo's owner if
+    necessary after any Todo is saved.
     """
-    order_metadata = RankOrderMetadata.objects.first()
+    if uses_order_keys() or instance.order_rank is None:
+        return
+
+    order_metadata = RankOrderMetadata.objects.filter(
+        owner_id=instance.owner_id).first()
     if (order_metadata is None or
             instance.order_rank <= order_metadata.max_rank):
         return
@@ -35,45 +49,353 @@ def update_rank_metadata(sender, instance, *args, **kwargs):
     order_metadata.save()
 
 
+@receiver(post_save, sender=TodoModel)
+# pylint: disable=unused-argument
+def publish_todo_saved(sender, instance, created, *args, **kwargs):
+    """
+    Publish a change event after a Todo is created or updated
+    """
+    publish_change('todo',
+                   'created' if created else 'updated',
+                   instance.id,
+                   owner_id=instance.owner_id,
+                   version=instance.version)
+
+
+@receiver(post_delete, sender=TodoModel)
+# pylint: disable=unused-argument
+def publish_todo_deleted(sender, instance, *args, **kwargs):
+    """
+    Publish a change event after a Todo is deleted
+    """
+    publish_change('todo', 'deleted', instance.id, owner_id=instance.owner_id)
+
+
+@receiver(post_save, sender=LabelModel)
+# pylint: disable=unused-argument
+def publish_label_saved(sender, instance, created, *args, **kwargs):
+    """
+    Publish a change event after a Label is created or updated
+    """
+    publish_change('label', 'created' if created else 'updated', instance.id)
+
+
+@receiver(post_delete, sender=LabelModel)
+# pylint: disable=unused-argument
+def publish_label_deleted(sender, instance, *args, **kwargs):
+    """
+    Publish a change event after a Label is deleted
+    """
+    publish_change('label', 'deleted', instance.id)
+
+
+@receiver(m2m_changed, sender=LabelModel.todo_set.through)
+# pylint: disable=unused-argument,too-many-arguments
+def publish_todo_labels_changed(sender, instance, action, reverse, pk_set,
+                                *args, **kwargs):
+    """
+    Publish change events for Todos whose labels were added or removed
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # Labels changed from the Todo side (e.g. todo.labels.set(...))
+        publish_change('todo',
+                       'updated',
+                       instance.id,
+                       owner_id=instance.owner_id)
+    elif pk_set is None:
+        # All todos were cleared from a label
+        publish_change('label', 'updated', instance.id)
+    else:
+        for todo_id, owner_id in TodoModel.objects.filter(
+                id__in=pk_set).values_list('id', 'owner_id'):
+            publish_change('todo', 'updated', todo_id, owner_id=owner_id)
+
+
+@receiver(pre_delete, sender=TodoModel)
+# pylint: disable=unused-argument
+def stash_deleted_todo_labels(sender, instance, *args, **kwargs):
+    """
+    Before a Todo is deleted, keep its label names for the history record
+    since the links to its labels are deleted first
+    """
+    instance.deleted_label_names = sorted(
+        instance.labels.values_list('name', flat=True))
+
+
+@receiver(pre_create_historical_record)
+# pylint: disable=unused-argument
+def snapshot_todo_labels(sender, instance, history_instance, *args, **kwargs):
+    """
+    Record the names of a Todo's labels on each of its history records
+    """
+    if not isinstance(instance, TodoModel):
+        return
+
+    if history_instance.history_type == '+':
+        history_instance.history_labels = []
+    elif history_instance.history_type == '-':
+        history_instance.history_labels = getattr(instance,
+                                                  'deleted_label_names', [])
+    else:
+        history_instance.history_labels = sorted(
+            instance.labels.values_list('name', flat=True))
+
+
+@receiver(m2m_changed, sender=LabelModel.todo_set.through)
+# pylint: disable=unused-argument,too-many-arguments
+def record_todo_labels_changed(sender, instance, action, reverse, pk_set, *args,
+                               **kwargs):
+    """
+    Add history records for Todos whose labels were added or removed
+    """
+    if action == 'pre_clear' and not reverse:
+        # Keep the Todos being cleared from a label to record after the clear
+        instance.cleared_todo_ids = list(
+            instance.todo_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        todo_ids = [instance.id]
+    elif pk_set is None:
+        todo_ids = getattr(instance, 'cleared_todo_ids', [])
+    else:
+        todo_ids = pk_set
+    record_todos_history(todo_ids, 'Labels changed')
+
+
+@receiver(pre_delete, sender=LabelModel)
+# pylint: disable=unused-argument
+def record_label_deleted(sender, instance, *args, **kwargs):
+    """
+    Add history records for the Todos of a Label which is being deleted
+    The links to the label are deleted without sending m2m_changed
+    """
+    record_todos_history(instance.todo_set.values_list('id', flat=True),
+                         'Labels changed',
+                         removed_label_id=instance.id)
+
+
+def record_todos_history(todo_ids, change_reason, removed_label_id=None):
+    """
+    Add a history record with the current fields & labels of each Todo, for
+    changes which don't save the Todos one at a time
+    Records are created in bulk as full copies of the Todos
+    """
+    history_model = apps.get_model('todos', 'HistoricalTodoModel')
+    todos = TodoModel.objects.filter(id__in=todo_ids).prefetch_related('labels')
+    history_date = timezone.now()
+    history_model.objects.bulk_create([
+        history_model(
+            history_date=history_date,
+            history_type='~',
+            history_change_reason=change_reason,
+            history_labels=sorted(label.name
+                                  for label in todo.labels.all()
+                                  if label.id != removed_label_id),
+            **{
+                field.attname: getattr(todo, field.attname)
+                for field in history_model.tracked_fields
+            },
+        )
+        for todo in todos
+    ])
+
+
+@receiver(post_save, sender=TodoModel)
+@receiver(post_delete, sender=TodoModel)
+# pylint: disable=unused-argument
+def invalidate_cached_owner_list(sender, instance, *args, **kwargs):
+    """
+    Bump the owner's data version after a Todo changes so their cached todo
+    list isn't served
+    """
+    bump_data_version(instance.owner_id)
+
+
+@receiver(m2m_changed, sender=LabelModel.todo_set.through)
+# pylint: disable=unused-argument
+def invalidate_cached_labels_list(sender, instance, reverse, *args, **kwargs):
+    """
+    Bump the data version after a Todo's labels change so the cached todo
+    list isn't served
+    Changes made from the Label side may affect any owner's Todos
+    """
+    if reverse:
+        bump_data_version(instance.owner_id)
+    else:
+        bump_data_version()
+
+
+@receiver(post_save, sender=LabelModel)
+@receiver(post_delete, sender=LabelModel)
+# pylint: disable=unused-argument
+def invalidate_cached_list(sender, *args, **kwargs):
+    """
+    Bump the shared data version after any Label change so no cached todo
+    list is served, since labels are shared by all owners
+    """
+    bump_data_version()
+
+
+@receiver(post_save, sender=TodoModel)
+@receiver(post_delete, sender=TodoModel)
+@receiver(post_save, sender=RankOrderMetadata)
+# pylint: disable=unused-argument
+def invalidate_cached_status(sender, *args, **kwargs):
+    """
+    Drop the cached status info after any Todo or RankOrderMetadata change
+    """
+    invalidate_status()
+
+
+def clear_expired_snoozes(todo_ids, now):
+    """
+    Clear the expired snoozes of Todos in bulk
+    The update doesn't send signals, so the Todos' history, change events and
+    cached lists & status are updated here as their handlers would have.
+    Returns the number of todos updated
+    """
+    with transaction.atomic():
+        expired = list(TodoModel.objects.select_for_update().filter(
+            id__in=todo_ids,
+            snoozed_until__lte=now).values_list('id', 'owner_id'))
+        if not expired:
+            return 0
+        expired_ids = [todo_id for todo_id, _ in expired]
+        cleared = TodoModel.objects.filter(
+            id__in=expired_ids).clear_expired_snoozes(now)
+
+        record_todos_history(expired_ids, 'Snooze expired')
+        for todo_id, owner_id, version in TodoModel.objects.filter(
+                id__in=expired_ids).values_list('id', 'owner_id', 'version'):
+            publish_change('todo',
+                           'updated',
+                           todo_id,
+                           owner_id=owner_id,
+                           version=version)
+        for owner_id in {owner_id for _, owner_id in expired}:
+            bump_data_version(owner_id)
+        invalidate_status()
+    return cleared
+
+
+def reorder_todo(todo, relative_id, position):
+    """
+    Move a Todo to be 'before' or 'after' another of its owner's Todos
+    The Todo is ranked midway between the other Todo and its neighbour, and
+    the owner's RankOrderMetadata is updated if they're now the closest ranks.
+    With the fractional ordering engine only the Todo's order key is updated.
+
+    Raises:
+        TodoModel.DoesNotExist: If the other Todo isn't one of the owner's
+    """
+    if uses_order_keys():
+        return _reorder_todo_key(todo, relative_id, position)
+
+    owner_todos = TodoModel.objects.filter(owner_id=todo.owner_id)
+    relative_order_rank = owner_todos.get(id=relative_id).order_rank
+    if position == 'before':
+        next_order_rank = relative_order_rank
+        prev_todo = owner_todos.filter(
+            order_rank__lt=relative_order_rank).order_by('-order_rank').first()
+
+        prev_order_rank = 0
+        if prev_todo is not None:
+            prev_order_rank = prev_todo.order_rank
+    else:
+        prev_order_rank = relative_order_rank
+        next_todo = owner_todos.filter(
+            order_rank__gt=relative_order_rank).order_by('order_rank').first()
+
+        next_order_rank = prev_order_rank + (2 * get_rank_scheme().default_step)
+        if next_todo is not None:
+            next_order_rank = next_todo.order_rank
+
+    todo.order_rank = math.floor(
+        statistics.mean([prev_order_rank, next_order_rank]))
+    todo.save()
+
+    order_metadata = RankOrderMetadata.objects.for_owner(todo.owner_id)
+    distance = todo.order_rank - prev_order_rank
+    if distance < order_metadata.closest_rank_distance:
+        order_metadata.closest_rank_min = prev_order_rank
+        order_metadata.closest_rank_max = todo.order_rank
+        order_metadata.save()
+    return todo
+
+
+def _reorder_todo_key(todo, relative_id, position):
+    owner_todos = TodoModel.objects.filter(owner_id=todo.owner_id)
+    relative_key = owner_todos.get(id=relative_id).order_key
+    if position == 'before':
+        prev_key = owner_todos.filter(
+            order_key__lt=relative_key).order_by('-order_key').values_list(
+                'order_key', flat=True).first()
+        todo.order_key = key_between(prev_key, relative_key)
+    else:
+        next_key = owner_todos.filter(
+            order_key__gt=relative_key).order_by('order_key').values_list(
+                'order_key', flat=True).first()
+        todo.order_key = key_between(relative_key, next_key)
+    todo.save()
+    return todo
+
+
 @receiver(post_save, sender=RankOrderMetadata)
 # pylint: disable=unused-argument
-def evaluate_rank_rebalance(**kwargs):
+def evaluate_rank_rebalance(instance=None, **kwargs):
     """
-    Rebalance the rank order if necessary after checking the RankOrderMetadata
+    Rebalance an owner's rank order if necessary after checking their
+    RankOrderMetadata
     Looks to see if the closest 2 items can only support a small number of
     inserts between them.
+    After migrating, the rank order of Todos without an owner is checked.
     """
-    order_metadata = RankOrderMetadata.objects.first()
+    owner_id = instance.owner_id if instance is not None else None
+    order_metadata = RankOrderMetadata.objects.filter(owner_id=owner_id).first()
     if (order_metadata and order_metadata.closest_rank_steps and
-            order_metadata.closest_rank_steps > 2):
+            order_metadata.closest_rank_steps
+            > get_rank_scheme().rebalance_steps):
         return
 
-    rebalance_rank_order()
+    rebalance_rank_order(owner_id)
 
 
-def rebalance_rank_order():
+def rebalance_rank_order(owner_id=None):
     """
-    Rebalance the rank order and update the RankOrderMetadata
+    Rebalance the rank order of an owner's Todos and update their
+    RankOrderMetadata
+    Other owners' Todos are left untouched
     """
     start_time = time.time()
-    todos = TodoModel.objects.select_for_update().filter(archived=False)
-    curr_rank_order = RANK_ORDER_INITIAL_STEP
+    scheme = get_rank_scheme()
+    todos = TodoModel.objects.select_for_update().filter(owner_id=owner_id,
+                                                         archived=False)
+    curr_rank_order = scheme.initial_step
     with transaction.atomic():
         for todo in todos:
             todo.order_rank = curr_rank_order
-            curr_rank_order += RANK_ORDER_DEFAULT_STEP
+            curr_rank_order += scheme.default_step
         TodoModel.objects.bulk_update(todos, ['order_rank'])
+        bump_data_version(owner_id)
 
-        closest_rank_max = RANK_ORDER_INITIAL_STEP + RANK_ORDER_DEFAULT_STEP
+        closest_rank_max = scheme.initial_step + scheme.default_step
         order_metadata, _ = RankOrderMetadata.objects.update_or_create(
+            owner_id=owner_id,
             defaults={
-                'closest_rank_min': RANK_ORDER_INITIAL_STEP,
+                'closest_rank_min': scheme.initial_step,
                 'closest_rank_max': closest_rank_max,
                 # Set closest_rank_steps to None to avoid
                 # an infinite loop from re-evaluation
                 'closest_rank_steps': None,
                 'last_rebalanced_at': timezone.now(),
                 'last_rebalance_duration': time.time() - start_time,
-                'max_rank': curr_rank_order - RANK_ORDER_DEFAULT_STEP,
-            },)
+                'last_rebalance_todos_count': len(todos),
+                'max_rank': curr_rank_order - scheme.default_step,
+            },
+        )
         order_metadata.save()
@@ -0,0 +1,60 @@
+"""
+Point-in-time reconstruction of the todo list from its history
+"""
+from django.apps import apps
+from django.db.models import F, Window
+from django.db.models.functions import FirstValue, RowNumber
+
+from chalk.todos.history import resolve_sparse_rows
+from chalk.todos.order_keys import todo_ordering
+
+
+def todos_as_of(as_of, owner_id=None):
+    """
+    Rebuild the todo list as it was at a point in time
+    Todos are listed in rank order along with the names of their labels
+    If an owner is given, only their todos are listed
+
+    The latest revision of each todo at or before the time is found with a
+    single window query, which also returns the revisions back to that
+    revision's checkpoint so its elided fields can be filled in.
+    """
+    history_model = apps.get_model('todos', 'HistoricalTodoModel')
+    todo_fields = [field.attname for field in history_model.tracked_fields]
+    window = {
+        'partition_by': [F('id')],
+        'order_by': [F('history_date').desc(),
+                     F('history_id').desc()],
+    }
+    rows = history_model.objects.filter(history_date__lte=as_of)
+    if owner_id is not None:
+        rows = rows.filter(owner_id=owner_id)
+    rows = rows.annotate(
+        revision=Window(RowNumber(), **window),
+        latest_type=Window(FirstValue('history_type'), **window),
+        latest_distance=Window(FirstValue('history_checkpoint_distance'),
+                               **window),
+    )
+    # Deleted todos are dropped along with all their revisions
+    rows = rows.filter(revision__lte=F('latest_distance') + 1,
+                       latest_type__in=['+', '~'])
+    rows = rows.values('revision', 'history_elided_fields', 'history_labels',
+                       *todo_fields)
+    rows = rows.order_by('id', 'history_date', 'history_id')
+
+    todos = []
+    for row in resolve_sparse_rows(rows, history_model.sparse_fields):
+        if row['revision'] == 1:
+            todo = {field: row[field] for field in todo_fields}
+            todo['labels'] = row['history_labels'] or []
+            todos.append(todo)
+
+    # Match the ordering of the todo list, listing unranked todos last
+    order_field = todo_ordering()[0]
+    todos.sort(key=lambda todo: _list_order(todo, order_field))
+    return todos
+
+
+def _list_order(todo, order_field):
+    unordered = todo[order_field] is None
+    return (unordered, todo[order_field] or 0, todo['created_at'])
@@ -0,0 +1,100 @@
+"""
+Server status info, cached between writes
+
+Status is cached in each server process so serving it from the cache doesn't
+query the database.  Writes drop the cached status of the process they're made
+in, other processes recompute it within STATUS_CACHE_SECONDS.
+"""
+from django.apps import apps
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count, F, Q
+
+from chalk.todos.models import RankOrderMetadata, TodoModel
+
+STATUS_CACHE_ALIAS = 'status'
+STATUS_CACHE_KEY = 'todos:status'
+STATUS_CACHE_SECONDS = 10
+
+
+def get_status():
+    """
+    Get status info about the server
+    Served from the cache until a todo or the rank metadata changes
+    """
+    status_cache = caches[STATUS_CACHE_ALIAS]
+    status_info = status_cache.get(STATUS_CACHE_KEY)
+    if status_info is None:
+        status_info = _compute_status()
+        status_cache.set(STATUS_CACHE_KEY, status_info, STATUS_CACHE_SECONDS)
+    return status_info
+
+
+def invalidate_status():
+    """
+    Drop the cached status info so the next request recomputes it
+    """
+    caches[STATUS_CACHE_ALIAS].delete(STATUS_CACHE_KEY)
+
+
+def _compute_status():
+    # Each owner's todos are ranked separately, report on the rank order which
+    # is closest to needing a rebalance
+    metadata = RankOrderMetadata.objects.order_by(
+        F('closest_rank_distance').asc(nulls_first=True)).first()
+    # Count todos in a single query using conditional aggregates
+    todo_counts = TodoModel.objects.aggregate(
+        todos_count=Count('id', filter=Q(archived=False)),
+        incomplete_todos_count=Count('id',
+                                     filter=Q(archived=False, completed=False)),
+        archived_todos_count=Count('id', filter=Q(archived=True)),
+    )
+    return {
+        'closest_rank_min': metadata.closest_rank_min,
+        'closest_rank_max': metadata.closest_rank_max,
+        'closest_rank_distance': metadata.closest_rank_distance,
+        'closest_rank_steps': metadata.closest_rank_steps,
+        'last_rebalanced_at': metadata.last_rebalanced_at,
+        'last_rebalance_duration': metadata.last_rebalance_duration,
+        'last_rebalance_todos_count': metadata.last_rebalance_todos_count,
+        'max_rank': metadata.max_rank,
+        'rank_orders_count': RankOrderMetadata.objects.count(),
+        **todo_counts,
+        **_table_stats(),
+    }
+
+
+def _table_stats():
+    """
+    Row counts & sizes for the todo tables and their history tables
+    """
+    models = {
+        'todos': TodoModel,
+        'todos_history': apps.get_model('todos', 'HistoricalTodoModel'),
+        'rank_order_metadata_history': apps.get_model(
+            'todos', 'HistoricalRankOrderMetadata'),
+    }
+    if connection.vendor != 'postgresql':
+        return {
+            'table_rows': {
+                name: model.objects.count() for name, model in models.items()
+            },
+            'table_sizes': None,
+        }
+
+    # Use the planner's row estimates to avoid scanning the history tables
+    tables = {model._meta.db_table: name for name, model in models.items()}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relname, GREATEST(reltuples, 0)::bigint, '
+            'pg_total_relation_size(oid) '
+            'FROM pg_class WHERE relname = ANY(%s)', [list(tables)])
+        rows = cursor.fetchall()
+    return {
+        'table_rows': {
+            tables[table]: count for table, count, _ in rows
+        },
+        'table_sizes': {
+            tables[table]: size for table, _, size in rows
+        },
+    }
@@ -1,21 +1,48 @@
 """
 Tests for todos module
 """
+# pylint: disable=too-many-lines
+from datetime import timedelta
+import gzip
+from importlib import import_module
+from io import StringIO
 import json
 import random
 import string
-from unittest.mock import patch
-
-from django.test import TestCase
+import tempfile
+import threading
+from unittest.mock import ANY, MagicMock, patch
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from rest_framework.throttling import SimpleRateThrottle
 
+from chalk.settings import base as base_settings
+from chalk.todos import (change_stream, db_routing, readiness, session_staging,
+                         throttling)
+from chalk.todos.change_stream import ChangeBroker
 from chalk.todos.consts import RANK_ORDER_DEFAULT_STEP, RANK_ORDER_INITIAL_STEP
-from chalk.todos.models import LabelModel, RankOrderMetadata, TodoModel
+from chalk.todos.history import (_revisions_since_checkpoint,
+                                 fill_sparse_history, resolve_sparse_rows)
+from chalk.todos.models import (ChangeEventModel, LabelModel, RankOrderMetadata,
+                                TodoModel)
+from chalk.todos.order_keys import key_between, keys_after
 from chalk.todos.signals import rebalance_rank_order
+from chalk.todos.status import STATUS_CACHE_ALIAS
+from chalk.todos.throttling import TokenBucketThrottle
 from chalk.todos.views import (_validate_session_data, MAX_SESSION_DATA_SIZE,
-                               MAX_SESSION_KEYS)
+                               MAX_SESSION_KEYS, SESSION_BUCKET_ID)
 
 DEFAULT_LABELS = [
     'low-energy',
@@ -81,6 +108,14 @@ def _stub_label_matcher(name):
     }
 
 
+def _parse_event_ids(content):
+    return [
+        int(line[len('id: '):])
+        for line in content.splitlines()
+        if line.startswith('id: ')
+    ]
+
+
 class SessionDataValidationTests(TestCase):
     """
     Tests for session data validation
@@ -180,6 +215,303 @@ class SessionDataValidationTests(TestCase):
                       str(context.exception))
 
 
+@patch('chalk.todos.views.storage')
+class SessionDataThrottleTests(TestCase):
+    """
+    Tests for throttling session data & capping the requests handled at once
+    """
+
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create(username='tester@localhost',
+                                               is_staff=True)
+        self.client.force_login(user)
+
+    def _log_session_data(self, session_guid):
+        data = {
+            'environment': 'test',
+            'session_guid': session_guid,
+            'session_data': [],
+        }
+        return self.client.post('/api/todos/log_session_data/',
+                                data,
+                                content_type='application/json')
+
+    @patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {
+        'session_data_user': '3/min',
+        'session_data_session': '2/min',
+    })
+    @patch.object(TokenBucketThrottle, 'timer')
+    def test_token_buckets(self, timer, storage):
+        """
+        Test that sessions & users are throttled once their bucket is empty
+        and tokens refill over time
+        """
+        timer.return_value = 1000
+        self.assertEqual(self._log_session_data('a').status_code, 200)
+        self.assertEqual(self._log_session_data('a').status_code, 200)
+        response = self._log_session_data('a')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        upload = storage.Client().bucket().blob().upload_from_string
+        self.assertEqual(upload.call_count, 2)
+
+        # Other sessions of the user share the user's bucket, which every
+        # request takes a token from
+        response = self._log_session_data('b')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+
+        # A token is refilled every 20 seconds for the user
+        timer.return_value = 1020
+        self.assertEqual(self._log_session_data('b').status_code, 200)
+        self.assertEqual(self._log_session_data('c').status_code, 429)
+
+    @override_settings(SESSION_DATA_MAX_CONCURRENCY=1)
+    def test_concurrency_cap(self, storage):
+        """
+        Test that requests are shed while the process is at its cap and the
+        counts are included in the status
+        """
+        status = self.client.get('/api/todos/status/').json()
+        shed_count = status['session_data_ingest']['shed']['concurrency']
+        self.assertEqual(status['session_data_ingest']['in_flight'], 0)
+
+        with throttling.ingest_slot() as admitted:
+            self.assertTrue(admitted)
+            response = self._log_session_data('a')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '1')
+
+            status = self.client.get('/api/todos/status/').json()
+            self.assertEqual(
+                status['session_data_ingest'], {
+                    'in_flight': 1,
+                    'max_in_flight': 1,
+                    'shed': {
+                        **status['session_data_ingest']['shed'],
+                        'concurrency': shed_count + 1,
+                    },
+                })
+
+        self.assertEqual(self._log_session_data('a').status_code, 200)
+        storage.Client.return_value.bucket.assert_called_once_with(
+            SESSION_BUCKET_ID)
+        status = self.client.get('/api/todos/status/').json()
+        self.assertEqual(status['session_data_ingest']['in_flight'], 0)
+
+
+@patch('chalk.todos.views.start_compactor')
+@patch('chalk.todos.session_staging.storage')
+class SessionChunkTests(TestCase):
+    """
+    Tests for appending session data in chunks & compacting the sessions
+    """
+
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create(username='tester@localhost')
+        self.client.force_login(user)
+        staging_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(staging_dir.cleanup)
+        settings_override = override_settings(
+            SESSION_STAGING_DIR=staging_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _append_chunk(self, session_guid, seq, events, **params):
+        query = urlencode({'seq': seq, 'environment': 'test', **params})
+        return self.client.post(
+            f'/api/todos/append_session_chunk/{session_guid}/?{query}',
+            ''.join(json.dumps(event) + '\n' for event in events),
+            content_type='application/x-ndjson')
+
+    def _uploaded_sessions(self, storage):
+        blob = storage.Client().bucket().blob
+        return {
+            call.args[0]: json.loads(upload.args[0]) for call, upload in zip(
+                blob.call_args_list,
+                blob.return_value.upload_from_string.call_args_list)
+        }
+
+    def test_append_and_compact(self, storage, start_compactor):
+        """
+        Test that chunks are compacted into one object per session in
+        sequence order, ignoring retried chunks
+        """
+        storage.Client().bucket().blob().download_as_text.side_effect = (
+            NotFound('No such object'))
+        storage.reset_mock()
+
+        events = [{'type': index, 'timestamp': index} for index in range(5)]
+        response = self._append_chunk('session-a', 1, events[2:4])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'seq': 1, 'staged': True})
+        start_compactor.assert_called_once()
+        self.assertEqual(
+            self._append_chunk('session-a', 0, events[:2]).json()['staged'],
+            True)
+        self.assertEqual(
+            self._append_chunk('session-a', 0, events[:2]).json()['staged'],
+            False)
+        self._append_chunk('session-a', 2, events[4:], final='true')
+        self._append_chunk('session-b', 0, events[:1])
+
+        # Only the finished session is compacted until the other is idle
+        self.assertEqual(session_staging.compact_sessions(60), 1)
+        self.assertEqual(
+            self._uploaded_sessions(storage), {
+                'sessions/session-a.json': {
+                    'session_guid': 'session-a',
+                    'rrweb_data': events,
+                    'metadata': {
+                        'environment': 'test',
+                        'chunk_seqs': [0, 1, 2],
+                        'chunk_event_counts': [2, 2, 1],
+                    },
+                },
+            })
+        blob = storage.Client().bucket().blob.return_value
+        blob.upload_from_string.assert_called_with(
+            ANY, content_type='application/json', if_generation_match=0)
+        self.assertEqual(session_staging.compact_sessions(60), 0)
+
+        out = StringIO()
+        call_command('compact_session_chunks', '--all', stdout=out)
+        self.assertIn('Compacted 1 sessions', out.getvalue())
+        self.assertIn('sessions/session-b.json',
+                      self._uploaded_sessions(storage))
+
+    def _compact_into(self, storage, compacted_chunks, chunks):
+        """
+        Compact chunks into a session which already has compacted_chunks,
+        returning the session uploaded
+        """
+        blob = storage.Client().bucket().blob()
+        blob.generation = 7
+        blob.download_as_text.return_value = json.dumps({
+            'session_guid': 'session-a',
+            'rrweb_data': [
+                event for events in compacted_chunks.values()
+                for event in events
+            ],
+            'metadata': {
+                'environment': 'test',
+                'chunk_seqs': list(compacted_chunks),
+                'chunk_event_counts': [
+                    len(events) for events in compacted_chunks.values()
+                ],
+            },
+        })
+        storage.reset_mock()
+
+        for seq, events in chunks.items():
+            self._append_chunk('session-a', seq, events)
+        session_staging.compact_sessions()
+        blob.upload_from_string.assert_called_with(
+            ANY, content_type='application/json', if_generation_match=7)
+        return self._uploaded_sessions(storage)['sessions/session-a.json']
+
+    def test_append_to_compacted_session(self, storage, _):
+        """
+        Test that chunks appended after a session is compacted are merged
+        into its object
+        """
+        events = [{'type': index} for index in range(3)]
+        session = self._compact_into(storage, {0: events[:1]}, {1: events[1:]})
+        self.assertEqual(session['rrweb_data'], events)
+        self.assertEqual(session['metadata']['chunk_seqs'], [0, 1])
+        self.assertEqual(session['metadata']['chunk_event_counts'], [1, 2])
+
+    def test_retry_compacted_chunk(self, storage, _):
+        """
+        Test that a chunk retried after it was compacted isn't duplicated
+        """
+        events = [{'type': index} for index in range(3)]
+        session = self._compact_into(storage, {
+            0: events[:1],
+            1: events[1:2]
+        }, {
+            1: events[1:2],
+            2: events[2:]
+        })
+        self.assertEqual(session['rrweb_data'], events)
+        self.assertEqual(session['metadata']['chunk_seqs'], [0, 1, 2])
+
+    def test_late_chunk_after_compaction(self, storage, _):
+        """
+        Test that a chunk which arrives after later chunks were compacted is
+        merged in sequence order
+        """
+        events = [{'type': index} for index in range(3)]
+        session = self._compact_into(storage, {
+            0: events[:1],
+            2: events[2:]
+        }, {1: events[1:2]})
+        self.assertEqual(session['rrweb_data'], events)
+        self.assertEqual(session['metadata']['chunk_seqs'], [0, 1, 2])
+        self.assertEqual(session['metadata']['chunk_event_counts'], [1, 1, 1])
+
+    def test_compact_concurrently(self, storage, _):
+        """
+        Test that chunks are merged again if another server replaced the
+        session's object while they were being merged into it
+        """
+        blob = storage.Client().bucket().blob()
+        blob.download_as_text.side_effect = [
+            NotFound('No such object'),
+            json.dumps({
+                'session_guid': 'session-a',
+                'rrweb_data': [{
+                    'type': 0
+                }],
+                'metadata': {
+                    'environment': 'test',
+                    'chunk_seqs': [0],
+                    'chunk_event_counts': [1],
+                },
+            }),
+        ]
+        blob.upload_from_string.side_effect = [
+            PreconditionFailed('Object was replaced'), None
+        ]
+        storage.reset_mock()
+
+        self._append_chunk('session-a', 1, [{'type': 1}])
+        session_staging.compact_sessions()
+        uploaded = json.loads(blob.upload_from_string.call_args.args[0])
+        self.assertEqual(uploaded['rrweb_data'], [{'type': 0}, {'type': 1}])
+
+    def test_invalid_chunks(self, storage, _):
+        """
+        Test that invalid chunks are rejected without being staged
+        """
+        self.assertEqual(
+            self._append_chunk('session a', 0, []).status_code, 400)
+        self.assertEqual(
+            self._append_chunk('session-a', -1, []).status_code, 400)
+        self.assertEqual(
+            self._append_chunk('session-a', 'first', []).status_code, 400)
+        self.assertEqual(
+            self._append_chunk('session-a', 0, [], environment='').status_code,
+            400)
+        self.assertEqual(
+            self._append_chunk('session-a', 0, [['event']]).status_code, 400)
+        response = self.client.post(
+            '/api/todos/append_session_chunk/session-a/?seq=0&environment=test',
+            '{"type": 0',
+            content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/todos/append_session_chunk/session-a/?seq=0&environment=test',
+            {'type': 0},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 415)
+
+        self.assertEqual(session_staging.compact_sessions(), 0)
+        storage.Client.assert_not_called()
+
+
 class SignalsTests(TestCase):
     """
     Tests for signal handlers and rank order rebalancing
@@ -290,6 +622,66 @@ class SignalsTests(TestCase):
                              "last_rebalance_duration should be set")
         self.assertEqual(metadata.max_rank, last_rank)
 
+    def test_rebalance_rank_order_per_owner(self):
+        """
+        Test that rebalancing an owner's rank order leaves other owners' todos
+        and metadata untouched
+        """
+        user_model = get_user_model()
+        owner = user_model.objects.create(username='owner@localhost')
+        other_owner = user_model.objects.create(username='other@localhost')
+        for i in range(3):
+            TodoModel.objects.create(description=f"Todo {i}",
+                                     order_rank=i,
+                                     owner=owner)
+        other_todo = TodoModel.objects.create(description="Other Todo",
+                                              order_rank=1,
+                                              owner=other_owner)
+        other_metadata = RankOrderMetadata.objects.for_owner(other_owner.id)
+
+        rebalance_rank_order(owner.id)
+
+        self.assertEqual(
+            list(
+                TodoModel.objects.filter(owner=owner).values_list('order_rank',
+                                                                  flat=True)),
+            [
+                RANK_ORDER_INITIAL_STEP + i * RANK_ORDER_DEFAULT_STEP
+                for i in range(3)
+            ])
+        other_todo.refresh_from_db()
+        self.assertEqual(other_todo.order_rank, 1)
+
+        metadata = RankOrderMetadata.objects.get(owner=owner)
+        self.assertEqual(metadata.last_rebalance_todos_count, 3)
+        self.assertEqual(RankOrderMetadata.objects.get(owner=other_owner),
+                         other_metadata)
+        self.assertIsNone(other_metadata.last_rebalanced_at)
+
+    def test_simulate_rank_order(self):
+        """
+        Test that the rank order simulator reports rebalances for each scheme
+        without keeping any simulated todos
+        """
+        out = StringIO()
+        call_command('simulate_rank_order',
+                     '--operations=100',
+                     '--todos=5',
+                     '--workload=drag-middle',
+                     '--scheme=60:45:2',
+                     '--scheme=12:6:2',
+                     stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('2^60:2^45:2: 100 operations, '))
+        self.assertTrue(lines[1].startswith('2^12:2^6:2: 100 operations, '))
+        # Smaller steps run out of space between ranks sooner
+        rebalances = [int(line.split(', ')[1].split()[0]) for line in lines]
+        self.assertLess(rebalances[0], rebalances[1])
+        self.assertFalse(TodoModel.objects.exists())
+        self.assertFalse(RankOrderMetadata.objects.exists())
+
     def test_version_initialization(self):
         """
         Test that new todos are created with version=1
@@ -326,6 +718,672 @@ class SignalsTests(TestCase):
                          "Version should increment after each update")
 
 
+class SnoozeTests(TestCase):
+    """
+    Tests for clearing expired snoozes
+    """
+
+    def test_clear_expired_snoozes(self):
+        """
+        Test that only expired snoozes are cleared and the version of the
+        cleared todos is bumped.
+        """
+        now = timezone.now()
+        expired = [
+            TodoModel.objects.create(description=f"Expired {i}",
+                                     snoozed_until=now - timedelta(minutes=i))
+            for i in range(1, 4)
+        ]
+        snoozed = TodoModel.objects.create(description="Snoozed",
+                                           snoozed_until=now +
+                                           timedelta(hours=1))
+        unsnoozed = TodoModel.objects.create(description="Unsnoozed")
+
+        out = StringIO()
+        call_command('clear_expired_snoozes', '--batch-size', '2', stdout=out)
+        self.assertIn('Cleared 3 expired snoozes', out.getvalue())
+
+        for todo in expired:
+            todo.refresh_from_db()
+            self.assertIsNone(todo.snoozed_until)
+            self.assertEqual(todo.version, 2)
+        snoozed.refresh_from_db()
+        self.assertIsNotNone(snoozed.snoozed_until)
+        self.assertEqual(snoozed.version, 1)
+        unsnoozed.refresh_from_db()
+        self.assertEqual(unsnoozed.version, 1)
+
+
+class OrderKeyTests(TestCase):
+    """
+    Tests for generating fractional order keys
+    """
+
+    def test_key_between(self):
+        """
+        Test that keys generated between neighbours keep the order and stay
+        short when appending or prepending
+        """
+        rng = random.Random(0)
+        keys = keys_after(None, 20)
+        self.assertEqual(keys[:3], ['i0', 'i1', 'i2'])
+        for _ in range(2000):
+            index = rng.randrange(len(keys) + 1)
+            before = keys[index - 1] if index > 0 else None
+            after = keys[index] if index < len(keys) else None
+            keys.insert(index, key_between(before, after))
+        self.assertEqual(keys, sorted(set(keys)))
+
+        self.assertLessEqual(len(keys_after(None, 10000)[-1]), 4)
+        key = None
+        for _ in range(10000):
+            key = key_between(None, key)
+        self.assertLessEqual(len(key), 4)
+
+        with self.assertRaises(ValueError):
+            key_between('i1', 'i0')
+
+
+@override_settings(TODO_HISTORY_SPARSE=True, TODO_HISTORY_CHECKPOINT_INTERVAL=3)
+class SparseHistoryTests(TestCase):
+    """
+    Tests for storing only changed fields in todo history
+    """
+
+    def _history_rows(self, todo):
+        return list(
+            todo.history.order_by('history_date', 'history_id').values(
+                'description', 'history_elided_fields',
+                'history_checkpoint_distance'))
+
+    def test_unchanged_fields_elided(self):
+        """
+        Test that unchanged fields are elided except for periodic checkpoints
+        """
+        todo = TodoModel.objects.create(description="Long description")
+        for _ in range(3):
+            todo.completed = not todo.completed
+            todo.save()
+
+        rows = self._history_rows(todo)
+        self.assertEqual([row['description'] for row in rows],
+                         ["Long description", "", "", "Long description"])
+        self.assertEqual([row['history_checkpoint_distance'] for row in rows],
+                         [0, 1, 2, 0])
+        self.assertIn('description', rows[1]['history_elided_fields'])
+        self.assertIn('archived_at', rows[1]['history_elided_fields'])
+        self.assertNotIn('completed_at', rows[1]['history_elided_fields'])
+        self.assertEqual(rows[3]['history_elided_fields'], [])
+
+        # Deletes always store a full copy
+        todo_id = todo.id
+        todo.delete()
+        history = TodoModel.history
+        deleted = history.filter(  # pylint: disable=no-member
+            id=todo_id).latest()
+        self.assertEqual(deleted.history_type, '-')
+        self.assertEqual(deleted.history_elided_fields, [])
+
+    @override_settings(TODO_HISTORY_SPARSE=False)
+    def test_sparse_history_disabled(self):
+        """
+        Test that full copies are stored when sparse history is disabled
+        """
+        todo = TodoModel.objects.create(description="Long description")
+        todo.completed = True
+        todo.save()
+
+        rows = self._history_rows(todo)
+        self.assertEqual([row['description'] for row in rows],
+                         ["Long description", "Long description"])
+        self.assertEqual(rows[1]['history_elided_fields'], [])
+
+    def test_history_reads_fill_elided_fields(self):
+        """
+        Test that instances, as_of, most_recent & diffs see the full todo
+        """
+        todo = TodoModel.objects.create(description="First")
+        todo.completed = True
+        todo.save()
+        todo.description = "Second"
+        todo.save()
+        completed_at = todo.completed_at
+        snapshot_time = timezone.now()
+        todo.refresh_from_db()
+        todo.order_rank -= 1000
+        todo.save()
+
+        records = list(todo.history.order_by('history_date', 'history_id'))
+        self.assertEqual(records[1].instance.description, "First")
+        self.assertEqual(str(records[3].history_object), "Second")
+        self.assertEqual(records[3].instance.completed_at, completed_at)
+
+        delta = records[3].diff_against(records[2])
+        self.assertEqual(delta.changed_fields, ['order_rank', 'version'])
+
+        as_of = todo.history.as_of(snapshot_time)
+        self.assertEqual(as_of.description, "Second")
+        self.assertEqual(as_of.order_rank, todo.order_rank + 1000)
+        self.assertEqual(todo.history.most_recent().description, "Second")
+
+        other = TodoModel.objects.create(description="Other")
+        other.completed = True
+        other.save()
+        history = TodoModel.history
+        snapshot = history.as_of(timezone.now())  # pylint: disable=no-member
+        listed = {item.id: item.description for item in snapshot}
+        self.assertEqual(listed, {todo.id: "Second", other.id: "Other"})
+
+    def test_fill_sparse_history_single_query(self):
+        """
+        Test that elided fields of many records are filled in one query
+        """
+        todos = [
+            TodoModel.objects.create(description=f"Todo {i}") for i in range(3)
+        ]
+        for todo in todos:
+            todo.completed = True
+            todo.save()
+
+        history = TodoModel.history
+        records = list(
+            history.filter(  # pylint: disable=no-member
+                history_type='~'))
+        self.assertTrue(all(record.description == "" for record in records))
+        with self.assertNumQueries(1):
+            fill_sparse_history(records)
+        self.assertEqual(sorted(record.description for record in records),
+                         ["Todo 0", "Todo 1", "Todo 2"])
+
+    @override_settings(TODO_HISTORY_CHECKPOINT_INTERVAL=3)
+    def test_reads_start_at_checkpoint(self):
+        """
+        Test that filling in & eliding fields only read the revisions since
+        the latest checkpoint
+        """
+        todo = TodoModel.objects.create(description="Long description")
+        for _ in range(4):
+            todo.completed = not todo.completed
+            todo.save()
+        history_model = TodoModel.history.model  # pylint: disable=no-member
+        history_ids = list(
+            todo.history.order_by('history_date',
+                                  'history_id').values_list('history_id',
+                                                            flat=True))
+        self.assertEqual([
+            row['history_checkpoint_distance']
+            for row in _revisions_since_checkpoint(history_model, todo.id)
+        ], [1, 0])
+
+        record = todo.history.get(history_id=history_ids[-1])
+        with patch('chalk.todos.history.resolve_sparse_rows',
+                   wraps=resolve_sparse_rows) as resolve:
+            fill_sparse_history([record])
+        self.assertEqual(record.description, "Long description")
+        self.assertEqual(
+            [row['history_id'] for row in resolve.call_args.args[0]],
+            history_ids[-2:])
+
+    def test_admin_history_view(self):
+        """
+        Test that the admin history view shows the full descriptions
+        """
+        user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        todo = TodoModel.objects.create(description="Admin todo")
+        todo.completed = True
+        todo.save()
+
+        response = self.client.get(
+            f'/api/admin/todos/todomodel/{todo.id}/history/')
+        self.assertEqual(response.status_code, 200)
+        records = list(response.context['page_obj'])
+        self.assertEqual([str(record.history_object) for record in records],
+                         ["Admin todo", "Admin todo"])
+        self.assertEqual(records[0].history_elided_fields, [])
+        self.assertNotContains(response, "<strong>Description:</strong>")
+
+
+class ChangeStreamTests(TestCase):
+    """
+    Tests for publishing & streaming change events
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester@localhost')
+        self.client.force_login(self.user)
+
+    def _stream(self, last_event_id=None):
+        headers = {'HTTP_ACCEPT': 'text/event-stream'}
+        if last_event_id is not None:
+            headers['HTTP_LAST_EVENT_ID'] = last_event_id
+        with patch.object(change_stream, 'STREAM_MAX_SECONDS', 0.01):
+            response = self.client.get('/api/todos/changes/', **headers)
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return content
+
+    def test_broker_wait_for_changes(self):
+        """
+        Test waiting for changes and detecting dropped changes
+        """
+        broker = ChangeBroker(buffer_size=2)
+        self.assertEqual(broker.latest_seq(), 0)
+        broker.publish({'id': 1})
+        broker.publish({'id': 2})
+
+        self.assertEqual(broker.wait_for_changes(1, 0), [(2, {'id': 2})])
+        self.assertEqual(broker.wait_for_changes(2, 0), [])
+
+        # Changes dropped from the buffer can't be waited for
+        broker.publish({'id': 3})
+        self.assertIsNone(broker.wait_for_changes(0, 0))
+
+    def test_stream_changes(self):
+        """
+        Test changes to the user's todos and to labels are streamed to a
+        resuming client by a process which didn't publish them, but not
+        changes to other users' todos
+        """
+        other_user = get_user_model().objects.create(username='other@localhost')
+        label = LabelModel.objects.get(name='work')
+        label.save()
+        content = self._stream()
+        last_event_id = content.splitlines()[2][len('id: '):]
+        self.assertEqual(last_event_id,
+                         str(ChangeEventModel.objects.latest('id').id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            todo = TodoModel.objects.create(description='Streamed',
+                                            owner=self.user)
+            other_todo = TodoModel.objects.create(description='Hidden',
+                                                  owner=other_user)
+        todo_id = todo.id
+        with self.captureOnCommitCallbacks(execute=True):
+            label.todo_set.add(todo, other_todo)
+        with self.captureOnCommitCallbacks(execute=True):
+            label.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            todo.delete()
+            other_todo.delete()
+
+        with patch.object(change_stream,
+                          'get_broker',
+                          return_value=ChangeBroker()):
+            content = self._stream(last_event_id)
+
+        events = [
+            json.loads(line[len('data: '):])
+            for line in content.splitlines()
+            if line.startswith('data: ')
+        ]
+        self.assertEqual(events, [
+            {
+                'model': 'todo',
+                'action': 'created',
+                'id': todo_id,
+                'owner_id': self.user.id,
+                'version': 1
+            },
+            {
+                'model': 'todo',
+                'action': 'updated',
+                'id': todo_id,
+                'owner_id': self.user.id
+            },
+            {
+                'model': 'label',
+                'action': 'updated',
+                'id': label.id
+            },
+            {
+                'model': 'todo',
+                'action': 'deleted',
+                'id': todo_id,
+                'owner_id': self.user.id
+            },
+        ])
+        visible_ids = ChangeEventModel.objects.filter(
+            id__gt=last_event_id).exclude(owner=other_user).values_list(
+                'id', flat=True)
+        self.assertEqual(_parse_event_ids(content), list(visible_ids))
+
+    def test_stream_live_changes_after_replay(self):
+        """
+        Test changes committed while a resuming client's missed changes are
+        replayed are streamed once
+        """
+        label = LabelModel.objects.get(name='work')
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                label.save()
+        first_id, replayed_id = ChangeEventModel.objects.order_by(
+            'id').values_list('id', flat=True)
+        broker = ChangeBroker()
+        replay_changes = change_stream.replay_changes
+
+        def replay_during_commit(owner_id, last_event_id):
+            replayed = replay_changes(owner_id, last_event_id)
+            broker.publish({'id': replayed_id, 'event': replayed[0][1]})
+            broker.publish({'id': replayed_id + 1, 'event': {'model': 'label'}})
+            return replayed
+
+        with patch.object(change_stream, 'get_broker', return_value=broker):
+            with patch.object(change_stream,
+                              'replay_changes',
+                              side_effect=replay_during_commit):
+                content = self._stream(str(first_id))
+
+        self.assertEqual(_parse_event_ids(content),
+                         [replayed_id, replayed_id + 1])
+
+    def test_replay_changes(self):
+        """
+        Test replaying the changes after an event id, including changes with
+        earlier ids which may have committed after it
+        """
+        other_user = get_user_model().objects.create(username='other@localhost')
+        old, late, last, own, other, label = [
+            ChangeEventModel.objects.create(model=model,
+                                            owner=owner,
+                                            event={'model': model})
+            for model, owner in [
+                ('todo', self.user),
+                ('todo', self.user),
+                ('label', None),
+                ('todo', self.user),
+                ('todo', other_user),
+                ('label', None),
+            ]
+        ]
+        ChangeEventModel.objects.filter(id=old.id).update(
+            created_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual([
+            change_id for change_id, _ in change_stream.replay_changes(
+                self.user.id, str(last.id))
+        ], [late.id, own.id, label.id])
+        self.assertEqual([
+            change_id for change_id, _ in change_stream.replay_changes(
+                other_user.id, str(last.id))
+        ], [other.id, label.id])
+        self.assertIsNone(change_stream.replay_changes(self.user.id, 'abc-1'))
+
+        # Changes after a pruned change can't be replayed
+        with patch.object(change_stream, 'CHANGE_EVENT_PRUNE_INTERVAL', 1):
+            ChangeEventModel.objects.update(created_at=timezone.now() -
+                                            timedelta(days=2))
+            change_stream.publish_change('label', 'updated', 1)
+        self.assertEqual(ChangeEventModel.objects.count(), 1)
+        self.assertIsNone(
+            change_stream.replay_changes(self.user.id, str(last.id)))
+
+    def test_stream_unknown_event_id_resyncs(self):
+        """
+        Test a client resuming from an unknown event id is told to resync
+        """
+        content = self._stream('unknown-12')
+        self.assertIn('event: resync', content)
+
+    def test_stream_busy(self):
+        """
+        Test clients are told to reconnect later when too many streams are
+        open in the process
+        """
+        with patch.object(change_stream, '_stream_slots',
+                          threading.BoundedSemaphore(1)) as stream_slots:
+            stream_slots.acquire()  # pylint: disable=R1732
+            content = self._stream()
+            self.assertEqual(
+                content,
+                f'retry: {change_stream.STREAM_BUSY_RECONNECT_MILLISECONDS}'
+                '\n\n')
+
+            stream_slots.release()
+            self.assertIn('retry: 3000', self._stream())
+        self.assertTrue(stream_slots.acquire(blocking=False))
+
+
+class ReadinessTests(TestCase):
+    """
+    Tests for the liveness & readiness probes
+    """
+
+    @patch('chalk.todos.readiness.threading.Thread')
+    @patch('chalk.todos.readiness._dependency_checks', None)
+    def test_probes(self, thread):
+        """
+        Test that readiness reflects the latest background check
+        """
+        self.assertEqual(
+            self.client.get('/api/todos/healthz/').status_code, 200)
+        self.assertEqual(self.client.get('/api/todos/livez/').status_code, 200)
+
+        # Not ready until the background thread has checked the dependencies
+        with self.assertLogs('django.request', level='ERROR'):
+            response = self.client.get('/api/todos/readyz/')
+        self.assertEqual(response.status_code, 503)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        dependency_checks = readiness.get_dependency_checks()
+        dependency_checks.refresh(connections['default'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/todos/readyz/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'ready': True,
+            'checks': {
+                'database': 'ok',
+                'migrations': 'ok',
+            },
+        })
+
+        # Results the thread hasn't refreshed in a while aren't trusted
+        dependency_checks.checked_at -= readiness.READINESS_STALE_SECONDS + 1
+        with self.assertLogs('django.request', level='ERROR'):
+            response = self.client.get('/api/todos/readyz/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['database'], 'stale')
+        self.assertEqual(thread.call_count, 1)
+
+    def test_dependency_checks(self):
+        """
+        Test that unapplied migrations & database errors fail the checks
+        """
+        dependency_checks = readiness.DependencyChecks()
+        with patch.object(MigrationExecutor, 'migration_plan') as plan:
+            plan.return_value = [('migration', False)]
+            self.assertEqual(dependency_checks.refresh(connections['default']),
+                             {
+                                 'database': 'ok',
+                                 'migrations': '1 unapplied',
+                             })
+            self.assertFalse(dependency_checks.get_readiness()[0])
+
+            # Migrations aren't checked again once they've been applied
+            plan.return_value = []
+            dependency_checks.refresh(connections['default'])
+            dependency_checks.refresh(connections['default'])
+            self.assertEqual(plan.call_count, 2)
+            self.assertTrue(dependency_checks.get_readiness()[0])
+
+        db_connection = MagicMock()
+        db_connection.cursor.side_effect = DatabaseError('unreachable')
+        with self.assertLogs('chalk.todos.readiness', level='ERROR'):
+            checks = dependency_checks.refresh(db_connection)
+        self.assertEqual(checks['database'], 'unavailable')
+        self.assertFalse(dependency_checks.get_readiness()[0])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Tests for routing reads during safe requests to a replica
+    Uses committed transactions so the replica connection sees the data
+    """
+    databases = {'default', 'replica'}
+    serialized_rollback = True
+
+    def setUp(self):
+        db_routing._replica_lag.clear()  # pylint: disable=protected-access
+        user = get_user_model().objects.create(username='tester@localhost')
+        self.client.force_login(user)
+        TodoModel.objects.create(description="todo")
+
+    def _capture_queries(self, method, path, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, primary, replica
+
+    def _count_queries(self, method, path, **kwargs):
+        response, primary, replica = self._capture_queries(
+            method, path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_safe_requests_read_from_replica(self):
+        """
+        Test that safe requests read from the replica and writes pin the
+        client to the primary
+        """
+        response, primary_count, replica_count = self._count_queries(
+            'get', '/api/todos/labels/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary_count, 0)
+        self.assertGreater(replica_count, 0)
+        self.assertNotIn(db_routing.PRIMARY_COOKIE, response.cookies)
+
+        response, primary_count, replica_count = self._count_queries(
+            'post',
+            '/api/todos/todos/',
+            data={
+                'description': 'new todo',
+                'labels': [],
+            },
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica_count, 0)
+        self.assertIn(db_routing.PRIMARY_COOKIE, response.cookies)
+
+        # The client's cookie keeps it reading from the primary
+        response, primary_count, replica_count = self._count_queries(
+            'get', '/api/todos/labels/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary_count, 0)
+        self.assertEqual(replica_count, 0)
+
+    def test_cached_list_read_from_primary(self):
+        """
+        Test that caching the todo list in the database cache doesn't pin the
+        client to the primary, and the list is read from the primary like its
+        data version so a lagging replica's list isn't cached as current
+        """
+        # Use the caches used when serving, creating the database cache table
+        with self.settings(CACHES=base_settings.CACHES):
+            call_command('createcachetable', stdout=StringIO())
+            response, primary, replica = self._capture_queries(
+                'get', '/api/todos/todos/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(db_routing.PRIMARY_COOKIE, response.cookies)
+        todos_table = TodoModel._meta.db_table
+        self.assertTrue(
+            any(todos_table in query['sql']
+                for query in primary.captured_queries))
+        self.assertFalse(
+            any(todos_table in query['sql']
+                for query in replica.captured_queries))
+
+        # Other reads still use the replica
+        response, primary_count, replica_count = self._count_queries(
+            'get', '/api/todos/labels/')
+        self.assertEqual(primary_count, 0)
+        self.assertGreater(replica_count, 0)
+
+    @patch('chalk.todos.db_routing._query_replica_lag')
+    def test_lagging_replica_skipped(self, query_replica_lag):
+        """
+        Test that replicas lagging or failing fall back to the primary
+        """
+        query_replica_lag.return_value = 60
+        response, primary_count, replica_count = self._count_queries(
+            'get', '/api/todos/labels/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary_count, 0)
+        self.assertEqual(replica_count, 0)
+
+        # The lag is cached between checks
+        query_replica_lag.return_value = 0
+        self.assertEqual(db_routing.choose_replica(), 'default')
+        db_routing._replica_lag.clear()  # pylint: disable=protected-access
+        self.assertEqual(db_routing.choose_replica(), 'replica')
+
+        query_replica_lag.side_effect = DatabaseError('unreachable')
+        db_routing._replica_lag.clear()  # pylint: disable=protected-access
+        with self.assertLogs('chalk.todos.db_routing', level='ERROR'):
+            self.assertEqual(db_routing.choose_replica(), 'default')
+
+
+class TodoOwnerMigrationTests(TestCase):
+    """
+    Tests for assigning existing todos an owner when migrating to per-owner
+    todos
+    """
+
+    def setUp(self):
+        self.migration = import_module('chalk.todos.migrations.0018_todo_owner')
+        user_model = get_user_model()
+        self.users = [
+            user_model.objects.create(username='ci@localhost'),
+            user_model.objects.create(username='first@localhost',
+                                      is_superuser=True),
+            user_model.objects.create(username='second@localhost',
+                                      is_superuser=True),
+        ]
+        self.todo = TodoModel.objects.create(description='legacy')
+
+    def _assert_owner(self, owner):
+        owner_id = owner.id if owner is not None else None
+        self.assertEqual(
+            TodoModel.objects.get(id=self.todo.id).owner_id, owner_id)
+        self.assertEqual(set(self.todo.history.values_list('owner', flat=True)),
+                         {owner_id})
+
+    def test_assigns_first_superuser(self):
+        """
+        Test existing todos are assigned to the first superuser when there are
+        several users
+        """
+        self.migration.assign_existing_owner(apps, None)
+        self._assert_owner(self.users[1])
+
+    @override_settings(TODO_OWNER_USERNAME='second@localhost')
+    def test_assigns_configured_owner(self):
+        """
+        Test existing todos are assigned to TODO_OWNER_USERNAME if it's set
+        """
+        self.migration.assign_existing_owner(apps, None)
+        self._assert_owner(self.users[2])
+
+    def test_fails_without_owner(self):
+        """
+        Test the migration fails rather than orphaning existing todos when it
+        can't choose an owner
+        """
+        get_user_model().objects.filter(is_superuser=True).update(
+            is_superuser=False)
+        with self.assertRaises(ImproperlyConfigured):
+            self.migration.assign_existing_owner(apps, None)
+        self._assert_owner(None)
+
+        with override_settings(TODO_OWNER_USERNAME='unknown@localhost'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.migration.assign_existing_owner(apps, None)
+
+
 class ServiceTests(TestCase):
     """
     Tests for todo view
@@ -333,6 +1391,8 @@ class ServiceTests(TestCase):
     maxDiff = None
 
     def setUp(self):
+        cache.clear()
+        caches[STATUS_CACHE_ALIAS].clear()
         test_username = 'tester@localhost'
         user_model = get_user_model()
         user = user_model.objects.create(username=test_username)
@@ -504,6 +1564,124 @@ class ServiceTests(TestCase):
         cleared = self._update_todo(todo['id'], {'snoozed_until': None})
         assert cleared['snoozed_until'] is None
 
+    def test_visible_filter_and_next_wake_up(self):
+        """
+        Test that ?visible=true hides snoozed todos and the list response
+        reports when the next snoozed todo wakes up.
+        """
+        now = timezone.now()
+        wake_up = now + timedelta(hours=1)
+        visible_id = self._create_todo({
+            'description': _generate_random_string(),
+            'labels': [],
+            'snoozed_until': (now - timedelta(hours=1)).isoformat(),
+        })['id']
+        snoozed_id = self._create_todo({
+            'description': _generate_random_string(),
+            'labels': [],
+            'snoozed_until': wake_up.isoformat(),
+        })['id']
+        self._create_todo({
+            'description': _generate_random_string(),
+            'labels': [],
+            'snoozed_until': (now + timedelta(hours=2)).isoformat(),
+        })
+
+        response = self.client.get('/api/todos/todos/')
+        self._assert_status_code(200, response)
+        assert len(response.json()) == 3
+        assert parse_datetime(response['X-Next-Wake-Up']) == wake_up
+
+        response = self.client.get('/api/todos/todos/?visible=true')
+        self._assert_status_code(200, response)
+        assert [todo['id'] for todo in response.json()] == [visible_id]
+
+        # No header once nothing is snoozed in the future
+        TodoModel.objects.exclude(id=visible_id).delete()
+        response = self.client.get('/api/todos/todos/')
+        assert 'X-Next-Wake-Up' not in response
+        assert snoozed_id not in [todo['id'] for todo in response.json()]
+
+    @patch('chalk.todos.signals.publish_change')
+    def test_clear_expired_snoozes_invalidates_list(self, publish_change):
+        """
+        Test that the list after clearing expired snoozes has the todos' new
+        versions, and the changes are recorded in history & published
+        """
+        todo = self._create_todo({
+            'description': _generate_random_string(),
+            'labels': [],
+            'snoozed_until': (timezone.now() - timedelta(hours=1)).isoformat(),
+        })
+        assert self._fetch_todos()[0]['version'] == todo['version']
+
+        call_command('clear_expired_snoozes', stdout=StringIO())
+
+        fetched_todo = self._fetch_todos()[0]
+        assert fetched_todo['version'] == todo['version'] + 1
+        assert fetched_todo['snoozed_until'] is None
+        history = TodoModel.objects.get(id=todo['id']).history.first()
+        assert history.history_change_reason == 'Snooze expired'
+        assert history.version == todo['version'] + 1
+        assert history.snoozed_until is None
+        publish_change.assert_called_with('todo',
+                                          'updated',
+                                          todo['id'],
+                                          owner_id=get_user_model().objects.get(
+                                              username='tester@localhost').id,
+                                          version=todo['version'] + 1)
+
+    def test_conditional_update(self):
+        """
+        Test PATCH with an If-Match header or version only applies if the todo
+        hasn't been modified since that version.
+        """
+        todo = self._create_todo({
+            'description': _generate_random_string(),
+            'labels': [],
+        })
+        url = f'/api/todos/todos/{todo["id"]}/'
+
+        # Matching If-Match header applies the update in a single request
+        response = self.client.patch(url, {'completed': True},
+                                     content_type='application/json',
+                                     HTTP_IF_MATCH='"1"')
+        self._assert_status_code(200, response)
+        assert response.json()['version'] == 2
+        assert response.json()['completed'] is True
+        assert response['ETag'] == '"2"'
+
+        # Stale If-Match header or version is rejected
+        response = self.client.patch(url, {'description': 'stale'},
+                                     content_type='application/json',
+                                     HTTP_IF_MATCH='"1"')
+        self._assert_status_code(412, response)
+        response = self.client.patch(url, {
+            'description': 'stale',
+            'labels': ['work'],
+            'version': 1,
+        },
+                                     content_type='application/json')
+        self._assert_status_code(412, response)
+        todo = TodoModel.objects.get(id=todo['id'])
+        assert todo.description != 'stale'
+        assert todo.version == 2
+        assert not todo.labels.exists()
+
+        # Matching version in the body applies the update
+        updated = self._update_todo(todo.id, {
+            'description': 'fresh',
+            'version': 2,
+        })
+        assert updated['description'] == 'fresh'
+        assert updated['version'] == 3
+
+        # Invalid versions are rejected
+        response = self.client.patch(url, {'description': 'bad'},
+                                     content_type='application/json',
+                                     HTTP_IF_MATCH='"abc"')
+        self._assert_status_code(400, response)
+
     def test_status_endpoint(self):
         """
         Test the status endpoint and rebalancing
@@ -547,6 +1725,244 @@ class ServiceTests(TestCase):
         assert status['closest_rank_steps'] == 45, \
                f"Expected 45, but got {status['closest_rank_steps']}"
 
+    def test_todo_list_cached(self):
+        """
+        Test the todo list is served from the cache until a todo or label
+        changes, and compressed bytes are served to clients accepting gzip.
+        """
+        todo_id = self._create_todo({
+            'description': _generate_random_string(),
+            'labels': ['work'],
+        })['id']
+        fetched_data = self._fetch_todos()
+
+        # Served from the cache without querying the todos
+        with self.assertNumQueries(2):  # Session & user lookups only
+            response = self.client.get('/api/todos/todos/',
+                                       HTTP_ACCEPT_ENCODING='gzip, br')
+        self._assert_status_code(200, response)
+        assert response['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response.content)) == fetched_data
+
+        # Todo & label changes invalidate the cached list
+        self._update_todo(todo_id, {'description': 'updated'})
+        assert self._fetch_todos()[0]['description'] == 'updated'
+        label = LabelModel.objects.get(name='work')
+        self._update_label(label.id, {'name': 'renamed'})
+        assert self._fetch_todos()[0]['labels'] == ['renamed']
+
+    def test_status_endpoint_cached(self):
+        """
+        Test the status counts and that status is cached until a todo changes
+        """
+        todo_ids = [
+            self._create_todo({
+                'description': _generate_random_string(),
+                'labels': [],
+            })['id'] for _ in range(3)
+        ]
+        self._update_todo(todo_ids[0], {'completed': True})
+        self._update_todo(todo_ids[1], {'archived': True})
+
+        status = self._fetch_entity('status')
+        assert status['todos_count'] == 2
+        assert status['incomplete_todos_count'] == 1
+        assert status['archived_todos_count'] == 1
+        assert status['table_rows']['todos'] == 3
+        assert status['table_rows']['todos_history'] == 5
+
+        # Served from the cache without querying the todos
+        with self.assertNumQueries(2):  # Session & user lookups only
+            self.assertEqual(self._fetch_entity('status'), status)
+
+        # Writes invalidate the cached status
+        self._delete_todo(todo_ids[2])
+        status = self._fetch_entity('status')
+        assert status['todos_count'] == 1
+
+    def test_status_endpoint_cached_with_database_cache(self):
+        """
+        Test that cached status doesn't query the database cache shared by
+        server processes, so a cache hit costs no more than with locmem
+        """
+        # Use the caches used when serving, creating the database cache table
+        with self.settings(CACHES=base_settings.CACHES):
+            call_command('createcachetable', stdout=StringIO())
+            status = self._fetch_entity('status')
+
+            with self.assertNumQueries(2):  # Session & user lookups only
+                self.assertEqual(self._fetch_entity('status'), status)
+
+    def test_todo_history(self):
+        """
+        Test the paginated timeline of changes made to a todo
+        """
+        todo = self._create_todo({'description': 'todo', 'labels': ['work']})
+        self._update_todo(todo['id'], {'completed': True})
+        self._update_todo(todo['id'], {
+            'description': 'renamed',
+            'labels': ['home'],
+        })
+        home_label = LabelModel.objects.get(name='home')
+        self._delete_label(home_label.id)
+        self._delete_todo(todo['id'])
+
+        history_url = f'/api/todos/todos/{todo["id"]}/history/'
+        entries = []
+        params = {'page_size': 3}
+        while True:
+            # Diffs for a page are computed from a single history query
+            with self.assertNumQueries(3):
+                response = self.client.get(history_url, params)
+            self._assert_status_code(200, response)
+            page = response.json()
+            entries.extend(page['results'])
+            if page['next_cursor'] is None:
+                break
+            params['cursor'] = page['next_cursor']
+
+        def summarize(change):
+            if change['field'] == 'labels':
+                return ('labels', change['added'], change['removed'])
+            return (change['field'], change['old'], change['new'])
+
+        timeline = [(entry['history_type'], entry['version'],
+                     list(map(summarize, entry['changes'])))
+                    for entry in entries]
+        self.assertEqual(timeline, [
+            ('deleted', 3, []),
+            ('updated', 3, [('labels', [], ['home'])]),
+            ('updated', 3, [('labels', ['home'], [])]),
+            ('updated', 3, [('labels', [], ['work'])]),
+            ('updated', 3, [('description', 'todo', 'renamed')]),
+            ('updated', 2, [('completed', False, True),
+                            ('completed_at', None, AnyArg())]),
+            ('updated', 1, [('labels', ['work'], [])]),
+            ('created', 1, [('description', '', 'todo'),
+                            ('order_rank', None, AnyArg())]),
+        ])
+
+        response = self.client.get(history_url, {'cursor': 'invalid'})
+        self._assert_status_code(400, response)
+        response = self.client.get(history_url, {'page_size': 0})
+        self._assert_status_code(400, response)
+        response = self.client.get('/api/todos/todos/999/history/')
+        self._assert_status_code(404, response)
+
+    def test_todos_as_of(self):
+        """
+        Test rebuilding the todo list as of a point in time from its history
+        """
+        first = self._create_todo({'description': 'first', 'labels': ['work']})
+        second = self._create_todo({'description': 'second', 'labels': []})
+        deleted = self._create_todo({'description': 'deleted', 'labels': []})
+        self._update_todo(first['id'], {'completed': True})
+        self._reorder_todo(second['id'], first['id'], 'before')
+        snapshot = self._fetch_todos()
+        snapshot_time = timezone.now()
+
+        self._update_todo(first['id'], {
+            'description': 'edited',
+            'labels': ['home'],
+        })
+        self._delete_todo(deleted['id'])
+        self._create_todo({'description': 'later', 'labels': []})
+
+        response = self.client.get('/api/todos/todos/as_of/',
+                                   {'at': snapshot_time.isoformat()})
+        self._assert_status_code(200, response)
+        self.assertEqual(response.json(), snapshot)
+
+        response = self.client.get('/api/todos/todos/as_of/',
+                                   {'at': timezone.now().isoformat()})
+        self._assert_status_code(200, response)
+        self.assertEqual(response.json(), self._fetch_todos())
+
+        out = StringIO()
+        call_command('list_todos_as_of', snapshot_time.isoformat(), stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), snapshot)
+
+        response = self.client.get('/api/todos/todos/as_of/', {'at': 'never'})
+        self._assert_status_code(400, response)
+
+    def test_todos_per_owner(self):
+        """
+        Test each user only sees their own todos, which are ranked separately
+        """
+        todo = self._create_todo({'description': 'mine', 'labels': []})
+        self._create_todo({'description': 'also mine', 'labels': []})
+        legacy_todo = TodoModel.objects.create(description='legacy')
+
+        other_user = get_user_model().objects.create(username='other@localhost')
+        self.client.force_login(other_user)
+        other_todo = self._create_todo({'description': 'theirs', 'labels': []})
+        self.assertEqual(
+            TodoModel.objects.get(id=other_todo['id']).order_rank,
+            RANK_ORDER_INITIAL_STEP)
+        self.assertEqual(self._fetch_todos(),
+                         [_stub_todo_matcher('theirs', [])])
+        self._assert_status_code(
+            404, self.client.get(f'/api/todos/todos/{todo["id"]}/'))
+        self._assert_status_code(
+            404, self.client.get(f'/api/todos/todos/{todo["id"]}/history/'))
+        response = self.client.get('/api/todos/todos/as_of/',
+                                   {'at': timezone.now().isoformat()})
+        self.assertEqual([todo['id'] for todo in response.json()],
+                         [other_todo['id']])
+
+        # Todos without an owner can be assigned to a user
+        call_command('assign_todo_owner', 'other@localhost', stdout=StringIO())
+        self.assertEqual([todo['id'] for todo in self._fetch_todos()],
+                         [other_todo['id'], legacy_todo.id])
+        response = self.client.get(
+            f'/api/todos/todos/{legacy_todo.id}/history/')
+        self._assert_status_code(200, response)
+
+    def test_fractional_ordering(self):
+        """
+        Test switching to the fractional ordering engine, where reorders only
+        update the reordered todo, and back again
+        """
+        todo_ids = [
+            self._create_todo({
+                'description': f'todo {i}',
+                'labels': [],
+            })['id'] for i in range(4)
+        ]
+        call_command('migrate_todo_ordering', 'fractional', stdout=StringIO())
+
+        with override_settings(TODO_ORDERING_ENGINE='fractional'):
+            versions = dict(TodoModel.objects.values_list('id', 'version'))
+            metadata = RankOrderMetadata.objects.values().get(
+                owner__username='tester@localhost')
+            self._reorder_todo(todo_ids[3], todo_ids[0], 'before')
+            self._reorder_todo(todo_ids[0], todo_ids[2], 'after')
+            self._reorder_todo(todo_ids[1], todo_ids[2], 'before')
+            new_id = self._create_todo({
+                'description': 'new',
+                'labels': []
+            })['id']
+
+            expected_ids = [
+                todo_ids[3], todo_ids[1], todo_ids[2], todo_ids[0], new_id
+            ]
+            self.assertEqual([todo['id'] for todo in self._fetch_todos()],
+                             expected_ids)
+            for todo_id, version in TodoModel.objects.values_list(
+                    'id', 'version'):
+                if todo_id in versions:
+                    expected_version = versions[todo_id] + (todo_id
+                                                            != todo_ids[2])
+                    self.assertEqual(version, expected_version)
+            # The rank order is neither updated nor rebalanced
+            self.assertEqual(
+                RankOrderMetadata.objects.values().get(
+                    owner__username='tester@localhost'), metadata)
+
+        call_command('migrate_todo_ordering', 'rank', stdout=StringIO())
+        self.assertEqual([todo['id'] for todo in self._fetch_todos()],
+                         expected_ids)
+
     def _create_todo(self, data):
         return self._create_entity(data, 'todos')
 
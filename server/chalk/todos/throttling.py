@@ -0,0 +1,136 @@
+"""
+Admission control for the session data ingest endpoint
+
+Requests are throttled per user & per recording session with token buckets
+kept in the cache, so they're shared by every server process.  Each process
+also caps how many ingest requests it handles at once so a misbehaving
+recorder can't tie up all of its threads.  Requests which are turned away get
+a 429 response with a Retry-After header, and are counted for the status
+endpoint along with the requests in flight.
+"""
+from contextlib import contextmanager
+import hashlib
+import threading
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+# Clients turned away by the concurrency cap are asked to retry after this
+CONCURRENCY_RETRY_SECONDS = 1
+
+_ingest_stats = {
+    'in_flight': 0,
+    'shed': {
+        'session_data_user': 0,
+        'session_data_session': 0,
+        'concurrency': 0,
+    },
+}
+_ingest_stats_lock = threading.Lock()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):  # pylint: disable=W0223
+    """
+    Throttle which allows bursts of up to the rate's number of requests
+    Tokens refill evenly over the rate's period, e.g. 12/min refills a token
+    every 5 seconds.
+    """
+    wait_seconds = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        now = self.timer()
+        refill_rate = self.num_requests / self.duration
+        tokens, updated_at = self.cache.get(key, (self.num_requests, now))
+        tokens = min(self.num_requests,
+                     tokens + (now - updated_at) * refill_rate)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / refill_rate
+            _record_shed(self.scope)
+            return False
+
+        self.cache.set(key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SessionDataUserThrottle(TokenBucketThrottle):
+    """
+    Throttle session data from each user
+    """
+    scope = 'session_data_user'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.user.pk,
+        }
+
+
+class SessionDataSessionThrottle(TokenBucketThrottle):
+    """
+    Throttle session data from each recording session
+    The session is taken from the URL or else the request's data, requests
+    without a session are left for validation to reject
+    """
+    scope = 'session_data_session'
+
+    def get_cache_key(self, request, view):
+        session_guid = view.kwargs.get('session_guid')
+        if session_guid is None and isinstance(request.data, dict):
+            session_guid = request.data.get('session_guid')
+        if not isinstance(session_guid, str):
+            return None
+        # Hash the client provided id to bound the length of the key
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': hashlib.sha256(session_guid.encode()).hexdigest(),
+        }
+
+
+@contextmanager
+def ingest_slot():
+    """
+    Hold one of the process' slots for handling session data
+    Yields whether a slot was free, without waiting for one
+    """
+    max_in_flight = settings.SESSION_DATA_MAX_CONCURRENCY
+    with _ingest_stats_lock:
+        admitted = _ingest_stats['in_flight'] < max_in_flight
+        if admitted:
+            _ingest_stats['in_flight'] += 1
+        else:
+            _ingest_stats['shed']['concurrency'] += 1
+    if not admitted:
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        with _ingest_stats_lock:
+            _ingest_stats['in_flight'] -= 1
+
+
+def get_ingest_stats():
+    """
+    Session data requests in flight & turned away by this process
+    """
+    with _ingest_stats_lock:
+        return {
+            'in_flight': _ingest_stats['in_flight'],
+            'max_in_flight': settings.SESSION_DATA_MAX_CONCURRENCY,
+            'shed': dict(_ingest_stats['shed']),
+        }
+
+
+def _record_shed(reason):
+    with _ingest_stats_lock:
+        _ingest_stats['shed'][reason] += 1
@@ -0,0 +1,123 @@
+"""
+Timeline of the changes made to a todo, built from its history records
+"""
+import base64
+from datetime import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+
+from chalk.todos.history import resolve_sparse_rows
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_MAX_PAGE_SIZE = 200
+
+# Fields included in the timeline & their values before a todo is created
+TIMELINE_FIELDS = {
+    'description': '',
+    'completed': False,
+    'completed_at': None,
+    'archived': False,
+    'archived_at': None,
+    'order_rank': None,
+    'order_key': None,
+    'snoozed_until': None,
+}
+HISTORY_TYPES = {
+    '+': 'created',
+    '~': 'updated',
+    '-': 'deleted',
+}
+
+
+def get_timeline(todo_id, owner_id, cursor=None, page_size=TIMELINE_PAGE_SIZE):
+    """
+    Get a page of a todo's changes, most recent first
+    Todos which don't belong to the owner have no changes
+
+    Revisions are paginated by (history_date, history_id) using the
+    (id, history_date) index and diffed in a single query.  Pass the
+    next_cursor of a page to get the following page.
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    history_model = apps.get_model('todos', 'HistoricalTodoModel')
+    rows = history_model.objects.filter(id=todo_id, owner_id=owner_id)
+    if cursor is not None:
+        history_date, history_id = _decode_cursor(cursor)
+        rows = rows.filter(
+            Q(history_date__lt=history_date) |
+            Q(history_date=history_date, history_id__lt=history_id))
+
+    # Fetch the revisions before the page as well, back far enough to diff
+    # the oldest revision in the page and fill in its elided fields
+    lookback = 1 + settings.TODO_HISTORY_CHECKPOINT_INTERVAL
+    rows = rows.order_by('-history_date', '-history_id').values(
+        'id', 'history_id', 'history_date', 'history_type',
+        'history_change_reason', 'history_elided_fields', 'history_labels',
+        'version', *TIMELINE_FIELDS)
+    rows = list(rows[:page_size + lookback])
+    rows.reverse()
+    rows = list(resolve_sparse_rows(rows, history_model.sparse_fields))
+    rows.reverse()
+
+    entries = [
+        _timeline_entry(row, rows[index + 1] if index + 1 < len(rows) else None)
+        for index, row in enumerate(rows[:page_size])
+    ]
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = _encode_cursor(rows[page_size - 1])
+    return {
+        'results': entries,
+        'next_cursor': next_cursor,
+    }
+
+
+def _timeline_entry(row, previous):
+    entry = {
+        'history_id': row['history_id'],
+        'history_date': row['history_date'],
+        'history_type': HISTORY_TYPES[row['history_type']],
+        'history_change_reason': row['history_change_reason'],
+        'version': row['version'],
+        'changes': [],
+    }
+    if row['history_type'] == '-':
+        return entry
+    if row['history_type'] == '+' or previous is None:
+        previous = {**TIMELINE_FIELDS, 'history_labels': []}
+
+    for field in TIMELINE_FIELDS:
+        if row[field] != previous[field]:
+            entry['changes'].append({
+                'field': field,
+                'old': previous[field],
+                'new': row[field],
+            })
+
+    # Revisions from before labels were tracked have no labels recorded
+    if row['history_labels'] is not None and previous[
+            'history_labels'] is not None:
+        old_labels = set(previous['history_labels'])
+        new_labels = set(row['history_labels'])
+        if old_labels != new_labels:
+            entry['changes'].append({
+                'field': 'labels',
+                'added': sorted(new_labels - old_labels),
+                'removed': sorted(old_labels - new_labels),
+            })
+    return entry
+
+
+def _encode_cursor(row):
+    cursor = f'{row["history_date"].isoformat()},{row["history_id"]}'
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    history_date, history_id = base64.urlsafe_b64decode(
+        cursor.encode()).decode().split(',')
+    return datetime.fromisoformat(history_date), int(history_id)
@@ -11,11 +11,16 @@ router.register('todos', views.TodoViewSet)
 router.register('labels', views.LabelViewSet)
 
 urlpatterns = [
+    path('append_session_chunk/<str:session_guid>/',
+         views.append_session_chunk),
     path('auth/', views.auth),
     path('auth_callback/', views.auth_callback),
     path('auth_test/', views.auth_test),
+    path('changes/', views.changes),
     path('healthz/', views.healthz),
+    path('livez/', views.livez),
     path('log_session_data/', views.log_session_data),
+    path('readyz/', views.readyz),
     path('rebalance_ranks/', views.rebalance_ranks),
     path('status/', views.status),
     path('', include(router.urls)),
@@ -3,25 +3,47 @@ Views for todo app
 """
 from datetime import datetime, timezone
 import json
-import math
 import random
-import statistics
 
 from django.contrib.auth import authenticate, login
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect
-from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+from django.core.exceptions import ObjectNotUpdated, ValidationError
 from google.cloud import storage
 from rest_framework import permissions, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (action, api_view, parser_classes,
+                                       permission_classes, renderer_classes,
+                                       throttle_classes)
+from rest_framework.exceptions import Throttled
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from chalk.todos.consts import RANK_ORDER_DEFAULT_STEP
+from chalk.todos.change_stream import EventStreamRenderer, stream_events
+from chalk.todos.db_routing import read_from_primary
+from chalk.todos.list_cache import (cache_list, cached_list_response,
+                                    get_cached_list, get_data_version)
 from chalk.todos.models import LabelModel, RankOrderMetadata, TodoModel
-from chalk.todos.serializers import LabelSerializer, TodoSerializer
+from chalk.todos.session_staging import (SESSION_BUCKET_ID, SESSION_GUID_RE,
+                                         NDJSONParser, stage_chunk,
+                                         start_compactor)
+from chalk.todos.serializers import (LabelSerializer, TodoSerializer,
+                                     TodoSnapshotSerializer)
 from chalk.todos.oauth import get_authorization_url
-from chalk.todos.signals import rebalance_rank_order
+from chalk.todos.order_keys import todo_ordering
+from chalk.todos.readiness import get_dependency_checks
+from chalk.todos.signals import rebalance_rank_order, reorder_todo
+from chalk.todos.snapshots import todos_as_of
+from chalk.todos.status import get_status
+from chalk.todos.throttling import (CONCURRENCY_RETRY_SECONDS,
+                                    SessionDataSessionThrottle,
+                                    SessionDataUserThrottle, get_ingest_stats,
+                                    ingest_slot)
+from chalk.todos.timeline import (TIMELINE_MAX_PAGE_SIZE, TIMELINE_PAGE_SIZE,
+                                  get_timeline)
 
-SESSION_BUCKET_ID = 'flipperkid-chalk-web-session-data'
 MAX_SESSION_DATA_SIZE = 1024 * 1024  # 1 MiB limit
 MAX_SESSION_KEYS = 3  # Maximum number of keys in the session data
 
@@ -45,7 +67,8 @@ def auth_callback(request):
     pkce_verifier = None
     if state:
         pkce_verifier = request.session.pop(f'pkce_{state}', None)
-    user = authenticate(request, token=request.GET['code'],
+    user = authenticate(request,
+                        token=request.GET['code'],
                         pkce_verifier=pkce_verifier)
     if user is not None:
         login(request, user)
@@ -67,16 +90,63 @@ def auth_test(request):
     return Response('Logged in!')
 
 
+@api_view(['GET'])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+@permission_classes([permissions.IsAuthenticated])
+def changes(request):
+    """
+    API endpoint that streams change events for the user's todos & for labels
+    as Server-Sent Events
+
+    Reconnecting clients resume from the Last-Event-ID header on any server
+    process.  Changes around it may be sent again, so clients should use each
+    todo's version to discard stale updates.  If the changes after it are no
+    longer available a 'resync' event is sent and the client should refetch.
+    When too many streams are open the response only tells the client to
+    reconnect later.
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+    response = StreamingHttpResponse(stream_events(request.user.id,
+                                                   last_event_id),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering so events are delivered immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['GET', 'HEAD'])
 def healthz(request):
     """
     API endpoint that indicates the server is healthy
+    Kept for existing probes, equivalent to livez
     """
     return Response('Healthy!')
 
 
+@api_view(['GET', 'HEAD'])
+def livez(request):
+    """
+    API endpoint that indicates the server process is able to serve requests
+    Doesn't check dependencies so an outage of them doesn't restart the server
+    """
+    return Response('Live!')
+
+
+@api_view(['GET', 'HEAD'])
+def readyz(request):
+    """
+    API endpoint that indicates the server's dependencies are healthy
+    Reports the latest background check rather than checking per request
+    """
+    ready, checks = get_dependency_checks().get_readiness()
+    status_code = 200 if ready else 503
+    return Response({'ready': ready, 'checks': checks}, status=status_code)
+
+
 @api_view(['POST', 'HEAD'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([SessionDataUserThrottle, SessionDataSessionThrottle])
 def log_session_data(request):
     """
     API endpoint used to log session data to an object storage bucket
@@ -85,7 +155,17 @@ def log_session_data(request):
     - Enforces size limits (1 MiB max)
     - Limits number of keys
     - Validates data structure
+
+    Requests are throttled and the number handled at once is capped, see
+    chalk.todos.throttling
     """
+    with ingest_slot() as admitted:
+        if not admitted:
+            raise Throttled(wait=CONCURRENCY_RETRY_SECONDS)
+        return _log_session_data(request)
+
+
+def _log_session_data(request):
     try:
         data_str = json.dumps(request.data)
 
@@ -111,24 +191,50 @@ def log_session_data(request):
         return Response({'error': 'Invalid JSON data format'}, status=400)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([NDJSONParser])
+@throttle_classes([SessionDataUserThrottle, SessionDataSessionThrottle])
+def append_session_chunk(request, session_guid):
+    """
+    API endpoint used to append a chunk of rrweb events to a session
+
+    The chunk is sent as NDJSON with one event per line, along with these
+    query params:
+    - seq: The chunk's sequence number within the session
+    - environment: The environment the session is recorded in
+    - final: 'true' if this is the last chunk of the session
+
+    Chunks are staged and later compacted into one object per session in the
+    object storage bucket, see chalk.todos.session_staging
+    """
+    with ingest_slot() as admitted:
+        if not admitted:
+            raise Throttled(wait=CONCURRENCY_RETRY_SECONDS)
+
+        try:
+            seq, environment = _validate_session_chunk(request, session_guid)
+        except ValidationError as e:
+            return Response({'error': str(e)}, status=400)
+
+        staged = stage_chunk(session_guid,
+                             seq,
+                             request.data,
+                             environment,
+                             final=request.query_params.get('final') == 'true')
+        start_compactor()
+        return Response({'seq': seq, 'staged': staged})
+
+
 @api_view(['GET', 'HEAD'])
 @permission_classes([permissions.IsAdminUser])
 def status(request):
     """
     API endpoint that returns status info about the server
     """
-    metadata = RankOrderMetadata.objects.first()
-    todos = TodoModel.objects.filter(archived=False)
     return Response({
-        'closest_rank_min': metadata.closest_rank_min,
-        'closest_rank_max': metadata.closest_rank_max,
-        'closest_rank_distance': metadata.closest_rank_distance,
-        'closest_rank_steps': metadata.closest_rank_steps,
-        'last_rebalanced_at': metadata.last_rebalanced_at,
-        'last_rebalance_duration': metadata.last_rebalance_duration,
-        'max_rank': metadata.max_rank,
-        'todos_count': todos.count(),
-        'incomplete_todos_count': todos.filter(completed=False).count(),
+        **get_status(),
+        'session_data_ingest': get_ingest_stats(),
     })
 
 
@@ -136,9 +242,12 @@ def status(request):
 @permission_classes([permissions.IsAdminUser])
 def rebalance_ranks(request):
     """
-    API endpoint that manually triggers an order rank rebalance
+    API endpoint that manually triggers an order rank rebalance for every
+    owner
     """
-    rebalance_rank_order()
+    for owner_id in RankOrderMetadata.objects.values_list('owner_id',
+                                                          flat=True):
+        rebalance_rank_order(owner_id)
     return Response('Rebalanced!')
 
 
@@ -149,13 +258,146 @@ class TodoViewSet(viewsets.ModelViewSet):  # pylint: disable=R0901
     queryset = TodoModel.objects.all()
     serializer_class = TodoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    expected_version = None
+
+    def get_queryset(self):
+        """
+        Limit todos to those owned by the user, ordered by the ordering engine
+        Optionally limit the list to todos which aren't currently snoozed
+        """
+        queryset = super().get_queryset().filter(
+            owner=self.request.user).order_by(*todo_ordering())
+        if (self.action == 'list' and
+                self.request.query_params.get('visible') == 'true'):
+            queryset = queryset.visible()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        List todos and include when the next snoozed todo wakes up so clients
+        can schedule a single refresh rather than polling
+
+        The unfiltered JSON list is served from a compressed cache which is
+        invalidated whenever todos or labels change.
+        """
+        if request.query_params or request.accepted_renderer.format != 'json':
+            response = super().list(request, *args, **kwargs)
+            next_wake_up = TodoModel.objects.filter(
+                owner=request.user).next_wake_up()
+            if next_wake_up is not None:
+                response['X-Next-Wake-Up'] = next_wake_up.isoformat()
+            return response
+
+        # Read the data version before the todos so a concurrent write can't
+        # be cached under the version from before it
+        data_version = get_data_version(request.user.id)
+        entry = get_cached_list(data_version)
+        if entry is None:
+            # The data version is read from the primary, so read the todos
+            # from it too rather than caching a lagging replica's list
+            with read_from_primary():
+                response = super().list(request, *args, **kwargs)
+                entry = cache_list(
+                    data_version,
+                    JSONRenderer().render(response.data),
+                    TodoModel.objects.filter(owner=request.user).next_wake_up())
+        return cached_list_response(request, entry)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Update a todo
+
+        If an If-Match header or a version field is provided, the update is
+        only applied if the todo is still at that version.  Otherwise a 412 is
+        returned so the client can refetch rather than overwrite other edits.
+        """
+        try:
+            expected_version = _get_expected_version(request)
+        except (TypeError, ValueError):
+            return Response(
+                "The If-Match header and version must be a todo version",
+                status=400)
+
+        self.expected_version = expected_version
+        try:
+            with transaction.atomic():
+                response = super().update(request, *args, **kwargs)
+        except ObjectNotUpdated:
+            return Response(
+                f"Todo has been modified since version {expected_version}",
+                status=412)
+
+        response['ETag'] = f'"{response.data["version"]}"'
+        return response
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def perform_update(self, serializer):
+        serializer.instance.expected_version = self.expected_version
+        serializer.save()
+
+    @action(detail=False, methods=['get'])
+    def as_of(self, request):
+        """
+        List todos as they were at the time given by the 'at' query param
+        Rebuilt from the todo history, e.g. to recover from a mistake
+        """
+        try:
+            at = parse_datetime(request.query_params.get('at', ''))
+        except ValueError:
+            at = None
+        if at is None:
+            return Response(
+                "An 'at' timestamp must be provided in ISO 8601 "
+                "format (e.g. 2024-01-01T09:00:00Z)",
+                status=400)
+        if is_naive(at):
+            at = make_aware(at)
+        todos = todos_as_of(at, owner_id=request.user.id)
+        return Response(TodoSnapshotSerializer(todos, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    # pylint: disable=unused-argument,invalid-name
+    def history(self, request, pk=None):
+        """
+        List the changes made to a todo, most recent first
+        Deleted todos are included so their changes can be recovered
+
+        Results are paginated, pass the next_cursor from a page as the cursor
+        query param to get the next page.
+        """
+        try:
+            page_size = int(
+                request.query_params.get('page_size', TIMELINE_PAGE_SIZE))
+        except ValueError:
+            page_size = 0
+        if not 0 < page_size <= TIMELINE_MAX_PAGE_SIZE:
+            return Response(
+                "The 'page_size' must be an integer between 1 and "
+                f"{TIMELINE_MAX_PAGE_SIZE}",
+                status=400)
+        if not pk.isdigit():
+            return Response(f"No history found for todo {pk}", status=404)
+
+        cursor = request.query_params.get('cursor')
+        try:
+            timeline = get_timeline(int(pk),
+                                    request.user.id,
+                                    cursor=cursor,
+                                    page_size=page_size)
+        except ValueError:
+            return Response("The 'cursor' is invalid", status=400)
+        if cursor is None and not timeline['results']:
+            return Response(f"No history found for todo {pk}", status=404)
+        return Response(timeline)
 
     @action(detail=True, methods=['post'])
     # pylint: disable=unused-argument,invalid-name
     def reorder(self, request, pk=None):
         """
         Reorder a todo to be in the middle of 2 todos specified by their IDs.
-
+        Only the user's own todos & rank order are considered.
         """
         relative_id = request.data.get('relative_id')
         position = request.data.get('position')
@@ -169,37 +411,7 @@ class TodoViewSet(viewsets.ModelViewSet):  # pylint: disable=R0901
                 "A 'position' must be provided ('before' or 'after')",
                 status=400)
 
-        relative_order_rank = TodoModel.objects.get(id=relative_id).order_rank
-        if position == 'before':
-            next_order_rank = relative_order_rank
-            prev_todo = TodoModel.objects.all().filter(
-                order_rank__lt=relative_order_rank).order_by(
-                    '-order_rank').first()
-
-            prev_order_rank = 0
-            if prev_todo is not None:
-                prev_order_rank = prev_todo.order_rank
-        else:
-            prev_order_rank = relative_order_rank
-            next_todo = TodoModel.objects.all().filter(
-                order_rank__gt=relative_order_rank).order_by(
-                    'order_rank').first()
-
-            next_order_rank = prev_order_rank + (2 * RANK_ORDER_DEFAULT_STEP)
-            if next_todo is not None:
-                next_order_rank = next_todo.order_rank
-
-        todo = self.get_object()
-        todo.order_rank = math.floor(
-            statistics.mean([prev_order_rank, next_order_rank]))
-        todo.save()
-
-        order_metadata = RankOrderMetadata.objects.first()
-        distance = todo.order_rank - prev_order_rank
-        if distance < order_metadata.closest_rank_distance:
-            order_metadata.closest_rank_min = prev_order_rank
-            order_metadata.closest_rank_max = todo.order_rank
-            order_metadata.save()
+        todo = reorder_todo(self.get_object(), relative_id, position)
 
         serializer = self.get_serializer(todo)
         return Response(serializer.data)
@@ -214,6 +426,24 @@ class LabelViewSet(viewsets.ModelViewSet):  # pylint: disable=R0901
     permission_classes = [permissions.IsAuthenticated]
 
 
+def _get_expected_version(request):
+    """
+    Get the version a todo update is conditional on, if any
+    Read from the If-Match header (e.g. "3") or the version field of the body
+
+    Raises:
+        TypeError, ValueError: If the version is not an integer
+    """
+    if_match = request.headers.get('If-Match')
+    if if_match is not None and if_match.strip() != '*':
+        return int(if_match.strip().removeprefix('W/').strip('"'))
+
+    version = request.data.get('version')
+    if version is not None:
+        return int(version)
+    return None
+
+
 def _validate_session_data(data, data_str):
     """
     Validates session data to ensure it meets security requirements
@@ -245,3 +475,33 @@ def _validate_session_data(data, data_str):
     if isinstance(data, dict) and len(data) > MAX_SESSION_KEYS:
         raise ValidationError(
             f"Session data contains too many keys (max: {MAX_SESSION_KEYS})")
+
+
+def _validate_session_chunk(request, session_guid):
+    """
+    Validates a chunk of session data appended to a session
+
+    Returns:
+        The chunk's sequence number and the session's environment
+
+    Raises:
+        ValidationError: If the chunk fails validation
+    """
+    if not SESSION_GUID_RE.match(session_guid):
+        raise ValidationError(
+            "Session guid must be up to 64 letters, digits or dashes")
+    try:
+        seq = int(request.query_params.get('seq', ''))
+    except ValueError as e:
+        raise ValidationError("Chunk must have an integer 'seq'") from e
+    if seq < 0:
+        raise ValidationError("Chunk 'seq' must not be negative")
+    environment = request.query_params.get('environment')
+    if not environment:
+        raise ValidationError("Chunk must have an 'environment'")
+
+    events = request.data
+    if not isinstance(events, list) or not all(
+            isinstance(event, dict) for event in events):
+        raise ValidationError("Chunk events must be JSON objects")
+    return seq, environment
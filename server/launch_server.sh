@@ -8,10 +8,13 @@ sleep 2s
 
 # Run migrations
 python manage.py migrate
+python manage.py createcachetable
 
 # Populate history for existing data
 # TODO (jordan) see if there's a better way to do this than the entrypoint script
 python manage.py populate_history --auto
 
 # Finally launch the server
-gunicorn chalk.wsgi:application -w 2 -b :8003 -t 60
+# Use threads so open change streams don't tie up a whole worker, streams are
+# capped at MAX_STREAMS_PER_PROCESS of each worker's threads
+gunicorn chalk.wsgi:application -w 2 --threads 8 -b :8003 -t 60
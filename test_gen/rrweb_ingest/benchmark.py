@@ -0,0 +1,416 @@
+"""
+Benchmarks for the rrweb ingest pipeline.
+
+Times stages of the pipeline on the test session fixtures, so the effect of
+optimizations can be measured. Run with:
+python -m rrweb_ingest.benchmark [--session_dir DIR] [--repeat N]
+
+With --ingest, instead measures the throughput & peak RSS of ingest_session on
+synthetic sessions from 1 MB to 500 MB, optionally recording the results for
+tracking regressions. Run with:
+python -m rrweb_ingest.benchmark --ingest [--sizes_mb MB ...] [--results FILE]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields
+from datetime import datetime, timezone
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from rrweb_ingest.filter import is_low_signal
+from rrweb_ingest.loader import sort_events
+from rrweb_ingest.pipeline import _EVENT_HANDLERS, ingest_session
+from rrweb_ingest.profiling import SessionProfile
+from rrweb_ingest.synthetic import (
+    GENERATOR_VERSION,
+    SyntheticSessionConfig,
+    write_synthetic_session,
+)
+from rrweb_util.helpers import (
+    get_event_key,
+    is_dom_mutation_event,
+    is_drag_event,
+    is_full_snapshot,
+    is_incremental_snapshot,
+    is_input_event,
+    is_mouse_interaction_event,
+)
+
+DEFAULT_SESSION_DIR = Path(__file__).parent / "tests" / "test_sessions"
+
+# Number of chunks sessions are split into to resemble stitched sessions
+STITCHED_CHUNKS = 8
+
+# Sizes of the synthetic sessions ingested by the ingest benchmark, in MB
+DEFAULT_INGEST_SIZES_MB = (1, 10, 100, 500)
+
+# Directory synthetic sessions are generated in, so they're reused by later runs
+DEFAULT_WORK_DIR = Path(tempfile.gettempdir()) / "rrweb_ingest_benchmark"
+
+
+def load_session_events(session_dir: Path) -> List[List[dict]]:
+    """
+    Load the events of each session in a directory, sorted by timestamp.
+
+    Args:
+        session_dir: Directory containing rrweb session JSON files
+
+    Returns:
+        List of each session's events
+    """
+    sessions = []
+    for filepath in sorted(session_dir.glob("*.json")):
+        with open(filepath, "r", encoding="utf-8") as f:
+            events = json.load(f)["rrweb_data"]
+        sessions.append(sorted(events, key=lambda event: event["timestamp"]))
+    return sessions
+
+
+def benchmark_sort_events(
+    sessions: List[List[dict]], repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time sort_events against other sorts on sorted, stitched, and shuffled events.
+
+    sort_events is compared with sorting by a Python key function, as load_events
+    used to, and with a k-way merge of the sorted runs in the events. Stitched events
+    are each session split into chunks with overlapping timestamps, concatenated in
+    the order they'd be uploaded.
+
+    Args:
+        sessions: List of each session's events sorted by timestamp
+        repeat: Number of times to sort each session
+
+    Returns:
+        Dict of the seconds taken by each sort, for each ordering of the events
+    """
+    rng = random.Random(0)
+    orderings = {
+        "sorted": sessions,
+        "stitched": [_stitch(events, rng) for events in sessions],
+        "shuffled": [rng.sample(events, len(events)) for events in sessions],
+    }
+    sorts = {
+        "sort_events": sort_events,
+        "key_function": lambda events: sorted(
+            events, key=lambda event: event["timestamp"]
+        ),
+        "merge_runs": _merge_runs,
+    }
+
+    results = {}
+    for ordering, ordered_sessions in orderings.items():
+        results[ordering] = {
+            name: _time(sort, ordered_sessions, repeat) for name, sort in sorts.items()
+        }
+    return results
+
+
+def benchmark_event_dispatch(
+    sessions: List[List[dict]], repeat: int
+) -> Dict[str, float]:
+    """
+    Measure the events per second classified by the ingest loop's dispatch table against
+    the chain of predicates it replaced.
+
+    The predicates classified events as the ingest loop used to, including
+    extract_user_interactions classifying interaction events again.
+
+    Args:
+        sessions: List of each session's events
+        repeat: Number of times to classify each session's events
+
+    Returns:
+        Dict of the events per second classified by each way of classifying events
+    """
+    events = [event for session_events in sessions for event in session_events]
+    classifiers = {
+        "predicates": _classify_with_predicates,
+        "dispatch_table": _classify_with_dispatch_table,
+    }
+    return {
+        name: _events_per_second(classify, events, repeat)
+        for name, classify in classifiers.items()
+    }
+
+
+def _classify_with_predicates(event: dict) -> str:
+    if is_full_snapshot(event):
+        return "init_dom_state"
+    if is_incremental_snapshot(event):
+        if is_dom_mutation_event(event):
+            return "apply_mutation"
+        if not is_low_signal(event) and is_incremental_snapshot(event):
+            if (
+                is_mouse_interaction_event(event)
+                or is_input_event(event)
+                or is_drag_event(event)
+            ):
+                return "extract_user_interactions"
+    return "filter"
+
+
+def _classify_with_dispatch_table(event: dict) -> str:
+    handler = _EVENT_HANDLERS.get(get_event_key(event))
+    return handler[0] if handler else "filter"
+
+
+def benchmark_ingest(
+    sizes_mb: Sequence[float], work_dir: Path, config: SyntheticSessionConfig
+) -> List[dict]:
+    """
+    Measure the throughput & peak RSS of ingest_session on synthetic sessions of each size.
+
+    Sessions are generated in work_dir, named by their size and a hash of the config and
+    GENERATOR_VERSION, so they're reused by later runs. Each session is ingested in a new process, so its peak
+    RSS isn't inflated by sessions ingested before it.
+
+    Args:
+        sizes_mb: Sizes of the sessions to ingest, in MB
+        work_dir: Directory to generate the sessions in
+        config: Shape of the sessions to generate
+
+    Returns:
+        List of the results for each size, with the session's size in bytes, the seconds
+        taken to ingest it, the MB and events ingested per second, excluding events dropped
+        while parsing, the interactions extracted, and the peak RSS in MB
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+    config_key = {**asdict(config), "generator_version": GENERATOR_VERSION}
+    config_hash = hashlib.sha256(
+        json.dumps(config_key, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+
+    results = []
+    for size_mb in sizes_mb:
+        filepath = work_dir / f"synthetic-{size_mb:g}mb-{config_hash}.json"
+        if not filepath.exists():
+            # Generate under a temporary name so an interrupted run can't leave a partial session
+            temp_path = filepath.with_suffix(".tmp")
+            write_synthetic_session(temp_path, int(size_mb * 1_000_000), config)
+            os.replace(temp_path, filepath)
+
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(_measure_ingest, filepath).result()
+        size_bytes = filepath.stat().st_size
+        results.append(
+            {
+                "size_mb": size_mb,
+                "bytes": size_bytes,
+                "seconds": result["seconds"],
+                "mb_per_second": size_bytes / 1_000_000 / result["seconds"],
+                "events_per_second": result["events"] / result["seconds"],
+                "interactions": result["interactions"],
+                "peak_rss_mb": result["peak_rss_mb"],
+            }
+        )
+    return results
+
+
+def record_ingest_results(
+    results_path: Path, config: SyntheticSessionConfig, results: List[dict]
+) -> None:
+    """
+    Append the results of an ingest benchmark run to a JSON lines file, for tracking
+    regressions between runs.
+
+    Args:
+        results_path: JSON lines file to append the run to
+        config: Shape of the sessions ingested
+        results: Results of benchmark_ingest
+    """
+    with open(results_path, "a", encoding="utf-8") as f:
+        record = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "config": asdict(config),
+            "results": results,
+        }
+        f.write(json.dumps(record) + "\n")
+
+
+def _measure_ingest(filepath: Path) -> dict:
+    """
+    Ingest a session, measuring the time taken and this process's peak RSS.
+    """
+    profile = SessionProfile()
+    start = time.perf_counter()
+    session = ingest_session(filepath.stem, filepath, profile)
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux, but bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return {
+        "seconds": seconds,
+        "events": profile.events["parse"],
+        "interactions": len(session.user_interactions) if session else 0,
+        "peak_rss_mb": peak_rss / 1_000_000,
+    }
+
+
+def _stitch(events: List[dict], rng: random.Random) -> List[dict]:
+    """
+    Split events into chunks whose timestamps overlap with the next chunk.
+    """
+    chunk_size = max(1, len(events) // STITCHED_CHUNKS)
+    stitched = []
+    late_events = []
+    for start in range(0, len(events), chunk_size):
+        end = start + chunk_size
+        chunk = events[start:end]
+        # A few of each chunk's last events arrive after the next chunk
+        overlap = rng.randint(1, min(3, len(chunk)))
+        stitched.extend(chunk[:-overlap])
+        stitched.extend(late_events)
+        late_events = chunk[-overlap:]
+    stitched.extend(late_events)
+    return stitched
+
+
+def _merge_runs(events: List[dict]) -> List[dict]:
+    """
+    Sort events with a k-way merge of the runs of events already in order.
+    """
+    run_starts = [0] + [
+        i
+        for i in range(1, len(events))
+        if events[i]["timestamp"] < events[i - 1]["timestamp"]
+    ]
+    runs = [
+        events[start:end]
+        for start, end in zip(run_starts, run_starts[1:] + [len(events)])
+    ]
+    return list(heapq.merge(*runs, key=lambda event: event["timestamp"]))
+
+
+def _time(sort: Callable, sessions: List[List[dict]], repeat: int) -> float:
+    # Sort copies so sorts which return their input are timed the same as others
+    return timeit.timeit(
+        lambda: [sort(list(events)) for events in sessions], number=repeat
+    )
+
+
+def _events_per_second(
+    classify: Callable[[dict], str], events: List[dict], repeat: int
+) -> float:
+    seconds = timeit.timeit(
+        lambda: [classify(event) for event in events], number=repeat
+    )
+    return len(events) * repeat / seconds
+
+
+def main():
+    """
+    Run the benchmarks and print the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the rrweb ingest pipeline")
+    parser.add_argument(
+        "--session_dir",
+        type=Path,
+        default=DEFAULT_SESSION_DIR,
+        help="Directory containing rrweb JSON session files (default: test sessions)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=20,
+        help="Number of times to repeat each benchmark (default: 20)",
+    )
+    parser.add_argument(
+        "--ingest",
+        action="store_true",
+        help="Benchmark ingest_session on synthetic sessions instead",
+    )
+    parser.add_argument(
+        "--sizes_mb",
+        type=float,
+        nargs="+",
+        default=DEFAULT_INGEST_SIZES_MB,
+        help="Sizes of the synthetic sessions to ingest in MB (default: 1 10 100 500)",
+    )
+    parser.add_argument(
+        "--work_dir",
+        type=Path,
+        default=DEFAULT_WORK_DIR,
+        help=f"Directory to generate synthetic sessions in (default: {DEFAULT_WORK_DIR})",
+    )
+    parser.add_argument(
+        "--results",
+        type=Path,
+        help="JSON lines file to append the ingest benchmark's results to",
+    )
+    for config_field in fields(SyntheticSessionConfig):
+        parser.add_argument(
+            f"--{config_field.name}",
+            type=config_field.type,
+            default=config_field.default,
+            help=f"Synthetic sessions' {config_field.name} (default: {config_field.default})",
+        )
+    args = parser.parse_args()
+
+    if args.ingest:
+        _run_ingest_benchmark(args)
+    else:
+        _run_benchmarks(args)
+
+
+def _run_benchmarks(args: argparse.Namespace) -> None:
+    sessions = load_session_events(args.session_dir)
+    event_count = sum(len(events) for events in sessions)
+    print(f"Sorting {len(sessions)} sessions, {event_count} events, x{args.repeat}")
+    for ordering, timings in benchmark_sort_events(sessions, args.repeat).items():
+        baseline = timings["key_function"]
+        for name, seconds in timings.items():
+            print(
+                f"  {ordering:<10} {name:<13} {seconds * 1000:8.1f} ms"
+                f"  ({baseline / seconds:.2f}x key_function)"
+            )
+
+    print(f"Classifying {event_count} events, x{args.repeat}")
+    dispatch_rates = benchmark_event_dispatch(sessions, args.repeat)
+    baseline = dispatch_rates["predicates"]
+    for name, events_per_second in dispatch_rates.items():
+        print(
+            f"  {name:<14} {events_per_second:12,.0f} events/s"
+            f"  ({events_per_second / baseline:.2f}x predicates)"
+        )
+
+
+def _run_ingest_benchmark(args: argparse.Namespace) -> None:
+    config = SyntheticSessionConfig(
+        **{
+            config_field.name: getattr(args, config_field.name)
+            for config_field in fields(SyntheticSessionConfig)
+        }
+    )
+    print(f"Ingesting synthetic sessions: {config}")
+    results = benchmark_ingest(args.sizes_mb, args.work_dir, config)
+    for result in results:
+        print(
+            f"  {result['size_mb']:>7g} MB {result['seconds']:8.2f} s"
+            f" {result['mb_per_second']:7.2f} MB/s"
+            f" {result['events_per_second']:10,.0f} events/s"
+            f"  peak RSS {result['peak_rss_mb']:8.1f} MB"
+        )
+    if args.results:
+        record_ingest_results(args.results, config, results)
+        print(f"Recorded results in {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ import os
 import sys
 from pathlib import Path
 
-from .pipeline import process_sessions
+from .pipeline import OUTPUT_FORMATS, ProcessOptions, process_sessions
 
 logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
@@ -35,6 +35,21 @@ Examples:
 
   # Process only first 10 sessions with verbose debugging output
   LOGLEVEL=DEBUG python -m rrweb_ingest --max_sessions 10
+
+  # Ingest sessions in parallel with 8 worker processes
+  python -m rrweb_ingest --workers 8
+
+  # Reprocess all sessions, including those unchanged since they were last ingested
+  python -m rrweb_ingest --force
+
+  # Save sessions in the compact format, which is smaller and faster for the rule engine to load
+  python -m rrweb_ingest --output_format compact
+
+  # Profile ingest, saving cProfile stats to the output directory and logging peak memory use
+  python -m rrweb_ingest --profile
+
+  # Keep each session within about 512 MiB, degrading ingest of larger sessions rather than failing
+  python -m rrweb_ingest --memory_budget_mb 512
         """,
     )
 
@@ -56,6 +71,43 @@ Examples:
         help="Maximum number of sessions to process (default: process all)",
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes to ingest sessions in parallel with (default: 1)",
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Process all sessions, including those unchanged since they were last ingested "
+        "into the output directory",
+    )
+
+    parser.add_argument(
+        "--output_format",
+        choices=OUTPUT_FORMATS,
+        default="json",
+        help="Format to save processed sessions in. compact interns repeated strings such as "
+        "DOM paths and is much smaller and faster to load (default: json)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile ingest with cProfile, saving the stats to the output directory, "
+        "and trace each session's peak memory use. Slows ingest down considerably",
+    )
+
+    parser.add_argument(
+        "--memory_budget_mb",
+        type=float,
+        help="Budget for the memory each session may hold in MiB, estimated from its DOM nodes "
+        "and interactions. Larger sessions evict nodes removed from the DOM, or are truncated, "
+        "rather than failing the run (default: no budget)",
+    )
+
     return parser.parse_args()
 
 
@@ -75,6 +127,14 @@ def _validate_inputs(args):
         logger.error("Session path is not a directory: %s", session_dir)
         sys.exit(1)
 
+    if args.workers < 1:
+        logger.error("Number of workers must be at least 1: %d", args.workers)
+        sys.exit(1)
+
+    if args.memory_budget_mb is not None and args.memory_budget_mb <= 0:
+        logger.error("Memory budget must be positive: %s", args.memory_budget_mb)
+        sys.exit(1)
+
     # Check if session directory contains any JSON files
     json_files = list(session_dir.glob("*.json"))
     if not json_files:
@@ -85,6 +145,11 @@ def _validate_inputs(args):
     logger.debug("Session directory: %s", session_dir)
     logger.debug("Output directory: %s", output_dir)
     logger.debug("Max sessions: %s", args.max_sessions or "unlimited")
+    logger.debug("Workers: %d", args.workers)
+    logger.debug("Force: %s", args.force)
+    logger.debug("Output format: %s", args.output_format)
+    logger.debug("Profile: %s", args.profile)
+    logger.debug("Memory budget: %s MiB", args.memory_budget_mb or "unlimited")
     logger.debug("Found %d JSON files", len(json_files))
     logger.debug("")
 
@@ -97,13 +162,28 @@ def main():
     session_dir, output_dir = _validate_inputs(args)
 
     try:
-        stats = process_sessions(session_dir, output_dir, args.max_sessions)
+        stats = process_sessions(
+            session_dir,
+            output_dir,
+            args.max_sessions,
+            ProcessOptions(
+                workers=args.workers,
+                force=args.force,
+                output_format=args.output_format,
+                profile=args.profile,
+                memory_budget_mb=args.memory_budget_mb,
+            ),
+        )
 
         # Print final summary
         logger.debug("\n%s", "=" * 50)
 
         logger.info("Feature extraction completed successfully!")
         logger.info("Sessions processed: %d", stats["sessions_processed"])
+        logger.info(
+            "Sessions skipped (unchanged since last ingested): %d",
+            stats["sessions_skipped"],
+        )
         logger.info("Sessions saved: %d", stats["sessions_saved"])
 
         # Print feature type counts if any were extracted
@@ -117,6 +197,20 @@ def main():
                 if count > 0:
                     logger.info("  %s: %d", interaction_type, count)
 
+        _log_profile(stats)
+        _log_degraded_sessions(stats)
+
+        logger.info("Worker throughput:")
+        for worker, worker_stats in sorted(stats["workers"].items()):
+            seconds = worker_stats["seconds"]
+            logger.info(
+                "  Worker %d: %d sessions in %.1fs (%.2f sessions/s)",
+                worker,
+                worker_stats["sessions"],
+                seconds,
+                worker_stats["sessions"] / seconds if seconds else 0.0,
+            )
+
         logger.info("Output files saved to: %s", output_dir)
 
     except KeyboardInterrupt:
@@ -124,5 +218,56 @@ def main():
         sys.exit(1)
 
 
+def _log_profile(stats: dict):
+    """Log the time spent in each stage of ingest and any profiling results."""
+    logger.info("Stage timings:")
+    for stage, stage_stats in stats["stages"].items():
+        unit = "sessions" if stage == "write" else "events"
+        if stage_stats["seconds"] is None:
+            logger.info("  %s: %d %s", stage, stage_stats["events"], unit)
+        else:
+            logger.info(
+                "  %s: %.2fs for %d %s",
+                stage,
+                stage_stats["seconds"],
+                stage_stats["events"],
+                unit,
+            )
+
+    if stats["peak_memory"]:
+        session_id, peak_memory = max(
+            stats["peak_memory"].items(), key=lambda item: item[1]
+        )
+        logger.info(
+            "Largest peak memory: %.1f MiB ingesting %s",
+            peak_memory / (1024 * 1024),
+            session_id,
+        )
+    if stats.get("profile_path"):
+        logger.info(
+            "Profile saved to: %s (view with python -m pstats %s)",
+            stats["profile_path"],
+            stats["profile_path"],
+        )
+
+
+def _log_degraded_sessions(stats: dict):
+    """Log the sessions which were degraded to stay within the memory budget."""
+    if not stats["degraded_sessions"]:
+        return
+    logger.warning(
+        "Sessions degraded to stay within the memory budget: %d",
+        len(stats["degraded_sessions"]),
+    )
+    for session_id, degraded in stats["degraded_sessions"].items():
+        logger.warning(
+            "  %s: %s (estimated %.1f MiB, %d interactions dropped)",
+            session_id,
+            ", ".join(degraded["degradations"]),
+            degraded["peak_estimate"] / (1024 * 1024),
+            degraded["interactions_dropped"],
+        )
+
+
 if __name__ == "__main__":
     main()
@@ -9,6 +9,23 @@ processing on meaningful user interactions.
 from rrweb_util import IncrementalSource
 from rrweb_util.helpers import is_incremental_snapshot, is_event_of_type
 
+# Sources of IncrementalSnapshot events dropped as noise, e.g. mousemove events & scrolling
+LOW_SIGNAL_SOURCES = frozenset(
+    {
+        IncrementalSource.MOUSE_MOVE,
+        IncrementalSource.SCROLL,
+        IncrementalSource.VIEWPORT_RESIZE,
+        IncrementalSource.TOUCH_MOVE,
+        IncrementalSource.MEDIA_INTERACTION,
+        IncrementalSource.STYLE_SHEET_RULE,
+        IncrementalSource.FONT,
+        IncrementalSource.LOG,
+        IncrementalSource.STYLE_DECLARATION,
+        IncrementalSource.ADOPTED_STYLE_SHEET,
+        IncrementalSource.CUSTOM_ELEMENT,
+    }
+)
+
 
 def is_low_signal(event: dict) -> bool:
     """
@@ -39,19 +56,4 @@ def is_low_signal(event: dict) -> bool:
         return False
 
     # Drop mousemove events, scroll events, & other low-signal events
-    return is_event_of_type(
-        event,
-        [
-            IncrementalSource.MOUSE_MOVE,
-            IncrementalSource.SCROLL,
-            IncrementalSource.VIEWPORT_RESIZE,
-            IncrementalSource.TOUCH_MOVE,
-            IncrementalSource.MEDIA_INTERACTION,
-            IncrementalSource.STYLE_SHEET_RULE,
-            IncrementalSource.FONT,
-            IncrementalSource.LOG,
-            IncrementalSource.STYLE_DECLARATION,
-            IncrementalSource.ADOPTED_STYLE_SHEET,
-            IncrementalSource.CUSTOM_ELEMENT,
-        ],
-    )
+    return is_event_of_type(event, LOW_SIGNAL_SOURCES)
@@ -4,14 +4,73 @@ JSON Loader & Sorter for rrweb session data.
 This module provides functionality to load, validate, and sort rrweb session recordings
 from JSON files. It ensures that the data conforms to the expected schema and is properly
 ordered by timestamp for downstream processing.
+
+Events can be streamed with iter_events, which incrementally parses the session's
+rrweb_data array so only the event being parsed is held in memory, or loaded all at once
+and sorted with load_events.
+
+Either can skip IncrementalSnapshot events from sources which aren't needed, e.g. mousemove
+events, while parsing. Events serialized as rrweb records them are skipped without decoding
+them, so no dicts are built for them.
 """
 
 import json
+import operator
+import re
 from pathlib import Path
-from typing import List
+from typing import Collection, Iterable, Iterator, List, Optional
+
+from rrweb_util.helpers import is_event_of_type
+
+# Characters read from the session file at a time when streaming events
+STREAM_CHUNK_SIZE = 64 * 1024
+
+REQUIRED_EVENT_FIELDS = {"type", "timestamp", "data"}
 
+_EVENT_TIMESTAMP = operator.itemgetter("timestamp")
 
-def load_events(filepath: str | Path) -> List[dict]:
+_WHITESPACE_RE = re.compile(r"\s*")
+
+# Start of an IncrementalSnapshot (type 3) event as rrweb serializes it, capturing its source
+_INCREMENTAL_SOURCE_RE = re.compile(
+    r'\{\s*"type"\s*:\s*3\s*,\s*"data"\s*:\s*\{\s*"source"\s*:\s*(\d+)\s*[,}]'
+)
+
+# Deepest nesting of objects & arrays in an event which can be skipped without decoding it
+SKIP_MAX_DEPTH = 6
+
+
+def _balanced_object_re(depth: int) -> re.Pattern:
+    """
+    Build a regex matching a JSON object with objects & arrays nested up to depth deep,
+    without decoding it. Possessive quantifiers never backtrack, so matching is linear.
+    Strings with escapes aren't matched, which is faster and rare in skipped events.
+    """
+    string = r'"[^"\\]*+"'
+    content = r'(?:[^{}\[\]"]++|' + string + r")*+"
+    for _ in range(depth - 1):
+        content = (
+            r'(?:[^{}\[\]"]++|'
+            + string
+            + r"|\{"
+            + content
+            + r"\}|\["
+            + content
+            + r"\])*+"
+        )
+    return re.compile(r"\{" + content + r"\}")
+
+
+_SKIPPED_EVENT_RE = _balanced_object_re(SKIP_MAX_DEPTH)
+
+
+class UnsortedEventsError(ValueError):
+    """Raised when streaming events which must be in timestamp order but aren't."""
+
+
+def load_events(
+    filepath: str | Path, skip_sources: Collection[int] = frozenset()
+) -> List[dict]:
     """
     Load an rrweb session file, validate its structure, and return sorted events.
 
@@ -21,6 +80,7 @@ def load_events(filepath: str | Path) -> List[dict]:
 
     Args:
         filepath: Path to the JSON file containing rrweb session data
+        skip_sources: Sources of IncrementalSnapshot events to drop while parsing
 
     Returns:
         List of event dictionaries sorted by timestamp in ascending order
@@ -31,38 +91,270 @@ def load_events(filepath: str | Path) -> List[dict]:
         ValueError: If the JSON structure is invalid (not a list, or events missing
                    required fields 'type', 'timestamp', or 'data')
     """
-    # Open and parse the JSON file
+    return sort_events(iter_events(filepath, skip_sources=skip_sources))
+
+
+def sort_events(events: Iterable[dict]) -> List[dict]:
+    """
+    Sort events by timestamp in ascending order, taking advantage of existing order.
+
+    Python's sort (Timsort) finds runs of events which are already in order and merges
+    them, so events recorded in order are checked in a single pass, stitched sessions,
+    which are a concatenation of ordered chunks, are merged in near linear time, and only
+    shuffled events need a full sort. Events with the same timestamp keep their relative
+    order.
+
+    Args:
+        events: Event dictionaries with a timestamp
+
+    Returns:
+        New list of the event dictionaries sorted by timestamp in ascending order
+    """
+    # itemgetter avoids calling a Python function for each event's sort key
+    return sorted(events, key=_EVENT_TIMESTAMP)
+
+
+def iter_events(
+    filepath: str | Path,
+    require_sorted: bool = False,
+    skip_sources: Collection[int] = frozenset(),
+) -> Iterator[dict]:
+    """
+    Stream the validated events of an rrweb session file in the order they're stored.
+
+    The session's rrweb_data array is parsed incrementally, so memory use is bounded
+    by the largest event rather than the size of the file. Each event is validated
+    as it's parsed, so events before an invalid event are yielded before the error
+    is raised.
+
+    IncrementalSnapshot events from skip_sources are dropped. Those serialized as rrweb
+    records them, with type, data, and data's source first, are skipped by matching their
+    brackets instead of decoding them, so they're neither validated nor checked for order.
+
+    Args:
+        filepath: Path to the JSON file containing rrweb session data
+        require_sorted: Whether to raise if the events aren't in timestamp order
+        skip_sources: Sources of IncrementalSnapshot events to drop while parsing, e.g.
+            rrweb_ingest.filter.LOW_SIGNAL_SOURCES
+
+    Yields:
+        Event dictionaries in the order they're stored in the file
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist
+        JSONDecodeError: If the file contains invalid JSON syntax
+        ValueError: If the JSON structure is invalid (not a list, or events missing
+                   required fields 'type', 'timestamp', or 'data')
+        UnsortedEventsError: If require_sorted is set and an event's timestamp is
+                   before the previous event's
+    """
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
+        # pylint: disable-next=consider-using-with
+        f = open(filepath, "r", encoding="utf-8")
     except FileNotFoundError as exc:
         raise FileNotFoundError(f"Session file not found: {filepath}") from exc
-    except json.JSONDecodeError as exc:
-        raise json.JSONDecodeError(
-            f"Invalid JSON in file {filepath}: {exc.msg}", exc.doc, exc.pos
-        ) from exc
 
-    if "rrweb_data" not in raw_data:
+    with f:
+        try:
+            yield from _iter_rrweb_data(
+                _JSONStreamReader(f), require_sorted, skip_sources
+            )
+        except json.JSONDecodeError as exc:
+            raise json.JSONDecodeError(
+                f"Invalid JSON in file {filepath}: {exc.msg}", exc.doc, exc.pos
+            ) from exc
+
+
+def _iter_rrweb_data(
+    reader: "_JSONStreamReader",
+    require_sorted: bool,
+    skip_sources: Collection[int],
+) -> Iterator[dict]:
+    """
+    Stream the events of the rrweb_data array in a session object, skipping other fields.
+    """
+    next_char = reader.peek()
+    if not next_char:
+        raise reader.error("Expecting value")
+    if next_char != "{":
+        raise ValueError("Session file must contain a JSON object")
+    reader.expect("{")
+
+    found_rrweb_data = False
+    if reader.peek() != "}":
+        while True:
+            if reader.peek() != '"':
+                raise reader.error("Expecting property name enclosed in double quotes")
+            key = reader.decode()
+            reader.expect(":")
+            if key == "rrweb_data":
+                yield from _iter_event_array(reader, require_sorted, skip_sources)
+                found_rrweb_data = True
+            else:
+                reader.decode()
+            if reader.peek() != ",":
+                break
+            reader.expect(",")
+    reader.expect("}")
+
+    if not found_rrweb_data:
         raise ValueError("Missing 'rrweb_data' field in session file")
-    rrweb_data = raw_data.get("rrweb_data", None)
 
-    # Validate that the top-level structure is a list
-    if not isinstance(rrweb_data, list):
+
+def _iter_event_array(
+    reader: "_JSONStreamReader",
+    require_sorted: bool,
+    skip_sources: Collection[int],
+) -> Iterator[dict]:
+    """
+    Stream and validate the events of an rrweb_data array.
+    """
+    # Validate that the rrweb_data is a list
+    if reader.peek() != "[":
         raise ValueError("Session must be JSON array")
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.expect("]")
+        return
 
-    # Validate each event has required fields
-    required_fields = {"type", "timestamp", "data"}
-    for i, event in enumerate(rrweb_data):
-        if not isinstance(event, dict):
-            raise ValueError(
-                f"Event at index {i} must be an object, got {type(event).__name__}"
-            )
+    index = 0
+    previous_timestamp = None
+    while True:
+        event = _read_event(reader, index, skip_sources)
+        if event is not None:
+            if (
+                require_sorted
+                and previous_timestamp is not None
+                and event["timestamp"] < previous_timestamp
+            ):
+                raise UnsortedEventsError(
+                    f"Event at index {index} is before the previous event"
+                )
+            previous_timestamp = event["timestamp"]
+            yield event
 
-        missing_fields = required_fields - set(event.keys())
-        if missing_fields:
-            raise ValueError(
-                f"Event at index {i} missing required fields: {missing_fields}"
-            )
+        index += 1
+        if reader.peek() != ",":
+            reader.expect("]")
+            return
+        reader.expect(",")
+
+
+def _read_event(
+    reader: "_JSONStreamReader", index: int, skip_sources: Collection[int]
+) -> Optional[dict]:
+    """
+    Decode and validate the next event, or return None if it's skipped.
+    """
+    if skip_sources and reader.skip_incremental_event(skip_sources):
+        return None
+    event = reader.decode()
+    _validate_event(index, event)
+    # Events serialized differently are only recognized once they're decoded
+    if skip_sources and is_event_of_type(event, skip_sources):
+        return None
+    return event
+
+
+def _validate_event(index: int, event) -> None:
+    """
+    Validate an event is an object with the required fields.
+    """
+    if not isinstance(event, dict):
+        raise ValueError(
+            f"Event at index {index} must be an object, got {type(event).__name__}"
+        )
+
+    missing_fields = REQUIRED_EVENT_FIELDS - set(event.keys())
+    if missing_fields:
+        raise ValueError(
+            f"Event at index {index} missing required fields: {missing_fields}"
+        )
+
+
+class _JSONStreamReader:
+    """
+    Incrementally decodes JSON values from a text file.
+
+    Holds a buffer of the file from the current position which is refilled as values
+    are decoded, growing it geometrically for values larger than STREAM_CHUNK_SIZE.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character, or '' at the end of the file.
+        """
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """
+        Consume the next non-whitespace character, which must be char.
+        """
+        if self.peek() != char:
+            raise self.error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def error(self, msg: str) -> json.JSONDecodeError:
+        """
+        Create an error for invalid JSON at the current position.
+        """
+        return json.JSONDecodeError(msg, self._buffer, self._pos)
+
+    def decode(self):
+        """
+        Decode the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value ending with the buffer may continue, e.g. a number
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read_more(len(self._buffer) - self._pos)
+
+    def skip_incremental_event(self, sources: Collection[int]) -> bool:
+        """
+        Skip the next value without decoding it if it's an IncrementalSnapshot event from
+        one of the sources, serialized as rrweb records them. Returns False if it isn't,
+        or it can't be skipped, e.g. it continues past the buffer, so it must be decoded.
+        """
+        self.peek()
+        match = _INCREMENTAL_SOURCE_RE.match(self._buffer, self._pos)
+        if match is None or int(match.group(1)) not in sources:
+            return False
+        match = _SKIPPED_EVENT_RE.match(self._buffer, self._pos)
+        if match is None:
+            return False
+        self._pos = match.end()
+        return True
 
-    # Sort events by timestamp in ascending order
-    return sorted(rrweb_data, key=lambda event: event["timestamp"])
+    def _read_more(self, size: int = 0) -> bool:
+        """
+        Append at least STREAM_CHUNK_SIZE characters to the buffer, dropping what's
+        been consumed. Returns False at the end of the file.
+        """
+        chunk = self._file.read(max(size, STREAM_CHUNK_SIZE))
+        if not chunk:
+            self._eof = True
+            return False
+        consumed = self._pos
+        self._buffer = self._buffer[consumed:] + chunk
+        self._pos = 0
+        return True
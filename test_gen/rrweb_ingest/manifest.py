@@ -0,0 +1,149 @@
+"""
+Manifest of the sessions ingested into an output directory.
+
+Records each ingested session file's size, modification time, and content hash along with
+the feature extraction version and output format, so re-running ingest into the same output
+directory can skip sessions which haven't changed since they were last ingested.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from rrweb_ingest.models import FEATURE_EXTRACTION_VERSION
+
+# Not named *.json, so it isn't mistaken for a processed session in the output directory
+MANIFEST_FILENAME = ".ingest_manifest"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestManifest:
+    """
+    The session files ingested into an output directory and the outputs they were saved to.
+
+    A session is unchanged if the manifest has an entry for it with the same size and either the
+    same modification time or the same content hash, and the output it was saved to still exists.
+    Entries are only kept for the current FEATURE_EXTRACTION_VERSION and output format.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        output_format: str,
+        sessions: Optional[Dict[str, dict]] = None,
+    ):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self._sessions = sessions or {}
+        self._fingerprints = {}
+
+    @classmethod
+    def load(cls, output_dir: Path, output_format: str) -> "IngestManifest":
+        """
+        Load the manifest from an output directory, or start an empty one if there's none or
+        it was written by a different feature extraction version or output format.
+
+        Args:
+            output_dir: Directory processed sessions are saved to
+            output_format: Format processed sessions are saved in
+
+        Returns:
+            The manifest for the output directory
+        """
+        try:
+            with open(output_dir / MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(output_dir, output_format)
+
+        if (
+            data.get("feature_extraction_version") != FEATURE_EXTRACTION_VERSION
+            or data.get("output_format") != output_format
+        ):
+            return cls(output_dir, output_format)
+        return cls(output_dir, output_format, data["sessions"])
+
+    def is_unchanged(self, filepath: Path) -> bool:
+        """
+        Check if a session file is unchanged since it was last ingested.
+
+        Only hashes the file if its size matches but its modification time doesn't. Files
+        which need ingesting are fingerprinted for recording once they've been ingested.
+
+        Args:
+            filepath: Path to the rrweb session JSON file
+
+        Returns:
+            True if the session doesn't need ingesting again
+        """
+        stat = filepath.stat()
+        entry = self._sessions.get(filepath.name)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or not self._has_output(entry)
+        ):
+            self._fingerprints[filepath.name] = fingerprint
+            return False
+        if entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+
+        # The file was touched, e.g. downloaded again, so check its content
+        fingerprint["sha256"] = _hash_file(filepath)
+        if fingerprint["sha256"] == entry["sha256"]:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return True
+        self._fingerprints[filepath.name] = fingerprint
+        return False
+
+    def record(self, filepath: Path, output_name: Optional[str]) -> None:
+        """
+        Record a session file was ingested.
+
+        Args:
+            filepath: Path to the rrweb session JSON file
+            output_name: Filename the processed session was saved to in the output directory,
+                or None if it wasn't saved
+        """
+        fingerprint = self._fingerprints.pop(filepath.name, None)
+        if fingerprint is None:
+            stat = filepath.stat()
+            fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if "sha256" not in fingerprint:
+            fingerprint["sha256"] = _hash_file(filepath)
+        self._sessions[filepath.name] = {**fingerprint, "output": output_name}
+
+    def save(self) -> None:
+        """
+        Save the manifest to the output directory.
+        """
+        manifest_path = self.output_dir / MANIFEST_FILENAME
+        temp_path = manifest_path.with_name(f"{MANIFEST_FILENAME}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "feature_extraction_version": FEATURE_EXTRACTION_VERSION,
+                    "output_format": self.output_format,
+                    "sessions": self._sessions,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        # Replace the manifest in one step so an interrupted run can't leave it partially written
+        os.replace(temp_path, manifest_path)
+
+    def _has_output(self, entry: dict) -> bool:
+        return entry["output"] is None or (self.output_dir / entry["output"]).exists()
+
+
+def _hash_file(filepath: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
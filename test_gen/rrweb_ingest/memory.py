@@ -0,0 +1,81 @@
+"""
+Memory budgets for ingesting rrweb sessions.
+
+A pathological session can hold enough in memory to run out of it, taking the rest of the
+batch down with it. MemoryGuard keeps a session within a budget by estimating the memory it
+holds from counts of the DOM nodes & user interactions it has built, which are cheap enough to
+check after every event, unlike tracing allocations with tracemalloc. When a session would go
+over its budget, ingest degrades rather than failing, and the guard records how.
+"""
+
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+from typing import List
+
+# Estimated bytes held per DOM node & user interaction, including the dicts & strings decoded
+# from their events, measured with tracemalloc ingesting synthetic sessions
+BYTES_PER_NODE = 700
+BYTES_PER_INTERACTION = 650
+
+# Estimated peak bytes held by load_events per byte of the session file
+LOADED_BYTES_PER_FILE_BYTE = 7
+
+# Ways ingest degrades to stay within a session's memory budget:
+# - streamed_unsorted: a session whose events aren't in timestamp order was streamed in the
+#   order they were recorded, rather than loaded whole to sort them
+# - evicted_removed_nodes: nodes removed from the DOM were evicted from the DOM state, so
+#   interactions with them are dropped
+# - truncated: the session's remaining events were dropped, keeping the interactions so far
+# - skipped: a session streamed unsorted couldn't be ingested in the order its events were
+#   recorded, e.g. with an IncrementalSnapshot before its FullSnapshot, so it was skipped
+STREAMED_UNSORTED = "streamed_unsorted"
+EVICTED_REMOVED_NODES = "evicted_removed_nodes"
+TRUNCATED = "truncated"
+SKIPPED = "skipped"
+
+
+@dataclass
+class MemoryGuard:
+    """
+    Memory budget for ingesting a session, and how ingest degraded to stay within it.
+
+    Attributes:
+        budget: Estimated bytes the session may hold
+        degradations: Ways ingest degraded to stay within the budget, in the order they happened
+        peak_estimate: Largest estimate of the bytes held by the session
+        interactions_dropped: Interactions dropped because their target was evicted
+    """
+
+    budget: int
+    degradations: List[str] = field(default_factory=list)
+    peak_estimate: int = 0
+    interactions_dropped: int = 0
+
+    def allows_loading(self, filepath: Path) -> bool:
+        """
+        Whether loading the whole session file with load_events fits within the budget.
+        """
+        return os.path.getsize(filepath) * LOADED_BYTES_PER_FILE_BYTE <= self.budget
+
+    def allows(self, nodes: int, interactions: int) -> bool:
+        """
+        Whether the session's DOM nodes & user interactions fit within the budget.
+        """
+        estimate = nodes * BYTES_PER_NODE + interactions * BYTES_PER_INTERACTION
+        self.peak_estimate = max(self.peak_estimate, estimate)
+        return estimate <= self.budget
+
+    def degrade(self, degradation: str) -> None:
+        """
+        Record that ingest degraded to stay within the budget.
+        """
+        self.degradations.append(degradation)
+
+    def reset(self) -> None:
+        """
+        Forget how ingest degraded, to ingest the session again from the start.
+        """
+        self.degradations.clear()
+        self.peak_estimate = 0
+        self.interactions_dropped = 0
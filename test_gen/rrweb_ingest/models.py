@@ -1,15 +1,20 @@
 """
 Data models for the rrweb_ingest module.
 
-Defines the composite data structure of features we extract when processing an rrweb session
+Defines the composite data structure of features we extract when processing an rrweb session,
+and the formats it's serialized in.
 """
 
 from dataclasses import dataclass, field
+import json
 from typing import List, Dict, Any
 from rrweb_util.user_interaction.models import UserInteraction
 
 FEATURE_EXTRACTION_VERSION = "0.1"
 
+# Format of processed sessions serialized with ProcessedSession.to_compact_dict
+COMPACT_FORMAT = "compact-v1"
+
 
 @dataclass
 class ProcessedSession:
@@ -42,11 +47,102 @@ class ProcessedSession:
             "metadata": self.metadata,
         }
 
+    def to_compact_dict(self) -> Dict[str, Any]:
+        """
+        Convert to a compact dictionary for JSON serialization.
+
+        Interactions are stored in columns, and each distinct target node is stored once,
+        with its strings, such as long dom_paths, interned in a table of strings shared by
+        the session. Interned strings are stored as their index in the table, and other
+        values are wrapped in a list so they aren't mistaken for an index.
+        """
+        strings = {}
+        target_nodes = []
+        target_node_indexes = {}
+        interactions = {
+            "action": [],
+            "target_id": [],
+            "target_node": [],
+            "value": [],
+            "timestamp": [],
+        }
+
+        def encode(value):
+            if isinstance(value, str):
+                return strings.setdefault(value, len(strings))
+            return None if value is None else [value]
+
+        for ui in self.user_interactions:
+            target_node = {
+                name: encode(value) for name, value in ui.target_node.items()
+            }
+            # Encoded nodes can contain lists, so duplicates are found by their JSON
+            key = json.dumps(target_node)
+            if key not in target_node_indexes:
+                target_node_indexes[key] = len(target_nodes)
+                target_nodes.append(target_node)
+
+            interactions["action"].append(encode(ui.action))
+            interactions["target_id"].append(ui.target_id)
+            interactions["target_node"].append(target_node_indexes[key])
+            interactions["value"].append(ui.value)
+            interactions["timestamp"].append(ui.timestamp)
+
+        return {
+            "format": COMPACT_FORMAT,
+            "session_id": self.session_id,
+            "strings": list(strings),
+            "target_nodes": target_nodes,
+            "user_interactions": interactions,
+            "metadata": self.metadata,
+        }
+
 
 def processed_session_from_dict(data: Dict[str, Any]) -> ProcessedSession:
-    """Create a ProcessedSession instance from a dictionary."""
+    """
+    Create a ProcessedSession instance from a dictionary, in either the format of
+    ProcessedSession.to_dict or ProcessedSession.to_compact_dict.
+    """
+    if data.get("format") == COMPACT_FORMAT:
+        user_interactions = _user_interactions_from_compact_dict(data)
+    else:
+        user_interactions = [UserInteraction(**ui) for ui in data["user_interactions"]]
     return ProcessedSession(
         session_id=data["session_id"],
-        user_interactions=[UserInteraction(**ui) for ui in data["user_interactions"]],
+        user_interactions=user_interactions,
         metadata=data["metadata"],
     )
+
+
+def _user_interactions_from_compact_dict(
+    data: Dict[str, Any],
+) -> List[UserInteraction]:
+    strings = data["strings"]
+
+    def decode(value):
+        if isinstance(value, int):
+            return strings[value]
+        return None if value is None else value[0]
+
+    target_nodes = [
+        {name: decode(value) for name, value in target_node.items()}
+        for target_node in data["target_nodes"]
+    ]
+    interactions = data["user_interactions"]
+    return [
+        UserInteraction(
+            action=strings[action],
+            target_id=target_id,
+            # Copy so interactions don't share a mutable target node
+            target_node=dict(target_nodes[target_node]),
+            value=value,
+            timestamp=timestamp,
+        )
+        for action, target_id, target_node, value, timestamp in zip(
+            interactions["action"],
+            interactions["target_id"],
+            interactions["target_node"],
+            interactions["value"],
+            interactions["timestamp"],
+        )
+    ]
@@ -5,28 +5,118 @@ This module provides the main entry point for processing rrweb session recording
 It orchestrates the complete pipeline from raw JSON loading through user interaction extraction.
 """
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from functools import partial
 import json
 import logging
+import os
 from pathlib import Path
 from pprint import pformat
-from typing import Generator, List, Optional
-
-from rrweb_ingest.loader import load_events
-from rrweb_ingest.filter import is_low_signal
+import pstats
+import shutil
+import tempfile
+import time
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from rrweb_ingest.loader import iter_events, load_events
+from rrweb_ingest.filter import LOW_SIGNAL_SOURCES
+from rrweb_ingest.manifest import IngestManifest
+from rrweb_ingest.memory import (
+    EVICTED_REMOVED_NODES,
+    SKIPPED,
+    STREAMED_UNSORTED,
+    TRUNCATED,
+    MemoryGuard,
+)
 from rrweb_ingest.models import ProcessedSession
-from rrweb_util import EventType
-from rrweb_util.helpers import is_dom_mutation_event
-from rrweb_util.dom_state.dom_state_helpers import apply_mutation, init_dom_state
-from rrweb_util.user_interaction.extractors import extract_user_interactions
+from rrweb_ingest.profiling import (
+    INGEST_STAGE,
+    STAGES,
+    SessionProfile,
+    profile_session,
+)
+from rrweb_util import EventType, IncrementalSource
+from rrweb_util.helpers import get_event_key
+from rrweb_util.dom_state.dom_state_helpers import (
+    apply_mutation_data,
+    evict_subtree,
+    init_dom_state,
+)
+from rrweb_util.user_interaction.extractors import (
+    INTERACTION_EXTRACTORS,
+    extract_user_interactions,
+)
+from rrweb_util.user_interaction.models import UserInteraction
 
 
 logger = logging.getLogger(__name__)
 
+# Formats processed sessions can be saved in, see ProcessedSession.to_dict and to_compact_dict
+OUTPUT_FORMATS = ("json", "compact")
+
+# Sessions submitted to each worker process ahead of the results being consumed,
+# which bounds the memory held by results waiting to be yielded in order
+PENDING_SESSIONS_PER_WORKER = 2
+
+
+@dataclass
+class ProcessOptions:
+    """
+    Options for how process_sessions processes sessions.
+
+    Attributes:
+        workers: Number of worker processes to ingest sessions in parallel with
+        force: Whether to process sessions even if they're unchanged since they were last ingested
+        output_format: Format to save processed sessions in, one of OUTPUT_FORMATS. Both are JSON
+            read by processed_session_from_dict, "compact" interns repeated strings such as DOM
+            paths and stores interactions in columns, so it's much smaller and faster to load.
+        profile: Whether to profile ingest with cProfile and trace each session's peak memory
+            use, which slows ingest down considerably
+        memory_budget_mb: Optional budget for the memory each session may hold in MiB, estimated
+            from its DOM nodes & user interactions. Sessions which would go over it are ingested
+            in a degraded mode rather than failing, see MemoryGuard
+    """
+
+    workers: int = 1
+    force: bool = False
+    output_format: str = "json"
+    profile: bool = False
+    memory_budget_mb: Optional[float] = None
+
+
+class _IngestResult(NamedTuple):
+    """
+    A processed session with the worker process which ingested it, how long it took, the
+    profile of its stages, and its memory guard if it had a budget.
+    """
+
+    filepath: Path
+    session: Optional[ProcessedSession]
+    worker: int
+    seconds: float
+    profile: SessionProfile
+    memory_guard: Optional[MemoryGuard]
+
 
 def ingest_session(
     session_id: str,
     filepath: Path,
+    profile: Optional[SessionProfile] = None,
+    memory_guard: Optional[MemoryGuard] = None,
 ) -> dict:
     """
     Load, filter, and extract user interactions from an rrweb session.
@@ -38,6 +128,12 @@ def ingest_session(
     Args:
         session_id: Unique identifier for this session, used in session IDs
         filepath: Path to the rrweb JSON session file to process
+        profile: Optional profile to record the time spent in each stage of ingesting in
+        memory_guard: Optional memory budget for the session. If the session would go over it,
+            nodes removed from the DOM are evicted, and if that's not enough, the rest of the
+            session is dropped. Unsorted sessions too large to load whole are streamed in the
+            order they were recorded, or skipped if they can't be ingested in that order. The
+            guard records how ingest degraded.
 
     Returns:
         Dict w/ the session_id and user_interactions list.
@@ -62,98 +158,455 @@ def ingest_session(
     # Validate session_id
     if not session_id:
         raise ValueError("session_id cannot be empty")
+    profile = profile or SessionProfile()
+
+    # Stream events from the JSON file, which are normally recorded in timestamp order.
+    # If they're not, or the session is invalid, load and sort the whole session instead,
+    # so events are ingested in order and errors are raised as they would be for a sorted
+    # session, e.g. an invalid event after an IncrementalSnapshot recorded out of order.
+    # Low-signal events are dropped while parsing, so dicts aren't built for them.
+    # Each attempt is profiled separately, so only the attempt which ingested the session
+    # is added to the profile, rather than counting the events streamed before failing too.
+    try:
+        events = iter_events(
+            filepath, require_sorted=True, skip_sources=LOW_SIGNAL_SOURCES
+        )
+        attempt_profile = SessionProfile(per_event=profile.per_event)
+        session = _ingest_events(session_id, events, attempt_profile, memory_guard)
+    except ValueError as exc:
+        logger.debug(
+            "Loading all events of %s after streaming failed: %s", filepath, exc
+        )
+        attempt_profile = SessionProfile(per_event=profile.per_event)
+        session = _ingest_loaded_events(
+            session_id, filepath, attempt_profile, memory_guard
+        )
+    profile.add(attempt_profile)
+    return session
+
+
+def _ingest_loaded_events(
+    session_id: str,
+    filepath: Path,
+    profile: SessionProfile,
+    memory_guard: Optional[MemoryGuard],
+) -> Optional[ProcessedSession]:
+    """
+    Ingest all of a session's events loaded & sorted, or streamed unsorted if loading them
+    would go over the session's memory budget, skipping the session if it can't be ingested
+    unsorted.
+    """
+    events = _load_sorted_events(filepath, memory_guard)
+    try:
+        return _ingest_events(session_id, events, profile, memory_guard)
+    except ValueError as exc:
+        # Events streamed unsorted can be out of order in ways sorting would have fixed, e.g.
+        # an IncrementalSnapshot recorded before its FullSnapshot, so skip the session rather
+        # than failing the run, like the other ways ingest degrades within the budget
+        if memory_guard is None or STREAMED_UNSORTED not in memory_guard.degradations:
+            raise
+        logger.warning(
+            "Skipping %s since it can't be ingested unsorted: %s", filepath, exc
+        )
+        memory_guard.degrade(SKIPPED)
+        return None
+
+
+def _load_sorted_events(
+    filepath: Path, memory_guard: Optional[MemoryGuard]
+) -> Iterable[dict]:
+    """
+    Load and sort all of a session's events, or if that would go over the session's memory
+    budget, stream them in the order they were recorded instead.
+    """
+    if memory_guard is None:
+        return load_events(filepath, skip_sources=LOW_SIGNAL_SOURCES)
+
+    # Forget how streaming the session degraded, since it's ingested again from the start
+    memory_guard.reset()
+    if memory_guard.allows_loading(filepath):
+        return load_events(filepath, skip_sources=LOW_SIGNAL_SOURCES)
+    logger.warning(
+        "Streaming %s unsorted since loading it would go over its memory budget",
+        filepath,
+    )
+    memory_guard.degrade(STREAMED_UNSORTED)
+    return iter_events(filepath, skip_sources=LOW_SIGNAL_SOURCES)
 
-    # Load and validate events from JSON file
-    events = load_events(filepath)
 
+def _ingest_events(
+    session_id: str,
+    events: Iterable[dict],
+    profile: SessionProfile,
+    memory_guard: Optional[MemoryGuard] = None,
+) -> Optional[ProcessedSession]:
+    """
+    Extract user interactions from a session's events in timestamp order, recording the
+    time spent ingesting them & the events handled by each stage in the profile, and
+    keeping within the memory guard's budget.
+    """
     # Walk user interaction & DOM state changes to extract events we want to pass to rule matcher
     # - If user interaction, extract that event and any relevant DOM details on the elements being interacted with
     # - If DOM state change, update our concept of the DOMs current state
     # At the end, return a list UI interactions in the session
-    dom_state = None
-    user_interactions = []
-    for event in events:
-        event_type = event["type"]
-
-        if event_type == EventType.FULL_SNAPSHOT:
-            # FullSnapshot event - initialize DOM state
-            dom_state = init_dom_state(event)
-
-        elif event_type == EventType.INCREMENTAL_SNAPSHOT:
-            # IncrementalSnapshot event
-            # - apply mutations to DOM state
-            # - extract user interactions
-            if dom_state is None:
-                raise ValueError(
-                    "IncrementalSnapshot event encountered before FullSnapshot"
-                )
-
-            if is_dom_mutation_event(event):
-                apply_mutation(dom_state, event)
-            elif not is_low_signal(event):
-                user_interactions.extend(extract_user_interactions(dom_state, event))
+    state = _SessionState(memory_guard=memory_guard)
+    start = time.perf_counter()
+    if profile.per_event:
+        _handle_events_timed(state, events, profile)
+    else:
+        _handle_events(state, events, profile)
+    profile.record(INGEST_STAGE, time.perf_counter() - start, profile.events["parse"])
 
     # Skip empty sessions after cleaning
-    if not user_interactions:
+    if not state.user_interactions:
         return None
 
     return ProcessedSession(
         session_id=session_id,
-        user_interactions=user_interactions,
+        user_interactions=state.user_interactions,
         # TODO include the environment from the session metadata
         # "environment": session['metadata']['environment']
     )
 
 
+@dataclass
+class _SessionState:
+    """
+    The DOM state & user interactions of a session as its events are ingested.
+
+    With a memory guard, the nodes removed from the DOM are tracked so they can be evicted
+    from the DOM state if the session goes over its budget, and once it has, they're evicted
+    as they're removed.
+    """
+
+    dom_state: Optional[dict] = None
+    user_interactions: List[UserInteraction] = field(default_factory=list)
+    memory_guard: Optional[MemoryGuard] = None
+    removed_ids: Set[int] = field(default_factory=set)
+    evicting: bool = False
+
+    def require_dom_state(self) -> dict:
+        """
+        The DOM state, which IncrementalSnapshot events need a FullSnapshot to initialize.
+        """
+        if self.dom_state is None:
+            raise ValueError(
+                "IncrementalSnapshot event encountered before FullSnapshot"
+            )
+        return self.dom_state
+
+    def track_removes(self, data: dict) -> None:
+        """
+        Track the nodes removed by a mutation, or evict them once evicting. Removals are
+        handled before additions, as rrweb replays them, so moved nodes aren't evicted.
+        """
+        removed_ids = [remove.get("id") for remove in data.get("removes", [])]
+        if self.evicting:
+            for node_id in removed_ids:
+                evict_subtree(self.dom_state, node_id)
+        else:
+            self.removed_ids.update(removed_ids)
+            self.removed_ids.difference_update(
+                add.get("node", {}).get("id") for add in data.get("adds", [])
+            )
+
+    def is_target_evicted(self, event: dict) -> bool:
+        """
+        Whether the target of an interaction was evicted from the DOM state.
+        """
+        target_id = event["data"].get("id")
+        return (
+            self.evicting and target_id is not None and target_id not in self.dom_state
+        )
+
+    def enforce_budget(self) -> bool:
+        """
+        Keep the session within its memory budget, by evicting the nodes removed from the DOM
+        or else dropping the rest of the session.
+
+        Returns:
+            Whether the rest of the session can be ingested
+        """
+        if self._within_budget():
+            return True
+        if not self.evicting:
+            logger.debug("Evicting removed nodes to stay within memory budget")
+            self.memory_guard.degrade(EVICTED_REMOVED_NODES)
+            self.evicting = True
+            for node_id in self.removed_ids:
+                evict_subtree(self.dom_state, node_id)
+            self.removed_ids.clear()
+            if self._within_budget():
+                return True
+        logger.debug("Dropping the rest of the session to stay within memory budget")
+        self.memory_guard.degrade(TRUNCATED)
+        return False
+
+    def _within_budget(self) -> bool:
+        return self.memory_guard.allows(
+            len(self.dom_state or ()), len(self.user_interactions)
+        )
+
+
+_EventHandler = Callable[[_SessionState, dict], None]
+
+
+def _handle_events(
+    state: _SessionState, events: Iterable[dict], profile: SessionProfile
+) -> None:
+    """
+    Handle each event, only counting the events handled by each stage, which is cheap
+    enough for every event.
+    """
+    stage_events = defaultdict(int)
+    for event in events:
+        key = get_event_key(event)
+        stage, handle = _EVENT_HANDLERS.get(key) or _DEFAULT_EVENT_HANDLERS.get(
+            key[0], _FILTERED
+        )
+        handle(state, event)
+        stage_events[stage] += 1
+        if state.memory_guard is not None and not state.enforce_budget():
+            break
+
+    profile.events["parse"] += sum(stage_events.values())
+    for stage, count in stage_events.items():
+        profile.events[stage] += count
+
+
+def _handle_events_timed(
+    state: _SessionState, events: Iterable[dict], profile: SessionProfile
+) -> None:
+    """
+    Handle each event, timing parsing it and the stage which handled it.
+    """
+    for event in profile.time_events("parse", events):
+        start = time.perf_counter()
+        key = get_event_key(event)
+        stage, handle = _EVENT_HANDLERS.get(key) or _DEFAULT_EVENT_HANDLERS.get(
+            key[0], _FILTERED
+        )
+        handle(state, event)
+        profile.record(stage, time.perf_counter() - start)
+        if state.memory_guard is not None and not state.enforce_budget():
+            break
+
+
+def _init_dom_state(state: _SessionState, event: dict) -> None:
+    state.dom_state = init_dom_state(event)
+    state.removed_ids.clear()
+
+
+def _apply_mutation(state: _SessionState, event: dict) -> None:
+    dom_state = state.require_dom_state()
+    if state.memory_guard is not None:
+        state.track_removes(event["data"])
+    apply_mutation_data(dom_state, event["data"])
+
+
+def _interaction_handler(
+    extractor: Callable[[dict, dict], List[UserInteraction]],
+) -> _EventHandler:
+    def extract(state: _SessionState, event: dict) -> None:
+        dom_state = state.require_dom_state()
+        if state.is_target_evicted(event):
+            state.memory_guard.interactions_dropped += 1
+            return
+        state.user_interactions.extend(extractor(dom_state, event))
+
+    return extract
+
+
+def _filter_incremental(state: _SessionState, _event: dict) -> None:
+    state.require_dom_state()
+
+
+def _filter(_state: _SessionState, _event: dict) -> None:
+    pass
+
+
+# Events which aren't needed are counted as filtered
+_FILTERED = ("filter", _filter)
+
+# Handler of each kind of event keyed by its (type, source) from get_event_key, with the
+# stage it's profiled as, so each event is classified once by a single lookup
+_EVENT_HANDLERS: Dict[Tuple[int, Optional[int]], Tuple[str, _EventHandler]] = {
+    (EventType.FULL_SNAPSHOT, None): ("init_dom_state", _init_dom_state),
+    (EventType.INCREMENTAL_SNAPSHOT, IncrementalSource.MUTATION): (
+        "apply_mutation",
+        _apply_mutation,
+    ),
+    **{
+        (EventType.INCREMENTAL_SNAPSHOT, source): ("filter", _filter_incremental)
+        for source in LOW_SIGNAL_SOURCES
+    },
+    **{
+        (EventType.INCREMENTAL_SNAPSHOT, source): (
+            "extract_user_interactions",
+            _interaction_handler(extractor),
+        )
+        for source, extractor in INTERACTION_EXTRACTORS.items()
+    },
+}
+
+# Handlers of events of each type whose source isn't in _EVENT_HANDLERS. Other types of
+# events are filtered, while extract_user_interactions raises for unknown sources.
+_DEFAULT_EVENT_HANDLERS: Dict[int, Tuple[str, _EventHandler]] = {
+    EventType.INCREMENTAL_SNAPSHOT: (
+        "extract_user_interactions",
+        _interaction_handler(extract_user_interactions),
+    ),
+}
+
+
 def iterate_sessions(
-    session_dir: Path, max_sessions: int = None
+    session_dir: Path, max_sessions: int = None, workers: int = 1
 ) -> Generator[List[Optional[dict]], None, None]:
     """
     Generator function to iterate through all rrweb session files in a directory and ingest them.
 
     This function scans the specified directory for rrweb JSON files, ingests
     each session using the ingest_session function, and yields user interactions processed from sessions.
+    Sessions are yielded in the order of their filenames, even when ingested in parallel.
 
     Args:
         session_dir: Directory containing rrweb session JSON files
         max_sessions: Optional limit on number of sessions to process
+        workers: Number of worker processes to ingest sessions in parallel with
 
     Returns:
         Generator yielding processed sessions.
     """
-    sessions_handled = 0
-    session_files = sorted([f for f in session_dir.iterdir() if f.suffix == ".json"])
+    session_files = _list_session_files(session_dir)
+    if max_sessions is not None:
+        session_files = session_files[:max_sessions]
 
-    for filepath in session_files:
-        if max_sessions is not None and sessions_handled >= max_sessions:
-            break
+    for result in _iterate_ingest_results(session_files, workers):
+        yield result.session
 
-        try:
-            yield ingest_session(filepath.stem, filepath)
-            sessions_handled += 1
-        except Exception as e:
-            logger.error("Error processing %s: %s", filepath, e)
-            raise
+
+def _list_session_files(session_dir: Path) -> List[Path]:
+    return sorted([f for f in session_dir.iterdir() if f.suffix == ".json"])
+
+
+def _iterate_ingest_results(
+    session_files: List[Path],
+    workers: int,
+    profile_dir: Optional[Path] = None,
+    memory_budget: Optional[int] = None,
+) -> Iterator[_IngestResult]:
+    """
+    Ingest session files, yielding the results in the same order as the files. If a profile
+    directory is given, each session's cProfile stats are saved in it, and if a memory budget
+    in bytes is given, each session is kept within it.
+    """
+    ingest_file = partial(
+        _ingest_file, profile_dir=profile_dir, memory_budget=memory_budget
+    )
+    if workers > 1:
+        pending_results = _submit_to_pool(ingest_file, session_files, workers)
+    else:
+        pending_results = (
+            (filepath, partial(ingest_file, filepath)) for filepath in session_files
+        )
+
+    with closing(pending_results):
+        for filepath, get_result in pending_results:
+            try:
+                yield get_result()
+            except Exception as e:
+                logger.error("Error processing %s: %s", filepath, e)
+                raise
+
+
+def _submit_to_pool(
+    ingest_file: Callable[[Path], _IngestResult],
+    session_files: List[Path],
+    workers: int,
+) -> Iterator[Tuple[Path, Callable[[], _IngestResult]]]:
+    """
+    Submit session files to a pool of worker processes, yielding a function to wait for
+    each one's result in order. Only a few sessions per worker are submitted ahead of
+    the results being waited for, and sessions not yet ingested are cancelled on close.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for filepath in session_files:
+            pending.append((filepath, executor.submit(ingest_file, filepath)))
+            if len(pending) >= workers * PENDING_SESSIONS_PER_WORKER:
+                filepath, future = pending.popleft()
+                yield filepath, future.result
+        while pending:
+            filepath, future = pending.popleft()
+            yield filepath, future.result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _ingest_file(
+    filepath: Path, profile_dir: Optional[Path], memory_budget: Optional[int]
+) -> _IngestResult:
+    """
+    Ingest a session file, timing and profiling it, and keeping it within the memory budget
+    if one is given. Runs in a worker process when ingesting in parallel.
+    """
+    profile = SessionProfile(per_event=profile_dir is not None)
+    profile_path = profile_dir / f"{filepath.stem}.pstats" if profile_dir else None
+    memory_guard = MemoryGuard(memory_budget) if memory_budget is not None else None
+    start = time.perf_counter()
+    with profile_session(profile, profile_path):
+        session = ingest_session(filepath.stem, filepath, profile, memory_guard)
+    return _IngestResult(
+        filepath,
+        session,
+        os.getpid(),
+        time.perf_counter() - start,
+        profile,
+        memory_guard,
+    )
 
 
 def process_sessions(
-    session_dir: Path, output_dir: Path, max_sessions: int = None
+    session_dir: Path,
+    output_dir: Path,
+    max_sessions: int = None,
+    options: Optional[ProcessOptions] = None,
 ) -> dict:
     """
     Process rrweb sessions from a directory and save extracted user interactions to output directory.
 
     This function iterates through rrweb session files, processes them to extract user interactions,
-    and saves the results to the specified output directory.
+    and saves the results to the specified output directory. With more than one worker, sessions are
+    ingested in parallel by a pool of worker processes, and saved in the same order with the same
+    statistics as when ingested one after another.
+
+    Sessions ingested into the output directory are recorded in its manifest, and sessions which are
+    unchanged since they were last ingested with the same FEATURE_EXTRACTION_VERSION and output
+    format are skipped unless forced. Sessions degraded to stay within the memory budget aren't
+    recorded, so they're ingested again.
 
     Args:
         session_dir: Directory containing rrweb session JSON files
         output_dir: Directory where processed session data will be saved
-        max_sessions: Optional limit on number of sessions to process
+        max_sessions: Optional limit on number of sessions to process, not counting skipped sessions
+        options: Options for how sessions are processed, see ProcessOptions
     Returns:
         Dictionary containing processing statistics:
         - sessions_processed: Number of session files processed
+        - sessions_skipped: Number of session files skipped as unchanged since they were last ingested
         - sessions_saved: Number of session files successfully saved to output
         - total_features: Aggregate counts of each feature type
+        - workers: Sessions ingested by each worker process and the seconds spent ingesting them,
+          keyed by process ID
+        - stages: Seconds spent in each stage of ingest and the events handled by it, or the
+          sessions for the write stage. Only the ingest & write stages are timed unless
+          profiling, the seconds of the others are None
+        - peak_memory: Peak memory allocated ingesting each session in bytes, when profiling
+        - degraded_sessions: How ingest degraded to keep each session which would have gone
+          over the memory budget within it, with the largest estimate of the memory it held in
+          bytes and the interactions dropped, keyed by session
+        - profile_path: Path the run's cProfile stats were saved to, when profiling
         - errors: List of any errors encountered during processing
     """
     # Create output directory if it doesn't exist
@@ -162,32 +615,139 @@ def process_sessions(
     # Initialize statistics tracking
     stats = {
         "sessions_processed": 0,
+        "sessions_skipped": 0,
         "sessions_saved": 0,
         "total_interactions": defaultdict(int),
+        "workers": defaultdict(lambda: {"sessions": 0, "seconds": 0.0}),
+        "stages": {},
+        "peak_memory": {},
+        "degraded_sessions": {},
     }
 
-    session_generator = iterate_sessions(session_dir, max_sessions)
-    for session in session_generator:
-        stats["sessions_processed"] += 1
-        if session is None:
-            logger.debug("Session yielded no user interactions and was skipped")
-            continue
-
-        # Update stats
-        for interaction in session.user_interactions:
-            stats["total_interactions"][interaction.action] += 1
-
-        # Convert dataclass to dict for logging and saving
-        session_dict = session.to_dict()
-        logger.debug("Processed session: %s", session.session_id)
-        logger.debug("Extracted %d user interactions", len(session.user_interactions))
-        logger.debug(pformat(session_dict["user_interactions"]))
-
-        # Save the session data to output_dir as JSON file
-        output_file_path = output_dir / f"{session.session_id}.json"
-        logger.debug("Saving processed session to %s", output_file_path)
-        with open(output_file_path, "w", encoding="utf-8") as f:
-            json.dump(session_dict, f, indent=2, ensure_ascii=False)
-        stats["sessions_saved"] += 1
+    options = options or ProcessOptions()
+    if options.output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {options.output_format}")
+
+    manifest = (
+        IngestManifest(output_dir, options.output_format)
+        if options.force
+        else IngestManifest.load(output_dir, options.output_format)
+    )
+    all_session_files = _list_session_files(session_dir)
+    session_files = [f for f in all_session_files if not manifest.is_unchanged(f)]
+    stats["sessions_skipped"] = len(all_session_files) - len(session_files)
+    if max_sessions is not None:
+        session_files = session_files[:max_sessions]
+
+    profile = SessionProfile()
+    profile_dir = Path(tempfile.mkdtemp()) if options.profile else None
+    memory_budget = (
+        int(options.memory_budget_mb * 1024 * 1024)
+        if options.memory_budget_mb is not None
+        else None
+    )
+    # Save the manifest even if a session fails, so the sessions already saved are skipped next time
+    try:
+        for result in _iterate_ingest_results(
+            session_files, options.workers, profile_dir, memory_budget
+        ):
+            with result.profile.stage("write"):
+                output_name = _save_session(
+                    result.session, output_dir, options.output_format, stats
+                )
+            # Degraded sessions aren't recorded, so they're ingested again in full next time
+            if not _is_degraded(result):
+                manifest.record(result.filepath, output_name)
+            _record_result_stats(result, stats)
+            profile.add(result.profile)
+    finally:
+        manifest.save()
+        stats["stages"] = {
+            stage: {
+                "seconds": profile.seconds.get(stage),
+                "events": profile.events[stage],
+            }
+            for stage in STAGES
+            if stage in profile.events
+        }
+        if profile_dir is not None:
+            stats["profile_path"] = _merge_profiles(profile_dir, output_dir)
 
     return stats
+
+
+def _record_result_stats(result: _IngestResult, stats: dict) -> None:
+    stats["sessions_processed"] += 1
+    stats["workers"][result.worker]["sessions"] += 1
+    stats["workers"][result.worker]["seconds"] += result.seconds
+    if result.profile.peak_memory is not None:
+        stats["peak_memory"][result.filepath.stem] = result.profile.peak_memory
+    if _is_degraded(result):
+        stats["degraded_sessions"][result.filepath.stem] = {
+            "degradations": result.memory_guard.degradations,
+            "peak_estimate": result.memory_guard.peak_estimate,
+            "interactions_dropped": result.memory_guard.interactions_dropped,
+        }
+
+
+def _is_degraded(result: _IngestResult) -> bool:
+    return result.memory_guard is not None and bool(result.memory_guard.degradations)
+
+
+def _merge_profiles(profile_dir: Path, output_dir: Path) -> Optional[Path]:
+    """
+    Merge the cProfile stats of each session into one file for the run in the output directory,
+    and remove the directory of session stats.
+
+    Returns:
+        Path the run's stats were saved to, or None if no sessions were profiled
+    """
+    try:
+        session_profiles = sorted(profile_dir.glob("*.pstats"))
+        if not session_profiles:
+            return None
+        profile_path = output_dir / time.strftime("ingest-%Y%m%d-%H%M%S.pstats")
+        pstats.Stats(*map(str, session_profiles)).dump_stats(profile_path)
+        return profile_path
+    finally:
+        shutil.rmtree(profile_dir)
+
+
+def _save_session(
+    session: Optional[ProcessedSession],
+    output_dir: Path,
+    output_format: str,
+    stats: dict,
+) -> Optional[str]:
+    """
+    Save a processed session to the output directory and count it in the stats.
+
+    Returns:
+        The filename the session was saved to, or None if it had no user interactions
+    """
+    if session is None:
+        logger.debug("Session yielded no user interactions and was skipped")
+        return None
+
+    # Update stats
+    for interaction in session.user_interactions:
+        stats["total_interactions"][interaction.action] += 1
+
+    logger.debug("Processed session: %s", session.session_id)
+    logger.debug("Extracted %d user interactions", len(session.user_interactions))
+    # Formatting every interaction is slow, so only do it when it'll be logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", pformat([ui.to_dict() for ui in session.user_interactions]))
+
+    # Save the session data to output_dir as JSON file
+    output_file_path = output_dir / f"{session.session_id}.json"
+    logger.debug("Saving processed session to %s", output_file_path)
+    with open(output_file_path, "w", encoding="utf-8") as f:
+        if output_format == "compact":
+            json.dump(
+                session.to_compact_dict(), f, separators=(",", ":"), ensure_ascii=False
+            )
+        else:
+            json.dump(session.to_dict(), f, indent=2, ensure_ascii=False)
+    stats["sessions_saved"] += 1
+    return output_file_path.name
@@ -0,0 +1,121 @@
+"""
+Profiling of the stages of ingesting rrweb sessions.
+
+SessionProfile records the wall time spent ingesting and writing each session and the
+number of events handled by each stage, cheaply enough to always be recorded. Timing each
+event's stages, profiling with cProfile and tracing peak memory use with tracemalloc slow
+ingest down, so they're only done when profiling, with a per_event profile and
+profile_session.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import cProfile
+from dataclasses import dataclass, field
+from pathlib import Path
+import time
+import tracemalloc
+from typing import Dict, Iterable, Iterator, Optional
+
+# Stages of ingesting a session, in the order they're reported. The ingest stage is the
+# whole of handling a session's events, which the stages from parse to filter break down.
+INGEST_STAGE = "ingest"
+STAGES = (
+    INGEST_STAGE,
+    "parse",
+    "init_dom_state",
+    "apply_mutation",
+    "extract_user_interactions",
+    "filter",
+    "write",
+)
+
+
+@dataclass
+class SessionProfile:
+    """
+    Time spent in each stage of ingesting sessions and the events handled by each stage.
+
+    Attributes:
+        seconds: Wall time spent in each stage which was timed
+        events: Number of events handled by each stage
+        peak_memory: Peak memory allocated while ingesting the session in bytes, if traced
+        per_event: Whether the time spent in each stage is recorded by timing each event,
+            rather than only timing the ingest & write stages of each session
+    """
+
+    seconds: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    events: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    peak_memory: Optional[int] = None
+    per_event: bool = False
+
+    def record(self, stage: str, seconds: float, events: int = 1) -> None:
+        """
+        Record time spent handling events in a stage.
+        """
+        self.seconds[stage] += seconds
+        self.events[stage] += events
+
+    @contextmanager
+    def stage(self, stage: str, events: int = 1) -> Iterator[None]:
+        """
+        Record the time spent in a block as a stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, events)
+
+    def time_events(self, stage: str, events: Iterable[dict]) -> Iterator[dict]:
+        """
+        Record the time spent producing each event of an iterable as a stage, e.g. parsing
+        events streamed from a file.
+        """
+        iterator = iter(events)
+        while True:
+            start = time.perf_counter()
+            try:
+                event = next(iterator)
+            except StopIteration:
+                self.seconds[stage] += time.perf_counter() - start
+                return
+            self.record(stage, time.perf_counter() - start)
+            yield event
+
+    def add(self, other: "SessionProfile") -> None:
+        """
+        Add the stages of another profile to this one.
+        """
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] += seconds
+        for stage, events in other.events.items():
+            self.events[stage] += events
+
+
+@contextmanager
+def profile_session(
+    profile: SessionProfile, profile_path: Optional[Path]
+) -> Iterator[None]:
+    """
+    Profile ingesting a session with cProfile and trace its peak memory use, if a path
+    to save the cProfile stats to is given.
+
+    Args:
+        profile: Profile to record the session's peak memory use in
+        profile_path: Path to save the session's cProfile stats to, or None to not profile
+    """
+    if profile_path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        profiler.dump_stats(profile_path)
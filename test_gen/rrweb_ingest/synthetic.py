@@ -0,0 +1,403 @@
+"""
+Synthetic rrweb session generator.
+
+Generates deterministic rrweb event streams of any length, with a tunable DOM size and depth,
+rate of DOM mutations and user interactions, and ratio of low-signal noise events, so ingest
+can be tested and benchmarked on sessions far larger than the recorded test sessions.
+"""
+
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import random
+from typing import Dict, Iterator, List
+
+from rrweb_util import EventType, IncrementalSource, MouseInteractionType
+
+# Bump when changes to the generator change the sessions generated from the same config
+GENERATOR_VERSION = 1
+
+# Start time of generated sessions, in ms since the epoch
+START_TIMESTAMP = 1640995200000
+
+_TAGS = ("div", "div", "div", "span", "p", "ul", "li", "section", "label")
+_LEAF_TAGS = ("button", "a", "input")
+_CLASSES = ("container", "row", "card", "item", "header", "content", "active", "hidden")
+_WORDS = (
+    "save",
+    "cancel",
+    "next",
+    "back",
+    "todo",
+    "list",
+    "item",
+    "done",
+    "edit",
+    "new",
+)
+
+# rrweb serialized node types, which differ from the DOM's NodeType
+_DOCUMENT_NODE = 0
+_ELEMENT_NODE = 2
+_TEXT_NODE = 3
+
+
+@dataclass
+class SyntheticSessionConfig:
+    """
+    Shape of a generated rrweb session.
+
+    Attributes:
+        dom_size: Number of nodes in the FullSnapshot
+        dom_depth: Maximum depth of the DOM, including nodes added by mutations
+        mutations_per_second: Average rate of DOM mutation events
+        interactions_per_second: Average rate of clicks & inputs
+        noise_ratio: Fraction of events which are low-signal mousemove & scroll events
+        seed: Seed for the random choices, so sessions are reproducible
+    """
+
+    dom_size: int = 500
+    dom_depth: int = 12
+    mutations_per_second: float = 5.0
+    interactions_per_second: float = 0.5
+    noise_ratio: float = 0.6
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.dom_size < 4:
+            raise ValueError("dom_size must be at least 4")
+        if self.dom_depth < 4:
+            raise ValueError("dom_depth must be at least 4")
+        if self.mutations_per_second < 0 or self.interactions_per_second < 0:
+            raise ValueError("Event rates cannot be negative")
+        if self.mutations_per_second + self.interactions_per_second <= 0:
+            raise ValueError("Mutation or interaction rate must be positive")
+        if not 0 <= self.noise_ratio < 1:
+            raise ValueError("noise_ratio must be at least 0 and less than 1")
+
+
+class _NodePool:
+    """
+    Node IDs which can be chosen at random and removed in constant time.
+    """
+
+    def __init__(self):
+        self._ids = []
+        self._index = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, node_id: int) -> None:
+        """
+        Add a node ID to the pool.
+        """
+        self._index[node_id] = len(self._ids)
+        self._ids.append(node_id)
+
+    def discard(self, node_id: int) -> None:
+        """
+        Remove a node ID from the pool if it's in it.
+        """
+        index = self._index.pop(node_id, None)
+        if index is None:
+            return
+        last_id = self._ids.pop()
+        if last_id != node_id:
+            self._ids[index] = last_id
+            self._index[last_id] = index
+
+    def choice(self, rng: random.Random) -> int:
+        """
+        Choose a node ID at random.
+        """
+        return self._ids[rng.randrange(len(self._ids))]
+
+
+class _SyntheticDOM:
+    """
+    The attached nodes of a generated DOM which events can target, and the subtrees added
+    by mutations which can be removed.
+    """
+
+    def __init__(self, rng: random.Random, max_depth: int):
+        self.rng = rng
+        self.max_depth = max_depth
+        self.next_id = 1
+        # Attached nodes events can target by their kind, where containers are elements
+        # which can have children added
+        self.pools = {
+            kind: _NodePool()
+            for kind in ("element", "container", "clickable", "input", "text")
+        }
+        self.depths = {}
+        # (parent ID, node IDs) of subtrees added by mutations
+        self.added_subtrees = []
+
+    def new_id(self) -> int:
+        """
+        Allocate the next node ID.
+        """
+        node_id = self.next_id
+        self.next_id += 1
+        return node_id
+
+    def element(self, tag: str, depth: int, attributes: Dict[str, str]) -> dict:
+        """
+        Create an element node, adding it to the pools of nodes events can target.
+        """
+        node_id = self.new_id()
+        self.pools["element"].add(node_id)
+        if tag == "input":
+            self.pools["input"].add(node_id)
+        elif tag in _LEAF_TAGS:
+            self.pools["clickable"].add(node_id)
+        # Leave room for a text child
+        elif depth < self.max_depth - 1:
+            self.pools["container"].add(node_id)
+            self.depths[node_id] = depth
+        return {
+            "type": _ELEMENT_NODE,
+            "tagName": tag,
+            "attributes": attributes,
+            "childNodes": [],
+            "id": node_id,
+        }
+
+    def text(self) -> dict:
+        """
+        Create a text node, adding it to the pool of nodes text mutations can target.
+        """
+        node_id = self.new_id()
+        self.pools["text"].add(node_id)
+        return {"type": _TEXT_NODE, "textContent": self.words(), "id": node_id}
+
+    def random_element(self, parent_depth: int) -> dict:
+        """
+        Create a random element, with a text child if it's a button or link.
+        """
+        rng = self.rng
+        attributes = {"class": rng.choice(_CLASSES)}
+        if rng.random() < 0.2:
+            tag = rng.choice(_LEAF_TAGS)
+            attributes["data-testid"] = f"{tag}-{self.next_id}"
+            if rng.random() < 0.5:
+                attributes["aria-label"] = self.words()
+        else:
+            tag = rng.choice(_TAGS)
+        node = self.element(tag, parent_depth + 1, attributes)
+        if tag in ("button", "a"):
+            node["childNodes"].append(self.text())
+        return node
+
+    def detach(self, node_ids: List[int]) -> None:
+        """
+        Remove detached nodes from the pools, so events don't target them.
+        """
+        for node_id in node_ids:
+            for pool in self.pools.values():
+                pool.discard(node_id)
+            self.depths.pop(node_id, None)
+
+    def words(self) -> str:
+        """
+        Generate a few words of text.
+        """
+        return " ".join(self.rng.choices(_WORDS, k=self.rng.randint(1, 4)))
+
+
+def iter_synthetic_events(config: SyntheticSessionConfig) -> Iterator[dict]:
+    """
+    Generate an endless stream of rrweb events in timestamp order.
+
+    The stream starts with a Meta event and a FullSnapshot of a random DOM, followed by
+    IncrementalSnapshot events arriving at random. Mutations add & remove subtrees and
+    change attributes & text, interactions click buttons & links and type in inputs, and
+    noise is mousemove & scroll events. The same config always generates the same events.
+
+    Args:
+        config: Shape of the session to generate
+
+    Yields:
+        rrweb event dictionaries
+    """
+    rng = random.Random(config.seed)
+    dom = _SyntheticDOM(rng, config.dom_depth)
+    timestamp = START_TIMESTAMP
+    yield {
+        "type": EventType.META,
+        "data": {"href": "https://example.com/synthetic", "width": 1280, "height": 720},
+        "timestamp": timestamp,
+    }
+    yield {
+        "type": EventType.FULL_SNAPSHOT,
+        "data": {"node": _full_snapshot(dom, config.dom_size)},
+        "timestamp": timestamp,
+    }
+
+    signal_rate = config.mutations_per_second + config.interactions_per_second
+    noise_rate = signal_rate * config.noise_ratio / (1 - config.noise_ratio)
+    rates = [config.mutations_per_second, config.interactions_per_second, noise_rate]
+    generators = [_mutation_data, _interaction_data, _noise_data]
+    total_rate = signal_rate + noise_rate
+    while True:
+        timestamp += max(1, round(rng.expovariate(total_rate) * 1000))
+        generate = rng.choices(generators, weights=rates)[0]
+        yield {
+            "type": EventType.INCREMENTAL_SNAPSHOT,
+            "data": generate(dom),
+            "timestamp": timestamp,
+        }
+
+
+def write_synthetic_session(
+    filepath: Path, size_bytes: int, config: SyntheticSessionConfig
+) -> int:
+    """
+    Write a generated rrweb session file of about size_bytes, in the format session
+    stitching produces.
+
+    Events are written as they're generated, so memory use doesn't grow with the size of
+    the session. The file ends after the first event which takes it past size_bytes.
+
+    Args:
+        filepath: Path to write the session JSON file to
+        size_bytes: Size to generate the session file up to, in bytes
+        config: Shape of the session to generate
+
+    Returns:
+        Number of events written
+    """
+    event_count = 0
+    with open(filepath, "w", encoding="utf-8") as f:
+        written = f.write(f'{{"session_guid":"synthetic-{config.seed}","rrweb_data":[')
+        for event in iter_synthetic_events(config):
+            separator = "," if event_count else ""
+            written += f.write(separator + json.dumps(event, separators=(",", ":")))
+            event_count += 1
+            if written >= size_bytes:
+                break
+        f.write('],"metadata":{"environment":"synthetic"}}')
+    return event_count
+
+
+def _full_snapshot(dom: _SyntheticDOM, dom_size: int) -> dict:
+    """
+    Generate the document node of a random DOM with dom_size nodes.
+    """
+    document = {"type": _DOCUMENT_NODE, "childNodes": [], "id": dom.new_id()}
+    html = dom.element("html", 1, {})
+    head = dom.element("head", 2, {})
+    body = dom.element("body", 2, {})
+    html["childNodes"] = [head, body]
+    document["childNodes"].append(html)
+    # Only the body and its descendants can have children added
+    dom.pools["container"].discard(html["id"])
+    dom.pools["container"].discard(head["id"])
+
+    nodes = {body["id"]: body}
+    parent_id = body["id"]
+    while dom.next_id <= dom_size:
+        # Often add to the previous container, so the DOM grows deep as well as wide
+        if parent_id not in dom.depths or dom.rng.random() < 0.5:
+            parent_id = dom.pools["container"].choice(dom.rng)
+        node = dom.random_element(dom.depths[parent_id])
+        nodes[node["id"]] = node
+        nodes[parent_id]["childNodes"].append(node)
+        if node["id"] in dom.depths:
+            parent_id = node["id"]
+    return document
+
+
+def _mutation_data(dom: _SyntheticDOM) -> dict:
+    """
+    Generate the data of a mutation which adds, removes, or changes nodes.
+    """
+    rng = dom.rng
+    data = {
+        "source": IncrementalSource.MUTATION,
+        "texts": [],
+        "attributes": [],
+        "removes": [],
+        "adds": [],
+    }
+    kind = rng.random()
+    if kind < 0.3 and dom.added_subtrees:
+        # Remove a subtree added earlier, so the attached DOM stays about the same size
+        subtrees = dom.added_subtrees
+        index = rng.randrange(len(subtrees))
+        subtrees[index], subtrees[-1] = subtrees[-1], subtrees[index]
+        parent_id, node_ids = subtrees.pop()
+        data["removes"].append({"parentId": parent_id, "id": node_ids[0]})
+        dom.detach(node_ids)
+    elif kind < 0.6:
+        # Adds are separate records, parents before their children
+        parent_id = dom.pools["container"].choice(rng)
+        node = dom.random_element(dom.depths[parent_id])
+        # Only add to the FullSnapshot's elements, so removing a subtree detaches all of it
+        dom.pools["container"].discard(node["id"])
+        dom.depths.pop(node["id"], None)
+        children = node.pop("childNodes")
+        data["adds"].append({"parentId": parent_id, "nextId": None, "node": node})
+        for child in children:
+            data["adds"].append({"parentId": node["id"], "nextId": None, "node": child})
+        dom.added_subtrees.append(
+            (parent_id, [node["id"]] + [child["id"] for child in children])
+        )
+    elif kind < 0.8 or not dom.pools["text"]:
+        data["attributes"].append(
+            {
+                "id": dom.pools["element"].choice(rng),
+                "attributes": {"class": rng.choice(_CLASSES)},
+            }
+        )
+    else:
+        data["texts"].append(
+            {"id": dom.pools["text"].choice(rng), "value": dom.words()}
+        )
+    return data
+
+
+def _interaction_data(dom: _SyntheticDOM) -> dict:
+    """
+    Generate the data of a click on a button or link, or of typing in an input.
+    """
+    rng = dom.rng
+    if dom.pools["input"] and (not dom.pools["clickable"] or rng.random() < 0.3):
+        return {
+            "source": IncrementalSource.INPUT,
+            "text": dom.words(),
+            "isChecked": False,
+            "id": dom.pools["input"].choice(rng),
+        }
+    return {
+        "source": IncrementalSource.MOUSE_INTERACTION,
+        "type": MouseInteractionType.CLICK,
+        "id": (dom.pools["clickable"] or dom.pools["element"]).choice(rng),
+        "x": rng.randrange(1280),
+        "y": rng.randrange(720),
+    }
+
+
+def _noise_data(dom: _SyntheticDOM) -> dict:
+    """
+    Generate the data of a batch of mouse movements or of a scroll.
+    """
+    rng = dom.rng
+    if rng.random() < 0.2:
+        return {
+            "source": IncrementalSource.SCROLL,
+            "id": 1,
+            "x": 0,
+            "y": rng.randrange(5000),
+        }
+    positions = [
+        {
+            "x": rng.randrange(1280),
+            "y": rng.randrange(720),
+            "id": dom.pools["element"].choice(rng),
+            "timeOffset": -50 * i,
+        }
+        for i in range(rng.randint(1, 10))
+    ]
+    return {"source": IncrementalSource.MOUSE_MOVE, "positions": positions}
@@ -0,0 +1,140 @@
+"""
+Unit tests for the benchmark module.
+
+Tests the benchmarks run on the test sessions and that the sorts and event classifiers
+compared give the same results.
+"""
+
+import json
+import random
+import sys
+
+from rrweb_ingest import benchmark
+from rrweb_ingest.benchmark import (
+    DEFAULT_SESSION_DIR,
+    _classify_with_dispatch_table,
+    _classify_with_predicates,
+    _merge_runs,
+    _stitch,
+    benchmark_event_dispatch,
+    benchmark_ingest,
+    benchmark_sort_events,
+    load_session_events,
+    record_ingest_results,
+)
+from rrweb_ingest.loader import sort_events
+from rrweb_ingest.synthetic import SyntheticSessionConfig
+
+
+class TestBenchmarkSortEvents:
+    """Test cases for the sort_events benchmark."""
+
+    def test_benchmark_sort_events(self):
+        """Test that each sort is timed for each ordering of the events."""
+        sessions = load_session_events(DEFAULT_SESSION_DIR)[:1]
+
+        results = benchmark_sort_events(sessions, repeat=1)
+
+        assert set(results) == {"sorted", "stitched", "shuffled"}
+        for timings in results.values():
+            assert set(timings) == {"sort_events", "key_function", "merge_runs"}
+            assert all(seconds > 0 for seconds in timings.values())
+
+    def test_stitched_events_sort_the_same(self):
+        """Test that stitched events are out of order and sorted the same by each sort."""
+        events = [{"timestamp": i} for i in range(100)]
+
+        stitched = _stitch(events, random.Random(0))
+
+        assert stitched != events
+        assert sort_events(stitched) == events
+        assert _merge_runs(stitched) == events
+
+
+class TestBenchmarkEventDispatch:
+    """Test cases for the event dispatch benchmark."""
+
+    def test_benchmark_event_dispatch(self):
+        """Test that the events per second of each classifier are measured."""
+        sessions = load_session_events(DEFAULT_SESSION_DIR)[:1]
+
+        results = benchmark_event_dispatch(sessions, repeat=1)
+
+        assert set(results) == {"predicates", "dispatch_table"}
+        assert all(events_per_second > 0 for events_per_second in results.values())
+
+    def test_classifiers_agree(self):
+        """Test that the dispatch table classifies events the same as the predicates."""
+        events = [
+            event
+            for session_events in load_session_events(DEFAULT_SESSION_DIR)
+            for event in session_events
+        ]
+        events.append({"type": 3, "timestamp": 1000, "data": {"source": 14}})
+
+        for event in events:
+            assert _classify_with_dispatch_table(event) == _classify_with_predicates(
+                event
+            )
+
+
+class TestBenchmarkIngest:
+    """Test cases for the ingest benchmark on synthetic sessions."""
+
+    def test_benchmark_ingest(self, tmp_path):
+        """Test that throughput and peak RSS are measured for each size."""
+        config = SyntheticSessionConfig()
+
+        results = benchmark_ingest([0.05, 0.1], tmp_path, config)
+
+        assert [result["size_mb"] for result in results] == [0.05, 0.1]
+        assert len(list(tmp_path.glob("synthetic-*.json"))) == 2
+        for result in results:
+            assert result["bytes"] >= result["size_mb"] * 1_000_000
+            assert result["mb_per_second"] > 0
+            assert result["events_per_second"] > 0
+            assert result["peak_rss_mb"] > 0
+
+    def test_ingest_results_recorded(self, tmp_path, monkeypatch):
+        """Test that each run with --results appends a JSON line with its config & results."""
+        results_path = tmp_path / "results.jsonl"
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "benchmark.py",
+                "--ingest",
+                "--sizes_mb",
+                "0.05",
+                "--work_dir",
+                str(tmp_path),
+                "--results",
+                str(results_path),
+                "--seed",
+                "7",
+            ],
+        )
+
+        benchmark.main()
+        benchmark.main()
+
+        records = [json.loads(line) for line in results_path.read_text().splitlines()]
+        assert len(records) == 2
+        for record in records:
+            assert record["config"]["seed"] == 7
+            assert [result["size_mb"] for result in record["results"]] == [0.05]
+            assert record["recorded_at"]
+
+    def test_record_ingest_results(self, tmp_path):
+        """Test that recorded results are appended to the JSON lines file."""
+        config = SyntheticSessionConfig()
+        results = [{"size_mb": 0.05, "mb_per_second": 1.0}]
+        results_path = tmp_path / "results.jsonl"
+
+        record_ingest_results(results_path, config, results)
+        record_ingest_results(results_path, config, results)
+
+        records = [json.loads(line) for line in results_path.read_text().splitlines()]
+        assert len(records) == 2
+        assert records[0]["config"]["seed"] == config.seed
+        assert records[0]["results"] == results
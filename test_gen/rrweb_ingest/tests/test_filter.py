@@ -7,7 +7,7 @@ and removal of low-signal events from rrweb sessions.
 
 # pylint: disable=duplicate-code
 
-from rrweb_ingest.filter import is_low_signal
+from rrweb_ingest.filter import LOW_SIGNAL_SOURCES, is_low_signal
 from rrweb_util import EventType, IncrementalSource
 
 
@@ -90,3 +90,13 @@ class TestIsLowSignal:
             "data": {},
         }
         assert is_low_signal(event_no_source) is False
+
+    def test_low_signal_sources(self):
+        """Test that exactly the LOW_SIGNAL_SOURCES are filtered."""
+        for source in range(IncrementalSource.CUSTOM_ELEMENT + 1):
+            event = {
+                "type": EventType.INCREMENTAL_SNAPSHOT,
+                "timestamp": 1000,
+                "data": {"source": source},
+            }
+            assert is_low_signal(event) is (source in LOW_SIGNAL_SOURCES)
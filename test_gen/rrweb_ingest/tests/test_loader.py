@@ -2,7 +2,7 @@
 Unit tests for the JSON loader module.
 
 Tests the load_events function to ensure it properly loads, validates, and sorts
-rrweb session data from JSON files.
+rrweb session data from JSON files, and the iter_events function which streams it.
 """
 
 import json
@@ -10,7 +10,14 @@ import tempfile
 
 import pytest
 
-from rrweb_ingest.loader import load_events
+from rrweb_ingest import loader
+from rrweb_ingest.filter import LOW_SIGNAL_SOURCES, is_low_signal
+from rrweb_ingest.loader import (
+    UnsortedEventsError,
+    iter_events,
+    load_events,
+    sort_events,
+)
 
 
 @pytest.fixture(name="create_input_file")
@@ -32,7 +39,7 @@ def fixture_create_input_file():
                 f.write(raw_string)
             else:
                 json.dump(data, f)
-                f.flush()  # Ensure data is written to the file
+            f.flush()  # Ensure data is written to the file
             return f.name
 
         yield _create_input_file
@@ -156,3 +163,171 @@ class TestLoadEvents:
         result = load_events(temp_path)
         assert len(result) == 1
         assert result[0] == test_events[0]
+
+
+class TestSortEvents:
+    """Test cases for the sort_events function."""
+
+    def test_sorted_events(self):
+        """Test that events already in order are returned in order."""
+        events = [{"timestamp": 1000}, {"timestamp": 2000}, {"timestamp": 3000}]
+
+        assert sort_events(events) == events
+
+    def test_stitched_events(self):
+        """Test that ordered chunks with overlapping timestamps are merged."""
+        events = [
+            {"timestamp": 1000},
+            {"timestamp": 3000},
+            {"timestamp": 2000},
+            {"timestamp": 4000},
+        ]
+
+        assert [event["timestamp"] for event in sort_events(events)] == [
+            1000,
+            2000,
+            3000,
+            4000,
+        ]
+
+    def test_equal_timestamps_keep_order(self):
+        """Test that events with the same timestamp keep their relative order."""
+        events = [
+            {"timestamp": 2000, "id": 1},
+            {"timestamp": 1000, "id": 2},
+            {"timestamp": 2000, "id": 3},
+            {"timestamp": 1000, "id": 4},
+        ]
+
+        assert [event["id"] for event in sort_events(events)] == [2, 4, 1, 3]
+
+
+class TestIterEvents:
+    """Test cases for the iter_events function."""
+
+    def test_streams_events_in_file_order(self, create_input_file):
+        """Test that events are yielded in the order they're stored."""
+        test_events = [
+            {"type": 3, "timestamp": 3000, "data": {"source": 2}},
+            {"type": 2, "timestamp": 1000, "data": {}},
+        ]
+
+        temp_path = create_input_file(test_events)
+
+        assert list(iter_events(temp_path)) == test_events
+
+    def test_matches_json_load_in_small_chunks(self, monkeypatch, sample_data_path):
+        """Test that values spanning several reads are parsed the same as json.load."""
+        monkeypatch.setattr(loader, "STREAM_CHUNK_SIZE", 7)
+        with open(sample_data_path, "r", encoding="utf-8") as f:
+            expected = json.load(f)["rrweb_data"]
+
+        assert list(iter_events(sample_data_path)) == expected
+
+    def test_skips_fields_around_rrweb_data(self, create_input_file):
+        """Test that fields before and after rrweb_data are skipped."""
+        temp_path = create_input_file(
+            [],
+            raw_string=(
+                '{"metadata": {"nested": [1, "]"]}, '
+                '"rrweb_data": [{"type": 2, "timestamp": 1000, "data": {}}], '
+                '"session_guid": "12345"}'
+            ),
+        )
+
+        assert list(iter_events(temp_path)) == [
+            {"type": 2, "timestamp": 1000, "data": {}}
+        ]
+
+    def test_require_sorted_raises_for_unsorted_events(self, create_input_file):
+        """Test that UnsortedEventsError is raised after the sorted prefix is yielded."""
+        test_events = [
+            {"type": 2, "timestamp": 1000, "data": {}},
+            {"type": 3, "timestamp": 3000, "data": {"source": 2}},
+            {"type": 3, "timestamp": 2000, "data": {"source": 2}},
+        ]
+
+        temp_path = create_input_file(test_events)
+
+        events = iter_events(temp_path, require_sorted=True)
+        assert next(events) == test_events[0]
+        assert next(events) == test_events[1]
+        with pytest.raises(UnsortedEventsError, match="Event at index 2"):
+            next(events)
+
+    def test_truncated_file(self, create_input_file):
+        """Test that JSONDecodeError is raised for a file which ends mid-array."""
+        temp_path = create_input_file(
+            [], raw_string='{"rrweb_data": [{"type": 2, "timestamp": 1000, "data": {}},'
+        )
+
+        with pytest.raises(json.JSONDecodeError, match="Invalid JSON"):
+            list(iter_events(temp_path))
+
+    def test_skip_sources_drops_events(self, create_input_file):
+        """Test that IncrementalSnapshot events from skip_sources aren't yielded."""
+        test_events = [
+            {"type": 2, "timestamp": 1000, "data": {}},
+            {"type": 3, "data": {"source": 1, "positions": [{"x": 1}]}, "timestamp": 1},
+            {"type": 3, "data": {"source": 2, "id": 5}, "timestamp": 2000},
+            # Serialized differently, so only dropped once it's decoded
+            {"timestamp": 3000, "data": {"x": 1, "source": 3}, "type": 3},
+            {"type": 4, "data": {"source": 1}, "timestamp": 4000},
+        ]
+
+        temp_path = create_input_file(test_events)
+
+        # The skipped event recorded out of order isn't checked for order
+        events = iter_events(temp_path, require_sorted=True, skip_sources={1, 3})
+        assert list(events) == [test_events[0], test_events[2], test_events[4]]
+
+    def test_skip_sources_matches_filtering(self, monkeypatch, sample_data_path):
+        """Test that skipping low-signal sources matches filtering decoded events."""
+        with open(sample_data_path, "r", encoding="utf-8") as f:
+            expected = [
+                event
+                for event in json.load(f)["rrweb_data"]
+                if not is_low_signal(event)
+            ]
+
+        assert (
+            list(iter_events(sample_data_path, skip_sources=LOW_SIGNAL_SOURCES))
+            == expected
+        )
+        # Events which continue past the buffer are decoded instead of skipped
+        monkeypatch.setattr(loader, "STREAM_CHUNK_SIZE", 7)
+        assert (
+            load_events(sample_data_path, skip_sources=LOW_SIGNAL_SOURCES) == expected
+        )
+
+    def test_skip_sources_skips_strings_with_brackets(self, create_input_file):
+        """Test that brackets & escaped quotes in strings don't end skipped events."""
+        temp_path = create_input_file(
+            [],
+            raw_string=(
+                '{"rrweb_data": ['
+                '{"type": 3, "data": {"source": 11, "payload": ["}]", "{["]},'
+                ' "timestamp": 1000},'
+                '{"type": 3, "data": {"source": 11, "payload": ["}]\\"", "\\"{"]},'
+                ' "timestamp": 1500},'
+                '{"type": 3, "data": {"source": 2}, "timestamp": 2000}]}'
+            ),
+        )
+
+        assert list(iter_events(temp_path, skip_sources={11})) == [
+            {"type": 3, "data": {"source": 2}, "timestamp": 2000}
+        ]
+
+    def test_skip_sources_decodes_deeply_nested_events(self, create_input_file):
+        """Test that events nested deeper than SKIP_MAX_DEPTH are still dropped."""
+        payload = []
+        for _ in range(loader.SKIP_MAX_DEPTH):
+            payload = [payload]
+        test_events = [
+            {"type": 3, "data": {"source": 11, "payload": payload}, "timestamp": 1000},
+            {"type": 3, "data": {"source": 2}, "timestamp": 2000},
+        ]
+
+        temp_path = create_input_file(test_events)
+
+        assert list(iter_events(temp_path, skip_sources={11})) == test_events[1:]
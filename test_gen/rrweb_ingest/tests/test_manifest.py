@@ -0,0 +1,94 @@
+"""
+Unit tests for the ingest manifest module.
+
+Tests the IngestManifest class to ensure sessions are only considered unchanged when their
+content, outputs, and the feature extraction version are the same as when they were ingested.
+"""
+
+import json
+import os
+
+import pytest
+
+from rrweb_ingest.manifest import MANIFEST_FILENAME, IngestManifest
+
+
+@pytest.fixture(name="session_file")
+def fixture_session_file(tmp_path):
+    """Create a session file which has been ingested and saved to the output directory."""
+    session_file = tmp_path / "session.json"
+    session_file.write_text('{"rrweb_data": []}')
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    (output_dir / "session.json").write_text("{}")
+
+    manifest = IngestManifest(output_dir, "json")
+    assert not manifest.is_unchanged(session_file)
+    manifest.record(session_file, "session.json")
+    manifest.save()
+    return session_file
+
+
+class TestIngestManifest:
+    """Test cases for the IngestManifest class."""
+
+    def test_unchanged_session(self, session_file):
+        """Test that a session is unchanged when reloading the manifest."""
+        manifest = IngestManifest.load(session_file.parent / "output", "json")
+
+        assert manifest.is_unchanged(session_file)
+
+    def test_touched_session(self, session_file):
+        """Test that a session with a new modification time but the same content is unchanged."""
+        stat = session_file.stat()
+        os.utime(session_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        manifest = IngestManifest.load(session_file.parent / "output", "json")
+
+        assert manifest.is_unchanged(session_file)
+
+    def test_changed_session(self, session_file):
+        """Test that a session with different content of the same size is changed."""
+        stat = session_file.stat()
+        session_file.write_text('{"rrweb_data": {}}')
+        os.utime(session_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        manifest = IngestManifest.load(session_file.parent / "output", "json")
+
+        assert not manifest.is_unchanged(session_file)
+
+    def test_missing_output(self, session_file):
+        """Test that a session whose output was deleted is changed."""
+        output_dir = session_file.parent / "output"
+        (output_dir / "session.json").unlink()
+
+        manifest = IngestManifest.load(output_dir, "json")
+
+        assert not manifest.is_unchanged(session_file)
+
+    def test_session_without_output(self, tmp_path):
+        """Test that a session which wasn't saved is unchanged without an output."""
+        session_file = tmp_path / "session.json"
+        session_file.write_text('{"rrweb_data": []}')
+        manifest = IngestManifest(tmp_path, "json")
+        manifest.record(session_file, None)
+        manifest.save()
+
+        assert IngestManifest.load(tmp_path, "json").is_unchanged(session_file)
+
+    def test_different_feature_extraction_version(self, session_file):
+        """Test that sessions ingested by a different feature extraction version are changed."""
+        manifest_path = session_file.parent / "output" / MANIFEST_FILENAME
+        data = json.loads(manifest_path.read_text())
+        data["feature_extraction_version"] = "0.0"
+        manifest_path.write_text(json.dumps(data))
+
+        manifest = IngestManifest.load(session_file.parent / "output", "json")
+
+        assert not manifest.is_unchanged(session_file)
+
+    def test_different_output_format(self, session_file):
+        """Test that sessions saved in a different output format are changed."""
+        manifest = IngestManifest.load(session_file.parent / "output", "compact")
+
+        assert not manifest.is_unchanged(session_file)
@@ -0,0 +1,45 @@
+"""
+Unit tests for the memory module.
+
+Tests MemoryGuard estimates the memory held by a session and records how ingest degraded.
+"""
+
+from rrweb_ingest.memory import (
+    BYTES_PER_INTERACTION,
+    BYTES_PER_NODE,
+    LOADED_BYTES_PER_FILE_BYTE,
+    TRUNCATED,
+    MemoryGuard,
+)
+
+
+class TestMemoryGuard:
+    """Test cases for the MemoryGuard class."""
+
+    def test_allows(self):
+        """Test that the estimate from node & interaction counts is checked against the budget."""
+        guard = MemoryGuard(10 * BYTES_PER_NODE + 2 * BYTES_PER_INTERACTION)
+
+        assert guard.allows(10, 2)
+        assert not guard.allows(11, 2)
+        assert guard.allows(5, 0)
+        assert guard.peak_estimate == 11 * BYTES_PER_NODE + 2 * BYTES_PER_INTERACTION
+
+    def test_allows_loading(self, tmp_path):
+        """Test that loading a session is allowed in proportion to its file size."""
+        filepath = tmp_path / "session.json"
+        filepath.write_text("x" * 100, encoding="utf-8")
+
+        assert MemoryGuard(100 * LOADED_BYTES_PER_FILE_BYTE).allows_loading(filepath)
+        assert not MemoryGuard(99 * LOADED_BYTES_PER_FILE_BYTE).allows_loading(filepath)
+
+    def test_reset(self):
+        """Test that reset forgets how ingest degraded but keeps the budget."""
+        guard = MemoryGuard(100)
+        guard.allows(1, 1)
+        guard.degrade(TRUNCATED)
+        guard.interactions_dropped = 3
+
+        guard.reset()
+
+        assert guard == MemoryGuard(100)
@@ -7,12 +7,24 @@ components and correct handling of various session scenarios and error condition
 
 import json
 from pathlib import Path
+import pstats
 import tempfile
 
 import pytest
 
-from rrweb_ingest.models import ProcessedSession
-from rrweb_ingest.pipeline import ingest_session, process_sessions
+from rrweb_ingest.memory import (
+    BYTES_PER_INTERACTION,
+    BYTES_PER_NODE,
+    EVICTED_REMOVED_NODES,
+    SKIPPED,
+    STREAMED_UNSORTED,
+    TRUNCATED,
+    MemoryGuard,
+)
+from rrweb_ingest.models import ProcessedSession, processed_session_from_dict
+from rrweb_ingest.pipeline import ProcessOptions, ingest_session, process_sessions
+from rrweb_ingest.profiling import STAGES, SessionProfile
+from rrweb_ingest.synthetic import SyntheticSessionConfig, write_synthetic_session
 
 
 @pytest.fixture(name="create_session_file")
@@ -133,6 +145,154 @@ class TestIngestSession:
         with pytest.raises(ValueError, match="missing required fields"):
             ingest_session("test", temp_path)
 
+    def test_ingest_session_unsorted_events(
+        self, create_session_file, sample_data_path
+    ):
+        """Test that sessions with events out of timestamp order are sorted before ingesting."""
+        with open(sample_data_path, "r", encoding="utf-8") as f:
+            events = json.load(f)["rrweb_data"]
+        temp_path = create_session_file(list(reversed(events)))
+
+        unsorted_session = ingest_session("sample", temp_path)
+        assert unsorted_session == ingest_session("sample", sample_data_path)
+
+    def test_ingest_session_incremental_snapshot_before_full_snapshot(
+        self, create_session_file
+    ):
+        """Test that IncrementalSnapshot events need a FullSnapshot first."""
+        events = [{"type": 3, "timestamp": 1000, "data": {"source": 2, "id": 1}}]
+        temp_path = create_session_file(events)
+
+        with pytest.raises(ValueError, match="before FullSnapshot"):
+            ingest_session("test", temp_path)
+
+    def test_ingest_session_unknown_incremental_source(self, create_session_file):
+        """Test that IncrementalSnapshot events from unhandled sources raise ValueError."""
+        events = [
+            {"type": 2, "timestamp": 1000, "data": {"node": {"id": 1, "type": 0}}},
+            {"type": 3, "timestamp": 2000, "data": {"source": 14, "ranges": []}},
+        ]
+        temp_path = create_session_file(events)
+
+        with pytest.raises(ValueError, match="Unknown event type"):
+            ingest_session("test", temp_path)
+
+    def test_ingest_session_memory_budget_evicts_removed_nodes(self, tmp_path):
+        """Test that sessions over their memory budget evict nodes removed from the DOM."""
+        filepath = tmp_path / "synthetic.json"
+        write_synthetic_session(filepath, 300_000, SyntheticSessionConfig(dom_size=200))
+        unbounded_guard = MemoryGuard(10**12)
+        unbounded_session = ingest_session("synthetic", filepath, None, unbounded_guard)
+        guard = MemoryGuard(unbounded_guard.peak_estimate * 7 // 10)
+
+        session = ingest_session("synthetic", filepath, None, guard)
+
+        assert not unbounded_guard.degradations
+        assert guard.degradations == [EVICTED_REMOVED_NODES]
+        assert session == unbounded_session
+
+    def test_ingest_session_memory_budget_truncates(self, tmp_path):
+        """Test that sessions still over their memory budget after evicting are truncated."""
+        filepath = tmp_path / "synthetic.json"
+        write_synthetic_session(filepath, 300_000, SyntheticSessionConfig(dom_size=200))
+        unbounded_session = ingest_session("synthetic", filepath)
+        guard = MemoryGuard(250 * BYTES_PER_NODE)
+
+        session = ingest_session("synthetic", filepath, None, guard)
+
+        assert guard.degradations == [EVICTED_REMOVED_NODES, TRUNCATED]
+        interactions = session.user_interactions
+        assert 0 < len(interactions) < len(unbounded_session.user_interactions)
+        assert interactions == unbounded_session.user_interactions[: len(interactions)]
+
+    def test_ingest_session_memory_budget_drops_evicted_interactions(
+        self, create_session_file
+    ):
+        """Test that interactions with nodes evicted to stay within the budget are dropped."""
+
+        def button(node_id):
+            return {"id": node_id, "type": 2, "tagName": "button", "childNodes": []}
+
+        def click(timestamp, node_id):
+            return {
+                "type": 3,
+                "timestamp": timestamp,
+                "data": {"source": 2, "type": 2, "id": node_id, "x": 1, "y": 1},
+            }
+
+        document = {"id": 1, "type": 0, "childNodes": [button(2), button(3)]}
+        events = [
+            {"type": 2, "timestamp": 1000, "data": {"node": document}},
+            {
+                "type": 3,
+                "timestamp": 2000,
+                "data": {
+                    "source": 0,
+                    "removes": [{"parentId": 1, "id": 2}],
+                    "adds": [
+                        {"parentId": 1, "node": button(4)},
+                        {"parentId": 1, "node": button(5)},
+                    ],
+                    "texts": [],
+                    "attributes": [],
+                },
+            },
+            click(3000, 2),
+            click(4000, 3),
+        ]
+        temp_path = create_session_file(events)
+        guard = MemoryGuard(4 * BYTES_PER_NODE + BYTES_PER_INTERACTION)
+
+        session = ingest_session("test", temp_path, None, guard)
+
+        assert guard.degradations == [EVICTED_REMOVED_NODES]
+        assert guard.interactions_dropped == 1
+        assert [interaction.target_id for interaction in session.user_interactions] == [
+            3
+        ]
+
+    def test_ingest_session_memory_budget_streams_unsorted(
+        self, tmp_path, create_session_file
+    ):
+        """
+        Test that unsorted sessions too large to load within the budget are streamed, and
+        skipped rather than failing the run if they can't be ingested unsorted.
+        """
+        filepath = tmp_path / "synthetic.json"
+        write_synthetic_session(filepath, 300_000, SyntheticSessionConfig(dom_size=200))
+        with open(filepath, "r", encoding="utf-8") as f:
+            events = json.load(f)["rrweb_data"]
+        # Record the last mutation out of order, since low-signal events are skipped unsorted
+        last_mutation = max(
+            i for i, event in enumerate(events) if event["data"].get("source") == 0
+        )
+        events[last_mutation]["timestamp"] = events[1]["timestamp"]
+        temp_path = create_session_file(events)
+        guard = MemoryGuard(1_000_000)
+
+        session = ingest_session("synthetic", temp_path, None, guard)
+
+        assert guard.degradations == [STREAMED_UNSORTED]
+        assert session.user_interactions
+
+        session_dir = tmp_path / "sessions"
+        session_dir.mkdir()
+        with open(session_dir / "reversed.json", "w", encoding="utf-8") as f:
+            json.dump({"rrweb_data": list(reversed(events))}, f)
+
+        stats = process_sessions(
+            session_dir,
+            tmp_path / "output",
+            options=ProcessOptions(memory_budget_mb=1),
+        )
+
+        assert stats["sessions_processed"] == 1
+        assert stats["degraded_sessions"]["reversed"]["degradations"] == [
+            STREAMED_UNSORTED,
+            SKIPPED,
+        ]
+        assert not list((tmp_path / "output").glob("*.json"))
+
     def test_process_sessions(self, tmp_path):
         """
         Integration test for process_sessions function.
@@ -182,3 +342,198 @@ class TestIngestSession:
 
         assert "click" in interaction_types_found, "Should contain click interactions"
         assert "input" in interaction_types_found, "Should contain input interactions"
+
+    def test_process_sessions_skips_unchanged_sessions(self, tmp_path):
+        """Test that sessions unchanged since they were last processed are skipped unless forced."""
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        def processed_and_skipped(**kwargs):
+            stats = process_sessions(test_session_dir, tmp_path, **kwargs)
+            return stats["sessions_processed"], stats["sessions_skipped"]
+
+        assert processed_and_skipped(max_sessions=2) == (2, 0)
+        assert processed_and_skipped() == (3, 2)
+        assert processed_and_skipped() == (0, 5)
+        assert processed_and_skipped(options=ProcessOptions(force=True)) == (5, 0)
+        assert len(list(tmp_path.glob("*.json"))) == 5
+
+    def test_process_sessions_in_parallel(self, tmp_path):
+        """Test that sessions ingested by worker processes are saved the same as one by one."""
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        serial_stats = process_sessions(test_session_dir, tmp_path / "serial")
+        parallel_stats = process_sessions(
+            test_session_dir, tmp_path / "parallel", options=ProcessOptions(workers=2)
+        )
+
+        # Timings vary between runs, but the events handled by each stage don't
+        workers = parallel_stats.pop("workers")
+        serial_stats.pop("workers")
+        for stats in (serial_stats, parallel_stats):
+            for stage in stats["stages"].values():
+                stage.pop("seconds")
+        assert parallel_stats == serial_stats
+        assert sum(worker["sessions"] for worker in workers.values()) == 5
+
+        serial_files = sorted((tmp_path / "serial").glob("*.json"))
+        parallel_files = sorted((tmp_path / "parallel").glob("*.json"))
+        assert [f.name for f in parallel_files] == [f.name for f in serial_files]
+        for serial_file, parallel_file in zip(serial_files, parallel_files):
+            assert parallel_file.read_text() == serial_file.read_text()
+
+    def test_process_sessions_in_parallel_max_sessions(self, tmp_path):
+        """Test that only the first max_sessions sessions are ingested by worker processes."""
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        stats = process_sessions(
+            test_session_dir, tmp_path, 2, ProcessOptions(workers=3)
+        )
+
+        assert stats["sessions_processed"] == 2
+        assert (
+            sorted(f.stem for f in tmp_path.glob("*.json"))
+            == sorted(f.stem for f in test_session_dir.glob("*.json"))[:2]
+        )
+
+    def test_process_sessions_in_parallel_error(self, tmp_path):
+        """Test that errors ingesting a session in a worker process are raised."""
+        session_dir = tmp_path / "sessions"
+        session_dir.mkdir()
+        (session_dir / "invalid.json").write_text('{"invalid": json}')
+
+        with pytest.raises(json.JSONDecodeError):
+            process_sessions(
+                session_dir, tmp_path / "output", options=ProcessOptions(workers=2)
+            )
+
+    def test_process_sessions_compact_output(self, tmp_path):
+        """Test that sessions saved in the compact format are read back the same."""
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        json_stats = process_sessions(test_session_dir, tmp_path / "json")
+        compact_stats = process_sessions(
+            test_session_dir,
+            tmp_path / "compact",
+            options=ProcessOptions(output_format="compact"),
+        )
+
+        assert compact_stats["total_interactions"] == json_stats["total_interactions"]
+        for json_file in sorted((tmp_path / "json").glob("*.json")):
+            compact_file = tmp_path / "compact" / json_file.name
+            assert compact_file.stat().st_size < json_file.stat().st_size / 4
+            with open(json_file, "r", encoding="utf-8") as f:
+                json_session = processed_session_from_dict(json.load(f))
+            with open(compact_file, "r", encoding="utf-8") as f:
+                compact_session = processed_session_from_dict(json.load(f))
+            assert compact_session == json_session
+
+    def test_process_sessions_memory_budget(self, tmp_path):
+        """
+        Test that sessions degraded to stay within the memory budget are recorded in the stats,
+        but not the manifest, so re-running without the budget ingests them in full.
+        """
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        stats = process_sessions(
+            test_session_dir,
+            tmp_path,
+            max_sessions=2,
+            options=ProcessOptions(workers=2, memory_budget_mb=0.001),
+        )
+
+        assert stats["sessions_processed"] == 2
+        degraded_sessions = stats["degraded_sessions"]
+        assert len(degraded_sessions) == 2
+        for degraded in degraded_sessions.values():
+            assert degraded["degradations"][-1] == TRUNCATED
+            assert degraded["peak_estimate"] > 1024
+
+        rerun_stats = process_sessions(test_session_dir, tmp_path, max_sessions=2)
+
+        assert rerun_stats["sessions_skipped"] == 0
+        assert rerun_stats["sessions_processed"] == 2
+        assert not rerun_stats["degraded_sessions"]
+        assert sum(rerun_stats["total_interactions"].values()) > sum(
+            stats["total_interactions"].values()
+        )
+
+
+class TestIngestProfiling:
+    """Test cases for profiling the stages of ingest."""
+
+    def test_process_sessions_stages(self, tmp_path):
+        """
+        Test that the events each stage handled are recorded, and only the ingest & write
+        stages are timed without profiling.
+        """
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        stats = process_sessions(test_session_dir, tmp_path)
+
+        stages = stats["stages"]
+        assert list(stages) == list(STAGES)
+        assert stages["ingest"]["events"] == stages["parse"]["events"]
+        assert stages["parse"]["events"] == sum(
+            stage_stats["events"]
+            for stage, stage_stats in stages.items()
+            if stage not in ("ingest", "parse", "write")
+        )
+        assert stages["write"]["events"] == stats["sessions_processed"]
+        assert stages["ingest"]["seconds"] > 0
+        assert stages["write"]["seconds"] > 0
+        assert all(
+            stage_stats["seconds"] is None
+            for stage, stage_stats in stages.items()
+            if stage not in ("ingest", "write")
+        )
+        assert not stats["peak_memory"]
+        assert not stats["degraded_sessions"]
+        assert "profile_path" not in stats
+
+    def test_ingest_session_unsorted_events_profiled_once(
+        self, create_session_file, sample_data_path
+    ):
+        """Test that unsorted sessions aren't profiled again after streaming them fails."""
+        with open(sample_data_path, "r", encoding="utf-8") as f:
+            events = json.load(f)["rrweb_data"]
+        temp_path = create_session_file(list(reversed(events)))
+        sorted_profile = SessionProfile()
+        unsorted_profile = SessionProfile()
+
+        ingest_session("sample", sample_data_path, sorted_profile)
+        ingest_session("sample", temp_path, unsorted_profile)
+
+        assert unsorted_profile.events == sorted_profile.events
+
+    def test_process_sessions_profile(self, tmp_path):
+        """Test that profiling saves the run's cProfile stats and each session's peak memory."""
+        test_session_dir = Path("rrweb_ingest/tests/test_sessions")
+
+        stats = process_sessions(
+            test_session_dir,
+            tmp_path,
+            max_sessions=2,
+            options=ProcessOptions(workers=2, profile=True),
+        )
+
+        assert len(stats["peak_memory"]) == 2
+        assert all(peak > 0 for peak in stats["peak_memory"].values())
+        assert all(stage["seconds"] > 0 for stage in stats["stages"].values())
+        profile_stats = pstats.Stats(str(stats["profile_path"]))
+        assert any(
+            function_name == "apply_mutation_data"
+            for _, _, function_name in profile_stats.stats
+        )
+
+    def test_process_sessions_skips_debug_formatting(self, tmp_path, monkeypatch):
+        """Test that interactions are only formatted for logging when debug logging is enabled."""
+
+        def fail_pformat(_):
+            raise AssertionError("pformat called without debug logging")
+
+        monkeypatch.setattr("rrweb_ingest.pipeline.pformat", fail_pformat)
+        stats = process_sessions(
+            Path("rrweb_ingest/tests/test_sessions"), tmp_path, max_sessions=1
+        )
+
+        assert stats["sessions_saved"] == 1
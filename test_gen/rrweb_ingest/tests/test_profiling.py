@@ -0,0 +1,46 @@
+"""
+Unit tests for the profiling module.
+
+Tests SessionProfile records the time spent in each stage and the events handled by it.
+"""
+
+from rrweb_ingest.profiling import SessionProfile
+
+
+class TestSessionProfile:
+    """Test cases for the SessionProfile class."""
+
+    def test_time_events(self):
+        """Test that producing each event is recorded without changing the events."""
+        profile = SessionProfile()
+        events = [{"type": 2}, {"type": 3}]
+
+        assert list(profile.time_events("parse", iter(events))) == events
+        assert profile.events["parse"] == 2
+        assert profile.seconds["parse"] > 0
+
+    def test_stage(self):
+        """Test that the time spent in a block is recorded as a stage."""
+        profile = SessionProfile()
+
+        with profile.stage("write"):
+            pass
+        with profile.stage("write", events=3):
+            pass
+
+        assert profile.events["write"] == 4
+        assert profile.seconds["write"] > 0
+
+    def test_add(self):
+        """Test that adding profiles sums their stages."""
+        profile = SessionProfile()
+        profile.record("parse", 1.0, 10)
+        other = SessionProfile()
+        other.record("parse", 0.5, 5)
+        other.record("filter", 0.25, 2)
+        other.events["apply_mutation"] += 3
+
+        profile.add(other)
+
+        assert dict(profile.seconds) == {"parse": 1.5, "filter": 0.25}
+        assert dict(profile.events) == {"parse": 15, "filter": 2, "apply_mutation": 3}
@@ -5,7 +5,12 @@ Tests for JSON serialization functionality of rrweb_ingest models.
 import json
 import pytest
 
-from rrweb_ingest.models import ProcessedSession
+from rrweb_ingest.models import (
+    COMPACT_FORMAT,
+    ProcessedSession,
+    processed_session_from_dict,
+)
+from rrweb_util.user_interaction.models import UserInteraction
 
 
 @pytest.fixture(name="basic_processed_session")
@@ -54,3 +59,38 @@ def test_processed_session_serialization_roundtrip(basic_processed_session):
     )
     assert parsed_dict["user_interactions"] == session_dict["user_interactions"]
     assert parsed_dict["metadata"] == session_dict["metadata"]
+
+
+def test_processed_session_compact_roundtrip(basic_processed_session):
+    """Test that the compact format is read back as the same ProcessedSession."""
+    compact_dict = json.loads(json.dumps(basic_processed_session.to_compact_dict()))
+
+    assert compact_dict["format"] == COMPACT_FORMAT
+    assert processed_session_from_dict(compact_dict) == basic_processed_session
+
+
+def test_processed_session_compact_interns_target_nodes():
+    """Test that repeated target nodes & strings are stored once in the compact format."""
+    target_node = {"tag": "button", "dom_path": "html > body > button", "text": None}
+    session = ProcessedSession(
+        session_id="compact-session",
+        user_interactions=[
+            UserInteraction("click", 5, dict(target_node), {"x": 1, "y": 2}, 1000),
+            UserInteraction("click", 5, dict(target_node), {"x": 3, "y": 4}, 2000),
+            UserInteraction(
+                "input", 6, {**target_node, "tag": "input", "size": 0}, "hi", 3000
+            ),
+        ],
+    )
+
+    compact_dict = session.to_compact_dict()
+
+    assert compact_dict["strings"] == [
+        "button",
+        "html > body > button",
+        "click",
+        "input",
+    ]
+    assert len(compact_dict["target_nodes"]) == 2
+    assert compact_dict["user_interactions"]["target_node"] == [0, 0, 1]
+    assert processed_session_from_dict(compact_dict) == session
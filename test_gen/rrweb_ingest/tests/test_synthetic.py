@@ -0,0 +1,102 @@
+"""
+Unit tests for the synthetic session generator.
+
+Tests generated sessions are reproducible, have the configured shape, and can be ingested.
+"""
+
+from itertools import islice
+import json
+
+import pytest
+
+from rrweb_ingest.filter import is_low_signal
+from rrweb_ingest.pipeline import ingest_session
+from rrweb_ingest.synthetic import (
+    SyntheticSessionConfig,
+    iter_synthetic_events,
+    write_synthetic_session,
+)
+from rrweb_util import EventType, IncrementalSource
+
+
+def _depth(node: dict) -> int:
+    # The document is at depth 0
+    return max((1 + _depth(child) for child in node.get("childNodes", [])), default=0)
+
+
+class TestSyntheticSessions:
+    """Test cases for generating synthetic sessions."""
+
+    def test_events_are_reproducible(self):
+        """Test that the same config generates the same events and other seeds don't."""
+        config = SyntheticSessionConfig(seed=1)
+
+        events = list(islice(iter_synthetic_events(config), 500))
+
+        assert events == list(islice(iter_synthetic_events(config), 500))
+        assert events != list(
+            islice(iter_synthetic_events(SyntheticSessionConfig(seed=2)), 500)
+        )
+
+    def test_events_are_in_timestamp_order(self):
+        """Test that events are generated in timestamp order."""
+        events = list(islice(iter_synthetic_events(SyntheticSessionConfig()), 1000))
+
+        timestamps = [event["timestamp"] for event in events]
+        assert timestamps == sorted(timestamps)
+
+    def test_dom_size_and_depth(self):
+        """Test that the FullSnapshot has the configured size and depth."""
+        config = SyntheticSessionConfig(dom_size=200, dom_depth=6)
+
+        events = list(islice(iter_synthetic_events(config), 2))
+
+        assert events[1]["type"] == EventType.FULL_SNAPSHOT
+        document = events[1]["data"]["node"]
+        assert _depth(document) <= 6
+        node_ids = []
+        nodes = [document]
+        while nodes:
+            node = nodes.pop()
+            node_ids.append(node["id"])
+            nodes.extend(node.get("childNodes", []))
+        assert 200 <= len(node_ids) <= 201
+        assert len(set(node_ids)) == len(node_ids)
+
+    def test_event_rates(self):
+        """Test that events are generated in proportion to the configured rates."""
+        config = SyntheticSessionConfig(
+            mutations_per_second=3, interactions_per_second=1, noise_ratio=0.5
+        )
+
+        events = list(islice(iter_synthetic_events(config), 20000))[2:]
+
+        noise = sum(is_low_signal(event) for event in events) / len(events)
+        mutations = sum(
+            event["data"]["source"] == IncrementalSource.MUTATION for event in events
+        ) / len(events)
+        assert noise == pytest.approx(0.5, abs=0.02)
+        assert mutations == pytest.approx(0.375, abs=0.02)
+        seconds = (events[-1]["timestamp"] - events[0]["timestamp"]) / 1000
+        assert len(events) / seconds == pytest.approx(8, rel=0.05)
+
+    def test_invalid_config(self):
+        """Test that configs which can't generate a session raise ValueError."""
+        with pytest.raises(ValueError, match="noise_ratio"):
+            SyntheticSessionConfig(noise_ratio=1)
+        with pytest.raises(ValueError, match="dom_depth"):
+            SyntheticSessionConfig(dom_depth=2)
+
+    def test_write_synthetic_session(self, tmp_path):
+        """Test that sessions are written up to the size given, and can be ingested."""
+        filepath = tmp_path / "synthetic.json"
+
+        event_count = write_synthetic_session(
+            filepath, 200_000, SyntheticSessionConfig()
+        )
+
+        assert 200_000 <= filepath.stat().st_size < 201_000
+        with open(filepath, "r", encoding="utf-8") as f:
+            assert len(json.load(f)["rrweb_data"]) == event_count
+        session = ingest_session("synthetic", filepath)
+        assert session.user_interactions
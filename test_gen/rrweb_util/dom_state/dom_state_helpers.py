@@ -128,8 +128,20 @@ def apply_mutation(node_by_id: Dict[int, UINode], event: dict) -> None:
     if not is_dom_mutation_event(event):
         return
 
-    data = event.get("data", {})
+    apply_mutation_data(node_by_id, event.get("data", {}))
 
+
+def apply_mutation_data(node_by_id: Dict[int, UINode], data: dict) -> None:
+    """
+    Applies the data of a rrweb mutation event to update the in-memory DOM state in place.
+
+    Like apply_mutation, for callers which have already classified the event as a mutation,
+    e.g. by dispatching on its (type, source) key.
+
+    Args:
+        node_by_id: Dictionary mapping node IDs to UINode instances (modified in place)
+        data: The data of a mutation event, with its adds, attributes, and texts
+    """
     # Handle different types of mutations
     # Note we don't do anything for node removals since we want to be able to map interactions to nodes even if
     # they're removed from the DOM
@@ -187,3 +199,42 @@ def _apply_text_changes(node_by_id: Dict[int, UINode], texts: List[dict]) -> Non
         if node_id is not None and node_id in node_by_id:
             new_text = text_record.get("value", "")
             node_by_id[node_id].text = new_text
+
+
+def evict_subtree(node_by_id: Dict[int, UINode], node_id: int) -> int:
+    """
+    Removes a node and all of its descendants from the DOM state, and the node from its
+    parent's children.
+
+    apply_mutation keeps removed nodes so interactions can still be mapped to them, so this
+    is only used to bound the memory held by the DOM state of very large sessions.
+
+    Args:
+        node_by_id: Dictionary mapping node IDs to UINode instances (modified in place)
+        node_id: ID of the root of the subtree to evict, ignored if it doesn't exist
+
+    Returns:
+        Number of nodes evicted
+    """
+    node = node_by_id.get(node_id)
+    if node is None:
+        return 0
+
+    parent = node_by_id.get(node.parent)
+    if parent is not None and node_id in parent.children:
+        parent.children.remove(node_id)
+
+    # Walk the subtree iteratively since DOM trees can be deeper than the recursion limit.
+    # Removals aren't applied to children lists, so skip children since added elsewhere.
+    evicted = 0
+    pending = [node_id]
+    while pending:
+        node = node_by_id.pop(pending.pop(), None)
+        if node is not None:
+            evicted += 1
+            pending.extend(
+                child_id
+                for child_id in node.children
+                if child_id in node_by_id and node_by_id[child_id].parent == node.id
+            )
+    return evicted
@@ -8,7 +8,11 @@ application for maintaining evolving DOM state.
 
 import pytest
 from rrweb_util import EventType, IncrementalSource
-from rrweb_util.dom_state.dom_state_helpers import init_dom_state, apply_mutation
+from rrweb_util.dom_state.dom_state_helpers import (
+    apply_mutation,
+    evict_subtree,
+    init_dom_state,
+)
 from rrweb_util.dom_state.models import UINode
 
 
@@ -314,6 +318,33 @@ def test_apply_mutation_remove_node(rich_node_by_id):
     assert rich_node_by_id[3].text == "to keep"
 
 
+def test_evict_subtree(rich_node_by_id):
+    """Test that evict_subtree removes a node, its descendants, and its parent's reference."""
+    rich_node_by_id[2].children.append(4)
+    rich_node_by_id[4] = UINode(
+        id=4, tag="b", attributes={}, text="nested", parent=2, children=[]
+    )
+
+    assert evict_subtree(rich_node_by_id, 2) == 2
+
+    assert set(rich_node_by_id) == {1, 3}
+    assert rich_node_by_id[1].children == [3]
+    assert evict_subtree(rich_node_by_id, 2) == 0
+
+
+def test_evict_subtree_keeps_moved_children(rich_node_by_id):
+    """Test that evict_subtree keeps children which were since added to another parent."""
+    rich_node_by_id[2].children.append(4)
+    rich_node_by_id[3].children.append(4)
+    rich_node_by_id[4] = UINode(
+        id=4, tag="b", attributes={}, text="moved", parent=3, children=[]
+    )
+
+    assert evict_subtree(rich_node_by_id, 2) == 1
+
+    assert set(rich_node_by_id) == {1, 3, 4}
+
+
 @pytest.mark.parametrize(
     "mutation_type,mutation_data,expected_changes",
     [
@@ -2,7 +2,7 @@
 Shared utility functions for rrweb event processing across all modules.
 """
 
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Collection, Optional, Dict, Any, Tuple
 from .constants import EventType, IncrementalSource, NODE_TYPE_TO_TAG_MAP
 
 
@@ -17,15 +17,24 @@ def is_incremental_snapshot(event: Dict[str, Any]) -> bool:
     return event.get("type") == EventType.INCREMENTAL_SNAPSHOT
 
 
+def get_event_key(event: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the (type, source) key which classifies an event, for dispatching it with a
+    table lookup. The source is None unless the event is an IncrementalSnapshot.
+    """
+    event_type = event.get("type")
+    if event_type != EventType.INCREMENTAL_SNAPSHOT:
+        return event_type, None
+    return event_type, event.get("data", {}).get("source")
+
+
 def _get_incremental_source(event: Dict[str, Any]) -> Optional[int]:
     """Get the source type from an incremental snapshot event."""
-    if not is_incremental_snapshot(event):
-        return None
-    return event.get("data", {}).get("source")
+    return get_event_key(event)[1]
 
 
 # Specific event type checking
-def is_event_of_type(event: Dict[str, Any], event_types: List[int]) -> bool:
+def is_event_of_type(event: Dict[str, Any], event_types: Collection[int]) -> bool:
     """Check if event is of a specific type based on its source."""
     source = _get_incremental_source(event)
     return source in event_types if source is not None else False
@@ -5,14 +5,12 @@ This module contains functions to extract structured feature data from raw rrweb
 including user interactions and scroll patterns.
 """
 
-from typing import List
+from typing import Callable, Dict, List
 
+from rrweb_util import IncrementalSource
 from rrweb_util.dom_state.node_metadata import resolve_node_metadata
 from rrweb_util.helpers import (
     is_incremental_snapshot,
-    is_drag_event,
-    is_mouse_interaction_event,
-    is_input_event,
     get_event_timestamp,
     get_event_data,
     get_target_id,
@@ -45,32 +43,44 @@ def extract_user_interactions(dom_state: dict, event: dict) -> List[UserInteract
         Events with other source values or missing required fields are ignored.
         The function preserves event order in the returned list.
     """
-    interactions = []
-
     # Only process IncrementalSnapshot events
     if not is_incremental_snapshot(event):
         return []
 
-    timestamp = get_event_timestamp(event)
-
-    if is_mouse_interaction_event(event):
-        # Mouse interactions (click, dblclick)
-        interaction = _extract_click_interaction(dom_state, event, timestamp)
-        if interaction:
-            interactions.append(interaction)
-    elif is_input_event(event):
-        # Input events (text changes, checkboxes)
-        interaction = _extract_input_interaction(dom_state, event, timestamp)
-        if interaction:
-            interactions.append(interaction)
-    elif is_drag_event(event):
-        # Drag event
-        # TODO: Implement drag interaction extraction
-        pass
-    else:
+    extractor = INTERACTION_EXTRACTORS.get(get_event_data(event).get("source"))
+    if extractor is None:
         raise ValueError(f"Unknown event type for interaction extraction: {event}")
+    return extractor(dom_state, event)
+
+
+def _extract_clicks(dom_state: dict, event: dict) -> List[UserInteraction]:
+    """Extract mouse interactions (click, dblclick)."""
+    interaction = _extract_click_interaction(
+        dom_state, event, get_event_timestamp(event)
+    )
+    return [interaction] if interaction else []
+
+
+def _extract_inputs(dom_state: dict, event: dict) -> List[UserInteraction]:
+    """Extract input events (text changes, checkboxes)."""
+    interaction = _extract_input_interaction(
+        dom_state, event, get_event_timestamp(event)
+    )
+    return [interaction] if interaction else []
+
+
+def _extract_drags(_dom_state: dict, _event: dict) -> List[UserInteraction]:
+    """Extract drag events."""
+    # TODO: Implement drag interaction extraction
+    return []
+
 
-    return interactions
+# Extractors of the user interactions in IncrementalSnapshot events, by their source
+INTERACTION_EXTRACTORS: Dict[int, Callable[[dict, dict], List[UserInteraction]]] = {
+    IncrementalSource.MOUSE_INTERACTION: _extract_clicks,
+    IncrementalSource.INPUT: _extract_inputs,
+    IncrementalSource.DRAG: _extract_drags,
+}
 
 
 def _extract_click_interaction(
@@ -4,6 +4,9 @@ Process rrweb session data from Google Cloud Storage.
 
 This script downloads JSON files from a GCS bucket, groups them by session_guid,
 merges the session data, and outputs consolidated session files.
+
+Sessions which the server compacted from appended chunks are stored under the
+sessions/ prefix, already in the consolidated format, so they're output as is.
 """
 
 import argparse
@@ -19,6 +22,9 @@ from google.cloud import storage
 # Default logger - will be reconfigured by CLI setup
 logger = logging.getLogger(__name__)
 
+# Prefix of sessions compacted by the server, see chalk.todos.session_staging
+COMPACTED_SESSION_PREFIX = "sessions/"
+
 
 def _initialize_gcs_client() -> storage.Client:
     """
@@ -327,6 +333,96 @@ def _download_json_files(bucket_name: str) -> List[Tuple[str, str]]:
     return file_contents
 
 
+def _parse_compacted_session(filename: str, content: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse and validate a session compacted by the server.
+
+    Args:
+        filename: Name of the file being parsed
+        content: String content of the JSON file
+
+    Returns:
+        Optional[Dict[str, Any]]: The session with session_guid, rrweb_data, and metadata
+                                  if valid, None if invalid
+    """
+    try:
+        session = json.loads(content)
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.warning("Failed to parse JSON in file '%s': %s", filename, str(e))
+        return None
+
+    if (
+        not isinstance(session, dict)
+        or not isinstance(session.get("session_guid"), str)
+        or not isinstance(session.get("rrweb_data"), list)
+        or not isinstance(session.get("metadata"), dict)
+    ):
+        logger.warning(
+            "File '%s' is not a compacted session with session_guid, rrweb_data, and metadata",
+            filename,
+        )
+        return None
+    return session
+
+
+def _download_compacted_sessions(bucket_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Download the sessions compacted by the server from the specified GCS bucket.
+
+    Args:
+        bucket_name: Name of the GCS bucket
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Dictionary with session_guid as keys and the compacted
+                                   sessions as values
+    """
+    client = _initialize_gcs_client()
+    bucket = client.bucket(bucket_name)
+
+    compacted_sessions = {}
+    for blob in bucket.list_blobs(prefix=COMPACTED_SESSION_PREFIX):
+        if not blob.name.startswith(COMPACTED_SESSION_PREFIX):
+            continue
+        session = _parse_compacted_session(blob.name, blob.download_as_text())
+        if session is not None:
+            compacted_sessions[session["session_guid"]] = session
+
+    logger.info("Downloaded %d compacted sessions", len(compacted_sessions))
+    return compacted_sessions
+
+
+def _add_compacted_sessions(
+    sessions: Dict[str, Dict[str, Any]],
+    compacted_sessions: Dict[str, Dict[str, Any]],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Add compacted sessions to the merged sessions, which need no further stitching.
+
+    Args:
+        sessions: Dictionary mapping session_guid to merged session objects
+        compacted_sessions: Dictionary mapping session_guid to compacted session objects
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Dictionary with session_guid as keys and session objects
+                                   as values. Sessions which were partially recorded as
+                                   separate files have their compacted events appended.
+    """
+    combined_sessions = dict(sessions)
+    for session_guid, compacted_session in compacted_sessions.items():
+        if session_guid in combined_sessions:
+            logger.warning(
+                "Session '%s' has both separate files and a compacted session, appending "
+                "the compacted events",
+                session_guid,
+            )
+            combined_sessions[session_guid]["rrweb_data"].extend(
+                compacted_session["rrweb_data"]
+            )
+        else:
+            combined_sessions[session_guid] = compacted_session
+    return combined_sessions
+
+
 def _merge_session_data(
     sessions: Dict[str, Dict[str, Any]],
 ) -> Dict[str, Dict[str, Any]]:
@@ -387,6 +483,7 @@ def _print_summary(stats: Dict[str, int]) -> None:
                - files_downloaded: Total number of files retrieved from GCS
                - files_valid: Number of files successfully parsed and validated
                - files_skipped: Number of files skipped due to errors
+               - sessions_compacted: Number of sessions already compacted by the server
                - sessions_total: Total number of unique sessions processed
                - sessions_written: Number of session files successfully written to disk
                - sessions_with_env_conflicts: Number of sessions with environment inconsistencies
@@ -397,6 +494,9 @@ def _print_summary(stats: Dict[str, int]) -> None:
     logger.info("Total files downloaded from GCS: %d", stats["files_downloaded"])
     logger.info("Files successfully parsed and validated: %d", stats["files_valid"])
     logger.info("Files skipped due to errors: %d", stats["files_skipped"])
+    logger.info(
+        "Sessions already compacted by the server: %d", stats["sessions_compacted"]
+    )
     logger.info("Total unique sessions processed: %d", stats["sessions_total"])
     logger.info(
         "Sessions with environment conflicts: %d", stats["sessions_with_env_conflicts"]
@@ -488,10 +588,11 @@ def process_rrweb_sessions(
     )
     logger.info("Number of validated sessions: %d", len(validated_sessions))
 
-    sessions_total = len(validated_sessions)
-
-    # Merge session data arrays
-    final_sessions = _merge_session_data(validated_sessions)
+    # Merge session data arrays, compacted sessions are already merged
+    compacted_sessions = _download_compacted_sessions(bucket_name)
+    final_sessions = _add_compacted_sessions(
+        _merge_session_data(validated_sessions), compacted_sessions
+    )
     logger.info("Number of final sessions: %d", len(final_sessions))
 
     _write_sessions_to_disk(final_sessions, output_dir)
@@ -502,7 +603,8 @@ def process_rrweb_sessions(
         "files_downloaded": files_downloaded,
         "files_valid": files_valid,
         "files_skipped": files_skipped,
-        "sessions_total": sessions_total,
+        "sessions_compacted": len(compacted_sessions),
+        "sessions_total": len(final_sessions),
         "sessions_written": sessions_written,
         "sessions_with_env_conflicts": sessions_with_env_conflicts,
     }
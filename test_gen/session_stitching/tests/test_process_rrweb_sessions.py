@@ -322,6 +322,52 @@ class TestSessionProcessingPipeline:
         # Should log warning
         assert "No files found" in caplog.text
 
+    def test_passes_through_compacted_sessions(
+        self, caplog, custom_mock_bucket, mock_gcs_client, temp_output_dir
+    ):
+        """Test sessions compacted by the server are output without stitching."""
+        compacted_session = {
+            "session_guid": "compacted-session",
+            "rrweb_data": [{"type": 1}, {"type": 2}],
+            "metadata": {"environment": "production", "chunk_seqs": [0, 1]},
+        }
+        bucket_data = {
+            "2025-05-02T12:10:00.000000+0000": {
+                "session_guid": SESSION_1_KEY,
+                "session_data": [{"type": 1}],
+                "environment": "production",
+            },
+            "sessions/compacted-session.json": compacted_session,
+            f"sessions/{SESSION_1_KEY}.json": {
+                **compacted_session,
+                "session_guid": SESSION_1_KEY,
+                "rrweb_data": [{"type": 3}],
+            },
+            "sessions/invalid.json": {"session_guid": "invalid"},
+        }
+        mock_gcs_client.bucket.return_value = custom_mock_bucket(bucket_data)
+
+        with caplog.at_level("INFO"):
+            process_rrweb_sessions("mock_bucket_name", temp_output_dir)
+
+        filepath = os.path.join(temp_output_dir, "compacted-session.json")
+        with open(filepath, "r", encoding="utf-8") as f:
+            assert json.load(f) == compacted_session
+
+        # Events of sessions also recorded as separate files are appended
+        filepath = os.path.join(temp_output_dir, f"{SESSION_1_KEY}.json")
+        with open(filepath, "r", encoding="utf-8") as f:
+            assert json.load(f)["rrweb_data"] == [{"type": 1}, {"type": 3}]
+
+        assert sorted(os.listdir(temp_output_dir)) == [
+            "compacted-session.json",
+            f"{SESSION_1_KEY}.json",
+        ]
+        assert "Total files downloaded from GCS: 1" in caplog.text
+        assert "Sessions already compacted by the server: 2" in caplog.text
+        assert "Total unique sessions processed: 2" in caplog.text
+        assert "is not a compacted session" in caplog.text
+
     def test_writes_compact_json_format(self, temp_output_dir):
         """Test that JSON is written in compact format (no extra whitespace)."""
         process_rrweb_sessions("mock_bucket_name", temp_output_dir)
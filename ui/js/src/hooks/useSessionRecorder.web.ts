@@ -15,6 +15,8 @@ export function useSessionRecorder() {
   const dispatch = useAppDispatch();
   useEffect(() => {
     let events: object[] = [];
+    // Sequence number of the next chunk of events sent for the session
+    let seq = 0;
     const sessionGuid: string = crypto.randomUUID();
 
     record({
@@ -25,14 +27,19 @@ export function useSessionRecorder() {
 
     // save events every 10 seconds
     const intervalId = setInterval(() => {
-      dispatch(recordSessionEvents(sessionGuid, events));
+      if (events.length > 0) {
+        dispatch(recordSessionEvents(sessionGuid, seq, events));
+        seq += 1;
+      }
       // reset the events array
       events = [];
     }, 10 * 1000);
 
     return () => {
       clearInterval(intervalId);
-      // Clear any remaining events to prevent memory leaks
+      // Send any remaining events & mark the session finished
+      dispatch(recordSessionEvents(sessionGuid, seq, events, true));
+      // Clear the events to prevent memory leaks
       events = [];
     };
   }, []);
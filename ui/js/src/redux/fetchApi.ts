@@ -101,15 +101,29 @@ export async function completeAuthCallback(token: string) {
   );
 }
 
-export async function recordSessionData(
-  dataString: string,
+// Appends a chunk of rrweb events to a session as newline delimited JSON
+// The server stages chunks in order of their seq, ignoring retried chunks
+export async function appendSessionChunk(
+  sessionGuid: string,
+  seq: number,
+  events: object[],
+  final: boolean,
   csrfToken: string,
-): Promise<string> {
+): Promise<{ seq: number; staged: boolean }> {
   const requestOpts = getRequestOpts('POST', csrfToken);
-  requestOpts.body = dataString;
+  requestOpts.headers = {
+    ...(requestOpts.headers as Record<string, string>),
+    'Content-Type': 'application/x-ndjson',
+  };
+  requestOpts.body = events.map((event) => JSON.stringify(event)).join('\n');
+  const params = new URLSearchParams({
+    seq: String(seq),
+    environment: getEnvFlags().ENVIRONMENT,
+    final: String(final),
+  });
   const response = await fetch(
-    `${getWsRoot()}api/todos/log_session_data/`,
+    `${getWsRoot()}api/todos/append_session_chunk/${sessionGuid}/?${params}`,
     requestOpts,
   );
-  return handleResponse<string>(response);
+  return handleResponse<{ seq: number; staged: boolean }>(response);
 }
@@ -5,9 +5,9 @@ import { persistReducer } from 'redux-persist';
 import { getEnvFlags } from '../helpers';
 import { selectActiveFilterLabels } from '../selectors';
 import {
+  appendSessionChunk,
   completeAuthCallback,
   getCsrfToken,
-  recordSessionData,
 } from './fetchApi';
 import { labelsApiSlice, listLabels } from './labelsApiSlice';
 import networkSlice from './networkSlice';
@@ -199,21 +199,26 @@ export const completeAuthentication =
   };
 
 export const recordSessionEvents =
-  (sessionGuid: string, events: object[]): AppThunk =>
+  (
+    sessionGuid: string,
+    seq: number,
+    events: object[],
+    final = false,
+  ): AppThunk =>
   async (dispatch, getState) => {
-    if (events.length === 0) {
+    if (events.length === 0 && !final) {
       return;
     }
 
-    // send events to the backend
-    const data = JSON.stringify({
-      session_guid: sessionGuid,
-      session_data: events,
-      environment: getEnvFlags().ENVIRONMENT,
-    });
-
+    // append the events to the session on the backend
     try {
-      await recordSessionData(data, getCsrfToken(getState));
+      await appendSessionChunk(
+        sessionGuid,
+        seq,
+        events,
+        final,
+        getCsrfToken(getState),
+      );
     } catch (error) {
       console.error('Failed to save events', error);
       // Only notify in development to avoid user-facing errors